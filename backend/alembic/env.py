@@ -8,6 +8,7 @@ from logging.config import fileConfig
 # for 'autogenerate' support
 # https://alembic.sqlalchemy.org/en/latest/autogenerate.html#autogenerating-multiple-metadata-collections
 from backend.app.admin.model import MappedBase as AdminModel
+from backend.app.agent.model import BartenderSemanticCache  # noqa: F401
 from backend.core import path_conf
 
 # other values from the config, defined by the needs of env.py,
@@ -1,21 +1,62 @@
-from typing import AsyncGenerator, List
+import asyncio
+import itertools
+import json
+import time
 
-from agno.agent import Agent
-from fastapi import APIRouter, HTTPException, status
-from fastapi.responses import StreamingResponse
+from typing import Any, AsyncGenerator, Dict, List, Literal, Optional, Tuple
+from urllib.parse import urlencode
 
-from backend.app.agent.schema.agent_request_schema import AgentRequest, AgentType, BartenderRequest
+from agno.agent import Agent
+from fastapi import APIRouter, Header, HTTPException, Path, Query, Request, status
+from fastapi.responses import RedirectResponse, StreamingResponse
+from pydantic import BaseModel
+
+from backend.app.agent.schema.agent_request_schema import (
+    AgentRequest,
+    AgentType,
+    BartenderBatchRequest,
+    BartenderRequest,
+)
 from backend.app.agent.schema.cocktail_schema import CocktailRecommendation
+from backend.app.agent.schema.image_job_schema import ImageEvent, ImageJobStatusResponse
 from backend.app.agent.service.agents.casual_chat_agent import get_casual_chat_agent
 from backend.app.agent.service.agents.classic_bartender_agent import get_classic_bartender
 from backend.app.agent.service.agents.creative_bartender_agent import get_creative_bartender
-from backend.app.agent.service.utils.image_generator import (
-    generate_cocktail_image,
+from backend.app.agent.service.utils.agent_stream import (
+    StreamEvent,
+    agent_stream_exists,
+    read_agent_stream,
+    start_agent_run,
+    stream_structured_run,
+)
+from backend.app.agent.service.utils.flavor_embedding import find_similar_cocktails
+from backend.app.agent.service.utils.image_events import wait_for_session_image
+from backend.app.agent.service.utils.image_pipeline import SpeculativeImageJob
+from backend.app.agent.service.utils.image_queue import enqueue_image_job, get_session_image_job
+from backend.app.agent.service.utils.image_store import (
     get_cocktail_image_url,
-    store_cocktail_image_url,
+    get_image,
+    get_session_image,
+    get_session_image_key,
+    has_image,
 )
+from backend.app.agent.service.utils.image_transcoder import get_image_variant
+from backend.app.agent.service.utils.recommendation_cache import (
+    cache_recommendation,
+    get_or_create_recommendation,
+    is_recommendation_cache_enabled,
+    lookup_recommendation,
+    recommendation_cache_key,
+    record_cached_run,
+    set_recommendation_cache_opt_out,
+)
+from backend.app.agent.service.utils.recommendation_grid import find_grid_recommendation
+from backend.app.agent.service.utils.semantic_cache import find_similar_recommendation, store_similar_recommendation
 from backend.common.log import logger
+from backend.common.metrics import metrics
 from backend.core.conf import settings
+from backend.utils.range_response import bytes_response
+from backend.utils.sse import SSE_HEADERS, format_sse, format_sse_comment
 
 ######################################################
 # Router for the Agent Interface
@@ -35,48 +76,55 @@ async def list_agents() -> List[str]:
     return [agent.value for agent in AgentType]
 
 
-async def generate_and_store_image(cocktail: CocktailRecommendation, user_id: int, session_id: str) -> None:
+async def submit_image_job(cocktail: CocktailRecommendation, user_id: int, session_id: str) -> None:
     """
-    异步生成并存储鸡尾酒图片
+    提交鸡尾酒图片生成任务，失败时只记录日志，不影响推荐结果返回
 
     Args:
         cocktail: 鸡尾酒推荐信息
         user_id: 用户ID
         session_id: 会话ID
     """
+    if not isinstance(cocktail, CocktailRecommendation):
+        logger.warning(f"Skip image job for user {user_id}: {session_id}, response is not a CocktailRecommendation")
+        return
     try:
-        image_url = await generate_cocktail_image(cocktail)
-        if image_url:
-            await store_cocktail_image_url(user_id, session_id, image_url)
-            logger.info(f"Generated and stored image for user {user_id}: {session_id}")
+        await enqueue_image_job(cocktail, user_id, session_id)
     except Exception as e:
-        logger.error(f"Failed to generate image for user {user_id}: {session_id}, error: {str(e)}")
+        logger.error(f"Failed to enqueue image job for user {user_id}: {session_id}, error: {str(e)}")
 
 
-async def chat_response_streamer(agent: Agent, message: str) -> AsyncGenerator:
+async def chat_response_streamer(
+    user_id: int, session_id: str, stream_id: str, request: Request, last_event_id: Optional[str] = None
+) -> AsyncGenerator:
     """
-    Stream agent responses chunk by chunk.
+    Stream buffered agent run events as SSE, resuming after last_event_id when given.
 
     Args:
-        agent: The agent instance to interact with
-        message: User message to process
+        user_id: User ID
+        session_id: Session ID
+        stream_id: ID of the buffered run output
+        request: The current request, used to detect client disconnects
+        last_event_id: ID of the last event the client received
 
     Yields:
-        Text chunks from the agent response
+        SSE encoded delta, tool_call, usage, done and error events
     """
-    run_response = await agent.arun(message, stream=True)
-    async for chunk in run_response:
-        logger.debug(f"Chunk: {chunk}")
-        yield chunk.content
+    async for content in read_agent_stream(user_id, session_id, stream_id, request, last_event_id):
+        yield content
 
 
 @agents_router.post("/casual_chat", status_code=status.HTTP_200_OK)
-async def run_casual_chat_agent_stream(body: AgentRequest):
+async def run_casual_chat_agent_stream(body: AgentRequest, request: Request):
     """
     Sends a message to the Casual Chat agent and returns a streaming response.
 
+    The run output is buffered, the X-Stream-Id header identifies it for resuming via
+    GET /agents/casual_chat/{stream_id} after a dropped connection.
+
     Args:
         body: Request parameters including the message
+        request: The current request
 
     Returns:
         Streaming response from the agent
@@ -98,19 +146,58 @@ async def run_casual_chat_agent_stream(body: AgentRequest):
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Casual Chat agent not found: {str(e)}")
 
+    stream_id = await start_agent_run(casual_chat_agent, message, user_id, session_id, AgentType.CASUAL_CHAT.value)
+    return StreamingResponse(
+        chat_response_streamer(user_id, session_id, stream_id, request),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Stream-Id": stream_id},
+    )
+
+
+@agents_router.get("/casual_chat/{stream_id}", status_code=status.HTTP_200_OK)
+async def resume_casual_chat_agent_stream(
+    request: Request,
+    stream_id: str = Path(..., pattern=r"^[0-9a-f]{32}$"),
+    user_id: int = Query(...),
+    session_id: str = Query(...),
+    last_event_id: Optional[str] = Header(None, pattern=r"^[0-9]+-[0-9]+$"),
+):
+    """
+    Resumes a Casual Chat stream after a dropped connection.
+
+    Events after the Last-Event-ID header are replayed from the buffer, then the live run is followed.
+    Works on any worker, the run keeps going for AGENT_STREAM_RESUME_GRACE_SECONDS without a reader.
+
+    Args:
+        request: The current request
+        stream_id: Value of the X-Stream-Id header of the original response
+        user_id: User ID
+        session_id: Session ID
+        last_event_id: ID of the last event the client received, replays from the start when missing
+
+    Returns:
+        Streaming response from the agent
+    """
+    if not await agent_stream_exists(user_id, session_id, stream_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat stream not found or expired")
     return StreamingResponse(
-        chat_response_streamer(casual_chat_agent, message),
+        chat_response_streamer(user_id, session_id, stream_id, request, last_event_id),
         media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Stream-Id": stream_id},
     )
 
 
 @agents_router.post("/classic_bartender", status_code=status.HTTP_200_OK)
-async def run_classic_bartender_agent(body: BartenderRequest):
+async def run_classic_bartender_agent(body: BartenderRequest, request: Request):
     """
     发送消息给经典调酒师 agent 并返回完整响应。
 
+    开启 BARTENDER_IMAGE_PIPELINE 时内部流式运行，英文名称确定后即提交图片任务，与推荐剩余部分并行生成；
+    相同问卷的推荐走缓存，见 recommend_cocktail。
+
     Args:
         body: 包含选择题选项和消息的请求参数
+        request: 当前请求
 
     Returns:
         来自 agent 的完整响应
@@ -125,7 +212,14 @@ async def run_classic_bartender_agent(body: BartenderRequest):
         # 验证会话
         # await verify_session(user_id, session_id)
 
-        agent = get_classic_bartender(user_id=user_id, session_id=session_id, model_id=model, debug_mode=debug_mode)
+        # 流水线模式下内部流式运行，以便尽早提交图片任务
+        agent = get_classic_bartender(
+            user_id=user_id,
+            session_id=session_id,
+            model_id=model,
+            debug_mode=debug_mode,
+            stream=settings.BARTENDER_IMAGE_PIPELINE,
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"Classic Bartender agent not found: {str(e)}"
@@ -133,21 +227,65 @@ async def run_classic_bartender_agent(body: BartenderRequest):
 
     # 使用组装好的用户提示
     user_prompt = body.get_user_prompt()
-    response = await agent.arun(user_prompt, stream=False)
+    return await recommend_cocktail(agent, user_prompt, body, request, AgentType.CLASSIC_BARTENDER.value)
 
-    # 生成并存储鸡尾酒图片
-    await generate_and_store_image(response.content, user_id, session_id)
 
-    return response.content
+@agents_router.post("/classic_bartender/stream", status_code=status.HTTP_200_OK)
+async def run_classic_bartender_agent_stream(body: BartenderRequest, request: Request):
+    """
+    发送消息给经典调酒师 agent 并以 SSE 流式返回推荐。
+
+    推荐的顶层字段生成完整后立即以 field 事件返回，结束时返回校验后的完整 result；
+    英文名称确定后立即提交图片生成任务，与剩余字段并行生成。相同问卷命中缓存时直接输出缓存的推荐。
+
+    Args:
+        body: 包含选择题选项和消息的请求参数
+        request: 当前请求
+
+    Returns:
+        来自 agent 的流式响应
+    """
+    logger.debug(f"Classic Bartender AgentRequest (stream): {body}")
+
+    try:
+        user_id = body.user_id
+        session_id = body.session_id
+        model = body.model
+        debug_mode = settings.ENVIRONMENT == "dev"
+        # 验证会话
+        # await verify_session(user_id, session_id)
+
+        agent = get_classic_bartender(
+            user_id=user_id, session_id=session_id, model_id=model, debug_mode=debug_mode, stream=True
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Classic Bartender agent not found: {str(e)}"
+        )
+
+    # 使用组装好的用户提示
+    user_prompt = body.get_user_prompt()
+    cache_body = body if await is_recommendation_cache_enabled(user_id) else None
+    return StreamingResponse(
+        bartender_response_streamer(
+            agent, user_prompt, request, user_id, session_id, AgentType.CLASSIC_BARTENDER.value, cache_body
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
 
 
 @agents_router.post("/creative_bartender", status_code=status.HTTP_200_OK)
-async def run_creative_bartender_agent(body: BartenderRequest):
+async def run_creative_bartender_agent(body: BartenderRequest, request: Request):
     """
     发送消息给创意调酒师 agent 并返回完整响应。
 
+    开启 BARTENDER_IMAGE_PIPELINE 时内部流式运行，英文名称确定后即提交图片任务，与推荐剩余部分并行生成；
+    相同问卷的推荐走缓存，见 recommend_cocktail。
+
     Args:
         body: 包含选择题选项和消息的请求参数
+        request: 当前请求
 
     Returns:
         来自 agent 的完整响应
@@ -162,7 +300,52 @@ async def run_creative_bartender_agent(body: BartenderRequest):
         # 验证会话
         # await verify_session(user_id, session_id)
 
-        agent = get_creative_bartender(user_id=user_id, session_id=session_id, model_id=model, debug_mode=debug_mode)
+        # 流水线模式下内部流式运行，以便尽早提交图片任务
+        agent = get_creative_bartender(
+            user_id=user_id,
+            session_id=session_id,
+            model_id=model,
+            debug_mode=debug_mode,
+            stream=settings.BARTENDER_IMAGE_PIPELINE,
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Creative Bartender agent not found: {str(e)}"
+        )
+
+    # 使用组装好的用户提示
+    user_prompt = body.get_user_prompt()
+    return await recommend_cocktail(agent, user_prompt, body, request, AgentType.CREATIVE_BARTENDER.value)
+
+
+@agents_router.post("/creative_bartender/stream", status_code=status.HTTP_200_OK)
+async def run_creative_bartender_agent_stream(body: BartenderRequest, request: Request):
+    """
+    发送消息给创意调酒师 agent 并以 SSE 流式返回推荐。
+
+    推荐的顶层字段生成完整后立即以 field 事件返回，结束时返回校验后的完整 result；
+    英文名称确定后立即提交图片生成任务，与剩余字段并行生成。相同问卷命中缓存时直接输出缓存的推荐。
+
+    Args:
+        body: 包含选择题选项和消息的请求参数
+        request: 当前请求
+
+    Returns:
+        来自 agent 的流式响应
+    """
+    logger.debug(f"Creative Bartender AgentRequest (stream): {body}")
+
+    try:
+        user_id = body.user_id
+        session_id = body.session_id
+        model = body.model
+        debug_mode = settings.ENVIRONMENT == "dev"
+        # 验证会话
+        # await verify_session(user_id, session_id)
+
+        agent = get_creative_bartender(
+            user_id=user_id, session_id=session_id, model_id=model, debug_mode=debug_mode, stream=True
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"Creative Bartender agent not found: {str(e)}"
@@ -170,12 +353,465 @@ async def run_creative_bartender_agent(body: BartenderRequest):
 
     # 使用组装好的用户提示
     user_prompt = body.get_user_prompt()
-    response = await agent.arun(user_prompt, stream=False)
+    cache_body = body if await is_recommendation_cache_enabled(user_id) else None
+    return StreamingResponse(
+        bartender_response_streamer(
+            agent, user_prompt, request, user_id, session_id, AgentType.CREATIVE_BARTENDER.value, cache_body
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
 
-    # 生成并存储鸡尾酒图片
-    await generate_and_store_image(response.content, user_id, session_id)
 
-    return response.content
+@agents_router.put("/recommendation_cache/opt_out", status_code=status.HTTP_200_OK)
+async def set_recommendation_cache_preference(
+    user_id: int = Query(..., description="用户ID"),
+    opted_out: bool = Query(True, description="是否退出推荐缓存"),
+):
+    """
+    设置用户是否退出推荐缓存。
+
+    退出后调酒师推荐总是重新生成，不读取也不写入缓存。
+
+    Args:
+        user_id: 用户ID
+        opted_out: 是否退出
+
+    Returns:
+        用户当前的缓存设置
+    """
+    await set_recommendation_cache_opt_out(user_id, opted_out)
+    return {"user_id": user_id, "opted_out": opted_out}
+
+
+@agents_router.post("/more_like_this", response_model=List[CocktailRecommendation], status_code=status.HTTP_200_OK)
+async def more_like_this(
+    cocktail: CocktailRecommendation,
+    limit: int = Query(5, ge=1, le=20, description="最多返回的数量"),
+):
+    """
+    推荐与之前结果口味相近的经典鸡尾酒。
+
+    在内置酒单的口味向量索引中检索，不调用大模型。
+
+    Args:
+        cocktail: 之前得到的鸡尾酒推荐
+        limit: 最多返回的数量
+
+    Returns:
+        按相似度从高到低排列的推荐
+    """
+    return find_similar_cocktails(cocktail, limit)
+
+
+_BATCH_AGENTS = {
+    AgentType.CLASSIC_BARTENDER: get_classic_bartender,
+    AgentType.CREATIVE_BARTENDER: get_creative_bartender,
+}
+
+
+@agents_router.post("/bartender/batch", status_code=status.HTTP_200_OK)
+async def run_bartender_batch(body: BartenderBatchRequest, request: Request):
+    """
+    批量获取调酒师推荐。
+
+    规范化后相同的问卷只运行一次 agent（退出缓存的用户除外），其余最多 BARTENDER_BATCH_CONCURRENCY 个同时运行；
+    结果以 NDJSON 按完成顺序返回，每行对应一份问卷，单份失败不影响其他问卷。
+
+    Args:
+        body: agent 类型和问卷列表
+        request: 当前请求
+
+    Returns:
+        NDJSON 流式响应，每行为 {"index", "ok", "cocktail" 或 "error", "deduplicated"}
+    """
+    logger.debug(f"Bartender batch request: {len(body.requests)} items for {body.agent_type}")
+    return StreamingResponse(
+        bartender_batch_streamer(body.agent_type, body.requests, request), media_type="application/x-ndjson"
+    )
+
+
+async def bartender_batch_streamer(
+    agent_type: AgentType, items: List[BartenderRequest], request: Request
+) -> AsyncGenerator:
+    """
+    按完成顺序输出批量推荐结果
+
+    Args:
+        agent_type: 调酒师 agent 类型
+        items: 问卷列表
+        request: 当前请求
+
+    Returns:
+        NDJSON 行
+    """
+    agent_name = agent_type.value
+    user_ids = list({item.user_id for item in items})
+    cache_enabled = dict(zip(user_ids, await asyncio.gather(*map(is_recommendation_cache_enabled, user_ids))))
+    groups: Dict[str, List[int]] = {}
+    for index, item in enumerate(items):
+        # 退出缓存的用户不与其他问卷共用结果，单独运行 agent
+        key = recommendation_cache_key(agent_name, item) if cache_enabled[item.user_id] else f"opted_out:{index}"
+        groups.setdefault(key, []).append(index)
+    semaphore = asyncio.Semaphore(settings.BARTENDER_BATCH_CONCURRENCY)
+
+    async def write_back(indexes: List[int], cocktail: CocktailRecommendation) -> None:
+        # 重复问卷属于其他用户或会话时补写各自的会话历史和图片任务，每个 (用户, 会话) 只补写一次
+        written = {(items[indexes[0]].user_id, items[indexes[0]].session_id)}
+        duplicates = []
+        for index in indexes[1:]:
+            duplicate = items[index]
+            if (duplicate.user_id, duplicate.session_id) not in written:
+                written.add((duplicate.user_id, duplicate.session_id))
+                duplicates.append(duplicate)
+
+        async def use_cached(duplicate: BartenderRequest) -> None:
+            agent = _BATCH_AGENTS[agent_type](
+                user_id=duplicate.user_id,
+                session_id=duplicate.session_id,
+                model_id=duplicate.model,
+                debug_mode=settings.ENVIRONMENT == "dev",
+            )
+            await _use_cached_recommendation(
+                agent, duplicate.get_user_prompt(), cocktail, duplicate.user_id, duplicate.session_id
+            )
+
+        results = await asyncio.gather(*map(use_cached, duplicates), return_exceptions=True)
+        for duplicate, result in zip(duplicates, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    f"Failed to write back batch recommendation for user {duplicate.user_id}: "
+                    f"{duplicate.session_id}, error: {str(result)}"
+                )
+
+    async def run(indexes: List[int]) -> Tuple[List[int], Any, Optional[str]]:
+        body = items[indexes[0]]
+        try:
+            async with semaphore:
+                agent = _BATCH_AGENTS[agent_type](
+                    user_id=body.user_id,
+                    session_id=body.session_id,
+                    model_id=body.model,
+                    debug_mode=settings.ENVIRONMENT == "dev",
+                    stream=settings.BARTENDER_IMAGE_PIPELINE,
+                )
+                cocktail = await recommend_cocktail(agent, body.get_user_prompt(), body, request, agent_name)
+            if isinstance(cocktail, CocktailRecommendation):
+                await write_back(indexes, cocktail)
+            return indexes, cocktail, None
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.error(f"Bartender batch item {indexes[0]} failed: {error}")
+            return indexes, None, error
+
+    tasks = [asyncio.create_task(run(indexes)) for indexes in groups.values()]
+    start = time.perf_counter()
+    try:
+        for future in asyncio.as_completed(tasks):
+            indexes, cocktail, error = await future
+            for n, index in enumerate(indexes):
+                line: Dict[str, Any] = {"index": index, "ok": error is None, "deduplicated": n > 0}
+                if error is None:
+                    line["cocktail"] = cocktail.model_dump() if isinstance(cocktail, BaseModel) else cocktail
+                else:
+                    line["error"] = error
+                metrics.incr("bartender_batch_items_total", agent=agent_name, result="ok" if error is None else "error")
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+    finally:
+        # 客户端断开时取消尚未完成的问卷
+        for task in tasks:
+            task.cancel()
+        elapsed = time.perf_counter() - start
+        metrics.observe("bartender_batch_seconds", elapsed, agent=agent_name)
+        logger.info(
+            f"Bartender batch finished: {len(items)} items, {len(tasks)} unique, {elapsed:.2f}s "
+            f"({len(items) / max(elapsed, 1e-9):.2f} items/s)"
+        )
+
+
+async def bartender_response_streamer(
+    agent: Agent,
+    message: str,
+    request: Request,
+    user_id: int,
+    session_id: str,
+    agent_name: str,
+    cache_body: Optional[BartenderRequest] = None,
+) -> AsyncGenerator:
+    """
+    以 SSE 流式输出调酒师推荐，英文名称确定后立即提交图片生成任务
+
+    Args:
+        agent: 以 JSON 模式流式输出的调酒师 agent
+        message: 用户提示
+        request: 当前请求，用于检测客户端是否断开
+        user_id: 用户ID
+        session_id: 会话ID
+        agent_name: agent 名称，用于指标
+        cache_body: 用于查找推荐缓存的请求，为空时不使用缓存
+
+    Yields:
+        SSE 编码后的 field、tool_call、result、usage、done、error 事件
+    """
+    event_ids = itertools.count(1)
+    cache_key = embedding = None
+    if cache_body is not None:
+        cache_key = recommendation_cache_key(agent_name, cache_body)
+        cocktail = await lookup_recommendation(cache_key, agent_name)
+        if cocktail is None:
+            cocktail = await find_grid_recommendation(agent_name, cache_body)
+            if cocktail is None:
+                cocktail, embedding = await find_similar_recommendation(agent_name, cache_body, message)
+            if cocktail is not None:
+                await cache_recommendation(cache_key, cocktail)
+        if cocktail is not None:
+            await _use_cached_recommendation(agent, message, cocktail, user_id, session_id)
+            data = cocktail.model_dump()
+            events = [(StreamEvent.FIELD, {"name": name, "value": value}) for name, value in data.items()]
+            events.append((StreamEvent.RESULT, data))
+            events.append((StreamEvent.DONE, {"run_id": None, "session_id": session_id, "cached": True}))
+            yield "".join(format_sse(data, event=event.value, event_id=next(event_ids)) for event, data in events)
+            return
+
+    image_job = SpeculativeImageJob(user_id, session_id)
+    cocktail = None
+    try:
+        async for event, data in stream_structured_run(agent, message, request, agent_name):
+            if event == StreamEvent.FIELD:
+                await image_job.on_field(data["name"], data["value"])
+            elif event == StreamEvent.RESULT:
+                cocktail = CocktailRecommendation.model_validate(data)
+                await image_job.on_result(cocktail)
+            yield format_sse(data, event=event.value, event_id=next(event_ids))
+    finally:
+        if cocktail is None:
+            image_job.discard()
+
+    # 事件全部发出后再写缓存，不推迟推荐送达
+    if cocktail is None:
+        return
+    if cache_key is not None:
+        await cache_recommendation(cache_key, cocktail)
+    if embedding is not None:
+        await store_similar_recommendation(agent_name, cache_body, message, embedding, cocktail)
+
+
+async def run_bartender_pipeline(
+    agent: Agent, message: str, request: Request, user_id: int, session_id: str, agent_name: str
+) -> CocktailRecommendation:
+    """
+    流式运行调酒师 agent 并返回完整推荐，英文名称确定后立即提交图片生成任务
+
+    Args:
+        agent: 以 JSON 模式流式输出的调酒师 agent
+        message: 用户提示
+        request: 当前请求，用于检测客户端是否断开
+        user_id: 用户ID
+        session_id: 会话ID
+        agent_name: agent 名称，用于指标
+
+    Returns:
+        校验后的鸡尾酒推荐
+    """
+    image_job = SpeculativeImageJob(user_id, session_id)
+    cocktail = None
+    try:
+        async for event, data in stream_structured_run(agent, message, request, agent_name):
+            if event == StreamEvent.FIELD:
+                await image_job.on_field(data["name"], data["value"])
+            elif event == StreamEvent.RESULT:
+                cocktail = CocktailRecommendation.model_validate(data)
+                await image_job.on_result(cocktail)
+    finally:
+        if cocktail is None:
+            image_job.discard()
+    if cocktail is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"{agent_name} failed to produce a recommendation"
+        )
+    return cocktail
+
+
+async def _use_cached_recommendation(
+    agent: Agent, message: str, cocktail: CocktailRecommendation, user_id: int, session_id: str
+) -> None:
+    # 命中缓存时没有运行 agent：补写会话历史以便追问，并为本会话提交图片任务（图片按内容共享，通常已存在）
+    await record_cached_run(agent, message, cocktail)
+    await submit_image_job(cocktail, user_id, session_id)
+
+
+class _LeaderDisconnected(Exception):
+    """合并执行推荐的请求在运行中途断开，运行被取消，等待该结果的请求需要自行运行"""
+
+
+async def recommend_cocktail(
+    agent: Agent, message: str, body: BartenderRequest, request: Request, agent_name: str
+) -> Any:
+    """
+    运行调酒师 agent 得到推荐
+
+    用户没有退出缓存时，相同问卷（规范化后）的推荐直接从缓存返回，并发的相同请求只运行一次 agent；
+    问卷不同时再依次查找预生成的推荐网格和语义缓存。运行 agent 的请求中途断开时，等待的请求改由自己运行。
+
+    Args:
+        agent: 调酒师 agent
+        message: 用户提示
+        body: 调酒师请求
+        request: 当前请求
+        agent_name: agent 名称，用于指标
+
+    Returns:
+        鸡尾酒推荐
+    """
+    user_id, session_id = body.user_id, body.session_id
+
+    async def run_agent() -> Any:
+        if settings.BARTENDER_IMAGE_PIPELINE:
+            return await run_bartender_pipeline(agent, message, request, user_id, session_id, agent_name)
+        response = await agent.arun(message, stream=False)
+        # 提交图片生成任务，由 worker 异步生成，前端通过 /cocktail_image 获取
+        await submit_image_job(response.content, user_id, session_id)
+        return response.content
+
+    if not await is_recommendation_cache_enabled(user_id):
+        return await run_agent()
+
+    async def create() -> Any:
+        # 问卷不完全相同时，依次查找预生成的推荐网格和选项一致、需求语义相近的推荐
+        embedding = None
+        cocktail = await find_grid_recommendation(agent_name, body)
+        if cocktail is None:
+            cocktail, embedding = await find_similar_recommendation(agent_name, body, message)
+        if cocktail is not None:
+            await _use_cached_recommendation(agent, message, cocktail, user_id, session_id)
+            return cocktail
+        try:
+            result = await run_agent()
+        except HTTPException:
+            # 流水线在客户端断开时取消运行，这不是等待者的失败
+            if await request.is_disconnected():
+                raise _LeaderDisconnected() from None
+            raise
+        if embedding is not None and isinstance(result, CocktailRecommendation):
+            await store_similar_recommendation(agent_name, body, message, embedding, result)
+        return result
+
+    key = recommendation_cache_key(agent_name, body)
+    while True:
+        try:
+            cocktail, cached = await get_or_create_recommendation(key, agent_name, create)
+            break
+        except _LeaderDisconnected:
+            if await request.is_disconnected():
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"{agent_name} run cancelled, client disconnected",
+                ) from None
+            # 以本请求的 agent 和会话重新发起，其余等待者合并到这次运行
+            logger.info(f"{agent_name} run cancelled by a disconnected client, retry for session {session_id}")
+    if cached and isinstance(cocktail, CocktailRecommendation):
+        await _use_cached_recommendation(agent, message, cocktail, user_id, session_id)
+    return cocktail
+
+
+def _shared_image_url(image_key: str) -> str:
+    return f"{settings.FASTAPI_API_V1_PATH}{agents_router.prefix}/images/{image_key}"
+
+
+def _resolve_variant(size: Optional[int], image_format: Optional[str]) -> Optional[Tuple[int, str]]:
+    """
+    解析请求的图片变体，未指定尺寸和格式时返回原图
+
+    Args:
+        size: 最长边像素
+        image_format: 图片格式
+
+    Returns:
+        (尺寸, 格式)，原图返回None
+    """
+    if size is None and image_format is None:
+        return None
+    if size is None:
+        size = max(settings.IMAGE_VARIANT_SIZES)
+    elif size not in settings.IMAGE_VARIANT_SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported image size {size}, expected one of {settings.IMAGE_VARIANT_SIZES}",
+        )
+    return size, image_format or "webp"
+
+
+@agents_router.get("/images/{image_key}", status_code=status.HTTP_200_OK)
+async def get_shared_cocktail_image(
+    request: Request,
+    image_key: str = Path(..., pattern=r"^[0-9a-f]{64}$"),
+    size: Optional[int] = Query(default=None, description="缩略图最长边像素，未指定时返回原图"),
+    image_format: Optional[Literal["webp", "avif"]] = Query(default=None, alias="format", description="图片格式"),
+):
+    """
+    按内容键获取鸡尾酒图片原始字节
+
+    内容键由生成规格决定，同一 URL 的内容不会变化，可被浏览器和 CDN 长期缓存；支持条件请求和 Range 请求。
+    指定 size 或 format 时返回对应的缩略图变体，只指定 size 时默认为 WebP。
+
+    Args:
+        request: 当前请求
+        image_key: 共享图片的内容键
+        size: 缩略图最长边像素
+        image_format: 图片格式
+
+    Returns:
+        图片字节,如果不存在则返回404
+    """
+    variant = _resolve_variant(size, image_format)
+    if variant is None:
+        image = await get_image(image_key)
+    else:
+        image = await get_image_variant(image_key, *variant)
+    if image is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    return bytes_response(
+        request, image.data, image.content_type, image.etag, cache_control="public, max-age=31536000, immutable"
+    )
+
+
+@agents_router.get("/cocktail_image/raw", status_code=status.HTTP_200_OK)
+async def get_cocktail_image_raw(
+    request: Request,
+    user_id: int,
+    session_id: str,
+    size: Optional[int] = Query(default=None, description="缩略图最长边像素，未指定时返回原图"),
+    image_format: Optional[Literal["webp", "avif"]] = Query(default=None, alias="format", description="图片格式"),
+):
+    """
+    获取会话的鸡尾酒图片原始字节
+
+    已关联共享图片时重定向到可长期缓存的内容地址（保留 size 与 format 参数），旧版按会话存储的图片直接返回原图。
+
+    Args:
+        request: 当前请求
+        user_id: 用户ID
+        session_id: 会话ID
+        size: 缩略图最长边像素
+        image_format: 图片格式
+
+    Returns:
+        图片字节或重定向,如果不存在则返回404
+    """
+    variant = _resolve_variant(size, image_format)
+    image_key = await get_session_image_key(user_id, session_id)
+    if image_key and await has_image(image_key):
+        url = _shared_image_url(image_key)
+        if variant is not None:
+            url = f"{url}?{urlencode({'size': variant[0], 'format': variant[1]})}"
+        return RedirectResponse(
+            url=url, status_code=status.HTTP_307_TEMPORARY_REDIRECT, headers={"Cache-Control": "no-cache"}
+        )
+
+    image = await get_session_image(user_id, session_id)
+    if image is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found or not ready yet")
+    return bytes_response(request, image.data, image.content_type, image.etag, cache_control="private, no-cache")
 
 
 @agents_router.get("/cocktail_image", status_code=status.HTTP_200_OK)
@@ -183,6 +819,8 @@ async def get_cocktail_image(user_id: int, session_id: str):
     """
     获取鸡尾酒图片base64数据
 
+    兼容旧版前端保留，新代码请使用 /cocktail_image/raw 或 /images/{image_key}
+
     Args:
         user_id: 用户ID
         session_id: 会话ID
@@ -196,6 +834,103 @@ async def get_cocktail_image(user_id: int, session_id: str):
     return {"image_data": base64_image}
 
 
+@agents_router.get("/cocktail_image/status", status_code=status.HTTP_200_OK, response_model=ImageJobStatusResponse)
+async def get_cocktail_image_status(user_id: int, session_id: str):
+    """
+    获取会话最近一次图片生成任务的状态
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+
+    Returns:
+        任务状态,如果不存在则返回404
+    """
+    job = await get_session_image_job(user_id, session_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image job not found")
+    return ImageJobStatusResponse(job_id=job.job_id, status=job.status, attempts=job.attempts, error=job.error)
+
+
+def _with_image_url(event: ImageEvent) -> ImageEvent:
+    if event.image_key:
+        event.url = _shared_image_url(event.image_key)
+    return event
+
+
+@agents_router.get("/cocktail_image/wait", status_code=status.HTTP_200_OK, response_model=ImageEvent)
+async def wait_cocktail_image(
+    user_id: int,
+    session_id: str,
+    timeout: float = Query(default=settings.IMAGE_EVENT_WAIT_SECONDS, gt=0, le=settings.IMAGE_EVENT_MAX_WAIT_SECONDS),
+):
+    """
+    长轮询等待会话图片就绪，代替反复请求 /cocktail_image
+
+    图片已就绪时立即返回；否则在 worker 写入图片后立即返回，超时返回 pending，客户端可再次发起等待。
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+        timeout: 最长等待秒数
+
+    Returns:
+        图片事件，就绪时包含图片地址
+    """
+    event = await wait_for_session_image(user_id, session_id, timeout)
+    return _with_image_url(event)
+
+
+async def image_event_streamer(user_id: int, session_id: str, timeout: float) -> AsyncGenerator:
+    """
+    以 SSE 推送会话图片就绪事件，等待期间定时发送心跳注释
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+        timeout: 最长等待秒数
+
+    Yields:
+        SSE 消息
+    """
+    task = asyncio.create_task(wait_for_session_image(user_id, session_id, timeout))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.IMAGE_EVENT_HEARTBEAT_SECONDS)
+            if done:
+                break
+            yield format_sse_comment("keep-alive")
+        event = _with_image_url(task.result())
+        yield format_sse(event.model_dump_json(exclude_none=True), event=event.status.value)
+    finally:
+        # 客户端断开时停止等待
+        task.cancel()
+
+
+@agents_router.get("/cocktail_image/events", status_code=status.HTTP_200_OK)
+async def stream_cocktail_image_events(
+    user_id: int,
+    session_id: str,
+    timeout: float = Query(default=settings.IMAGE_EVENT_WAIT_SECONDS, gt=0, le=settings.IMAGE_EVENT_MAX_WAIT_SECONDS),
+):
+    """
+    以 SSE 推送会话图片就绪事件，推送一次 ready、failed 或 pending 事件后结束
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+        timeout: 最长等待秒数
+
+    Returns:
+        SSE 流式响应
+    """
+    return StreamingResponse(
+        image_event_streamer(user_id, session_id, timeout),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
 @agents_router.post("/make_image", status_code=status.HTTP_200_OK)
 async def make_cocktail_image(user_id: int, session_id: str):
     cocktail = """
@@ -284,4 +1019,5 @@ async def make_cocktail_image(user_id: int, session_id: str):
     """
 
     cocktail = CocktailRecommendation.model_validate_json(cocktail)
-    await generate_and_store_image(cocktail=cocktail, user_id=user_id, session_id=session_id)
+    job_id = await enqueue_image_job(cocktail=cocktail, user_id=user_id, session_id=session_id)
+    return {"job_id": job_id}
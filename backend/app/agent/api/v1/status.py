@@ -1,5 +1,9 @@
+from typing import Any
+
 from fastapi import APIRouter
 
+from backend.common.metrics import metrics
+from backend.common.security.jwt import DependsJwtAuth
 from backend.utils.timezone import current_utc_str
 
 ######################################################
@@ -19,3 +23,10 @@ def get_health() -> dict[str, str]:
         "path": "/health",
         "utc": current_utc_str(),
     }
+
+
+@status_router.get("/metrics", dependencies=[DependsJwtAuth])
+def get_metrics() -> dict[str, Any]:
+    """Export in-process metrics of this worker"""
+
+    return metrics.snapshot()
@@ -0,0 +1,2 @@
+from backend.app.agent.model.semantic_cache import BartenderSemanticCache
+from backend.common.model import MappedBase  # noqa: I
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import TIMESTAMP, Index, String, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from backend.common.model import DataClassBase, id_key
+from backend.core.conf import settings
+from backend.utils.timezone import timezone
+
+
+class BartenderSemanticCache(DataClassBase):
+    """调酒师推荐语义缓存表"""
+
+    __tablename__ = "bartender_semantic_cache"
+    __table_args__ = (
+        # 近似最近邻索引，按余弦距离检索相似的用户提示；按 agent 和选项过滤依赖 pgvector 0.8 的迭代扫描
+        Index(
+            "ix_bartender_semantic_cache_embedding",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+        # 淘汰时按 agent 找出最久未命中的条目
+        Index("ix_bartender_semantic_cache_agent_last_hit", "agent", "last_hit_time"),
+    )
+
+    id: Mapped[id_key] = mapped_column(init=False)
+    agent: Mapped[str] = mapped_column(String(50), comment="agent 名称")
+    options_hash: Mapped[str] = mapped_column(String(64), comment="结构化选项摘要，必须完全一致才能命中")
+    prompt: Mapped[str] = mapped_column(Text, comment="组装后的用户提示")
+    embedding: Mapped[list[float]] = mapped_column(
+        Vector(settings.BARTENDER_SEMANTIC_CACHE_DIMENSIONS), comment="用户提示的向量"
+    )
+    recommendation: Mapped[dict] = mapped_column(JSONB, comment="鸡尾酒推荐")
+    hits: Mapped[int] = mapped_column(init=False, default=0, comment="命中次数")
+    created_time: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), init=False, default_factory=timezone.now, comment="创建时间"
+    )
+    last_hit_time: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), init=False, default_factory=timezone.now, comment="上次命中时间"
+    )
@@ -1,7 +1,8 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from backend.common.enums import StrEnum
-from pydantic import BaseModel
+from backend.core.conf import settings
+from pydantic import BaseModel, Field
 
 
 class AgentType(StrEnum):
@@ -80,3 +81,10 @@ class BartenderRequest(AgentRequest):
             prompt += "其他条件:\n" + "\n".join(conditions)
 
         return prompt
+
+
+class BartenderBatchRequest(BaseModel):
+    """Request model for batch bartender recommendations"""
+
+    agent_type: Literal[AgentType.CLASSIC_BARTENDER, AgentType.CREATIVE_BARTENDER] = AgentType.CLASSIC_BARTENDER
+    requests: List[BartenderRequest] = Field(..., min_length=1, max_length=settings.BARTENDER_BATCH_MAX_ITEMS)
@@ -0,0 +1,51 @@
+from typing import Dict, List, Optional
+
+from backend.app.agent.schema.agent_request_schema import AlcoholLevel, DifficultyLevel
+from backend.app.agent.schema.cocktail_schema import Step
+from pydantic import BaseModel, Field
+
+
+class CatalogItem(BaseModel):
+    """酒单词表中的原料或工具"""
+
+    name: str = Field(..., description="名称")
+    alternative: Optional[str] = Field(None, description="替代品")
+    aliases: List[str] = Field(default_factory=list, description="别名，多个条目可共用同一别名")
+
+
+class CatalogIngredient(BaseModel):
+    """酒单配方中的原料"""
+
+    id: str = Field(..., description="原料ID")
+    amount: str = Field(..., description="原料用量")
+    unit: Optional[str] = Field(None, description="计量单位")
+    optional: bool = Field(False, description="是否可省略，如装饰")
+
+
+class CatalogCocktail(BaseModel):
+    """酒单中的鸡尾酒配方"""
+
+    id: str = Field(..., description="鸡尾酒ID")
+    name: str = Field(..., description="鸡尾酒名称")
+    english_name: str = Field(..., description="英文名称")
+    description: str = Field(..., description="鸡尾酒描述")
+    time_required: Optional[str] = Field(None, description="所需时间")
+    base_spirit: str = Field(..., description="基酒类型ID")
+    alcohol_level: AlcoholLevel = Field(..., description="酒精浓度")
+    difficulty_level: DifficultyLevel = Field(..., description="制作难度")
+    flavor: Dict[str, float] = Field(default_factory=dict, description="各口味维度的强度，取值 0-1")
+    flavor_profiles: List[str] = Field(..., description="口味特征")
+    ingredients: List[CatalogIngredient] = Field(..., description="原料列表")
+    steps: List[Step] = Field(..., description="制作步骤")
+    tools: List[str] = Field(default_factory=list, description="所需工具ID")
+    serving_glass: str = Field(..., description="建议使用的酒杯")
+
+
+class CatalogData(BaseModel):
+    """内置酒单"""
+
+    version: int = Field(..., description="酒单版本")
+    spirits: Dict[str, str] = Field(..., description="基酒类型ID到名称")
+    ingredients: Dict[str, CatalogItem] = Field(..., description="原料词表")
+    tools: Dict[str, CatalogItem] = Field(..., description="工具词表")
+    cocktails: List[CatalogCocktail] = Field(..., description="鸡尾酒配方")
@@ -27,6 +27,13 @@ class Tool(BaseModel):
     alternative: Optional[str] = Field(None, description="替代工具")
 
 
+class CocktailImageSubject(BaseModel):
+    """生成鸡尾酒图片所需的信息，流式推荐拿到名称后即可提交图片任务"""
+
+    name: str = Field(..., description="鸡尾酒名称")
+    english_name: Optional[str] = Field(None, description="英文名称")
+
+
 class CocktailRecommendation(BaseModel):
     """鸡尾酒推荐信息"""
 
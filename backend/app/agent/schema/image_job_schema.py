@@ -0,0 +1,58 @@
+from datetime import datetime
+from typing import Optional
+
+from backend.app.agent.schema.cocktail_schema import CocktailImageSubject
+from backend.common.enums import StrEnum
+from pydantic import BaseModel, Field
+
+
+class ImageJobStatus(StrEnum):
+    """图片生成任务状态"""
+
+    QUEUED = "queued"  # 等待处理
+    RUNNING = "running"  # 处理中
+    RETRYING = "retrying"  # 失败后等待重试
+    SUCCEEDED = "succeeded"  # 已完成
+    FAILED = "failed"  # 重试耗尽
+    CANCELLED = "cancelled"  # 已取消（提前提交的名称与最终推荐不一致等）
+
+
+class ImageJob(BaseModel):
+    """图片生成任务"""
+
+    job_id: str = Field(..., description="任务ID")
+    user_id: str = Field(..., description="用户ID")
+    session_id: str = Field(..., description="会话ID")
+    cocktail: CocktailImageSubject = Field(..., description="鸡尾酒图片信息")
+    status: ImageJobStatus = Field(default=ImageJobStatus.QUEUED, description="任务状态")
+    attempts: int = Field(default=0, description="已尝试次数")
+    error: Optional[str] = Field(default=None, description="最近一次失败原因")
+    lease_until: Optional[float] = Field(default=None, description="租约到期时间戳")
+    created_at: datetime = Field(default_factory=datetime.now, description="创建时间")
+    updated_at: datetime = Field(default_factory=datetime.now, description="更新时间")
+
+
+class ImageJobStatusResponse(BaseModel):
+    """图片生成任务状态响应"""
+
+    job_id: str
+    status: ImageJobStatus
+    attempts: int
+    error: Optional[str] = None
+
+
+class ImageEventStatus(StrEnum):
+    """会话图片事件状态"""
+
+    READY = "ready"  # 图片已可读取
+    FAILED = "failed"  # 生成失败
+    PENDING = "pending"  # 等待超时，仍未就绪
+
+
+class ImageEvent(BaseModel):
+    """会话图片事件"""
+
+    status: ImageEventStatus
+    image_key: Optional[str] = None
+    url: Optional[str] = None
+    error: Optional[str] = None
@@ -0,0 +1,135 @@
+import threading
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agno.agent import AgentKnowledge
+from agno.memory.v2.db.postgres import PostgresMemoryDb
+from agno.models.openai.like import OpenAILike
+from agno.storage.agent.postgres import PostgresAgentStorage
+from backend.app.agent.schema.agent_request_schema import AgentType
+from backend.app.agent.service.agents.offloaded_agent import OffloadedMemory
+from backend.common.log import logger
+from backend.common.metrics import metrics
+from openai import AsyncOpenAI, OpenAI
+
+
+@dataclass
+class PooledOpenAILike(OpenAILike):
+    """
+    共享底层 OpenAI 客户端的模型
+
+    agno 的 Memory / MemoryManager 会对模型做 deepcopy，默认会连同客户端一起复制，
+    这里让副本复用同一个客户端，避免每次复制都新建连接池。
+    """
+
+    def __deepcopy__(self, memo):
+        for shared in (self.client, self.async_client, self.http_client):
+            if shared is not None:
+                memo[id(shared)] = shared
+        return super().__deepcopy__(memo)
+
+
+@dataclass
+class AgentComponents:
+    """可在多次运行之间复用的 agent 重量级组件"""
+
+    agent_type: AgentType
+    model_id: str
+    model_params: Dict[str, Any]
+    client: OpenAI
+    async_client: AsyncOpenAI
+    memory_db: PostgresMemoryDb
+    knowledge: AgentKnowledge
+    storage: PostgresAgentStorage
+    tools: Optional[List[Any]] = None
+    hits: int = field(default=0, compare=False)
+
+    def new_model(self) -> PooledOpenAILike:
+        """
+        创建绑定共享客户端的模型实例
+
+        模型在运行过程中会被写入 tools / response_format 等状态，因此每次运行单独创建。
+
+        Returns:
+            绑定共享客户端的模型
+        """
+        return PooledOpenAILike(
+            id=self.model_id,
+            client=self.client,
+            async_client=self.async_client,
+            **self.model_params,
+        )
+
+    def new_memory(self, model: PooledOpenAILike) -> OffloadedMemory:
+        """
+        创建本次运行使用的 Memory，底层 memory_db 共享
+
+        构造时不读取数据库，由 OffloadedAgent 在运行前于线程池中读取。
+
+        Args:
+            model: 本次运行使用的模型
+
+        Returns:
+            Memory 实例
+        """
+        return OffloadedMemory(model=model, db=self.memory_db)
+
+
+ComponentsBuilder = Callable[[str], AgentComponents]
+
+
+class AgentPool:
+    """
+    Agent 组件池
+
+    以 (AgentType, 模型名称) 为键，每个 worker 只构建一次模型客户端、memory_db、知识库、
+    storage 和 tools，每次请求只绑定 user_id / session_id。
+    """
+
+    def __init__(self):
+        self._components: Dict[Tuple[AgentType, str], AgentComponents] = {}
+        self._lock = threading.Lock()
+
+    def get(self, agent_type: AgentType, model_id: str, builder: ComponentsBuilder) -> AgentComponents:
+        """
+        获取组件，不存在时使用 builder 构建
+
+        Args:
+            agent_type: agent 类型
+            model_id: 模型名称
+            builder: 组件构建函数
+
+        Returns:
+            可复用的 agent 组件
+        """
+        key = (agent_type, str(model_id))
+        with self._lock:
+            components = self._components.get(key)
+            if components is None:
+                components = builder(str(model_id))
+                self._components[key] = components
+                logger.info(f"Built pooled components for agent {agent_type.value}: {model_id}")
+            # 计数与构建共用同一把锁，多线程并发获取时不丢失
+            components.hits += 1
+        return components
+
+    def stats(self) -> Dict[str, int]:
+        """
+        组件池统计信息
+
+        Returns:
+            每个 (agent, model) 组合被复用的次数
+        """
+        with self._lock:
+            return {f"{agent_type.value}:{model_id}": c.hits for (agent_type, model_id), c in self._components.items()}
+
+    async def close(self) -> None:
+        """清空组件池，数据库引擎和 HTTP 客户端分别由 close_engines 和 http_clients 统一释放"""
+        with self._lock:
+            self._components.clear()
+
+
+# 创建 agent 组件池单例
+agent_pool: AgentPool = AgentPool()
+metrics.register_collector("agent_pool", agent_pool.stats)
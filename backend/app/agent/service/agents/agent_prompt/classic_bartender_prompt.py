@@ -59,6 +59,12 @@ classic_bartender_instructions = dedent("""\
    - 提供原料替代方案
    - 考虑季节性和可获得性
 
+# 工具使用
+1. 优先查询内置酒单
+   - 用户提到现有原料或基酒时,先调用 find_cocktails_by_ingredients 查找能做的经典鸡尾酒
+   - 选定鸡尾酒后,调用 search_classic_cocktail 获取准确配方,在此基础上补充推荐理由和小贴士
+2. 内置酒单中没有合适的鸡尾酒时,再使用网络搜索
+
 # 返回格式
 你必须严格按照以下 JSON 格式返回数据,不要返回任何其他内容:
 {
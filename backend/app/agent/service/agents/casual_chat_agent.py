@@ -3,58 +3,54 @@ from typing import Optional
 from agno.agent import Agent, AgentKnowledge
 from agno.embedder.openai import OpenAIEmbedder
 from agno.memory.v2.db.postgres import PostgresMemoryDb
-from agno.memory.v2.memory import Memory
-from agno.models.openai.like import OpenAILike
-from agno.storage.agent.postgres import PostgresAgentStorage
 from agno.vectordb.pgvector import PgVector
+from backend.app.agent.schema.agent_request_schema import AgentType
+from backend.app.agent.service.agents.agent_pool import AgentComponents, agent_pool
+from backend.app.agent.service.agents.offloaded_agent import OffloadedAgent
+from backend.app.agent.service.utils.session_store import WriteBehindAgentStorage
 from backend.core.conf import settings
-from backend.database.db import get_syn_db_url
+from backend.database.db import sync_engine
+from backend.utils.http_client import Upstream, http_clients
+from openai import AsyncOpenAI, OpenAI
 
 from .agent_prompt.casual_chat_prompt import casual_chat_description, casual_chat_instructions
 
-syn_db_url = get_syn_db_url()
 
-
-def get_casual_chat_agent(
-    model_id: str = "deepseek-v3-250324",
-    user_id: Optional[str] = None,
-    session_id: Optional[str] = None,
-    debug_mode: bool = True,
-) -> Agent:
-    # 定义 additional context
-    additional_context = ""
-    if user_id:
-        additional_context += "<context>"
-        additional_context += f"You are interacting with the user: {user_id}"
-        additional_context += "</context>"
-
-    # 定义模型
-    model = OpenAILike(
-        id=model_id,
+def build_casual_chat_components(model_id: str) -> AgentComponents:
+    # 定义模型客户端
+    client = OpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        http_client=http_clients.get_sync(Upstream.LLM),
+    )
+    async_client = AsyncOpenAI(
         api_key=settings.OPENAI_API_KEY,
         base_url=settings.OPENAI_BASE_URL,
+        http_client=http_clients.get_async(Upstream.LLM),
     )
 
     # 定义 persistent memory for chat history
     memory_db = PostgresMemoryDb(
         table_name="chat_memory",
-        db_url=syn_db_url,
+        db_engine=sync_engine,
         schema="public",
     )
-    memory = Memory(model=model, db=memory_db)
 
     # 定义 Embedder
     embedder = OpenAIEmbedder(
         id=settings.EMBEDDING_MODEL_NAME,
         dimensions=1024,
-        api_key=settings.EMBEDDING_API_KEY,
-        base_url=settings.EMBEDDING_BASE_URL,
+        openai_client=OpenAI(
+            api_key=settings.EMBEDDING_API_KEY,
+            base_url=settings.EMBEDDING_BASE_URL,
+            http_client=http_clients.get_sync(Upstream.EMBEDDING),
+        ),
     )
 
     # 定义 knowledge base
     knowledge = AgentKnowledge(
         vector_db=PgVector(
-            db_url=syn_db_url,
+            db_engine=sync_engine,
             table_name="chat_knowledge",
             schema="public",
             embedder=embedder,
@@ -63,17 +59,56 @@ def get_casual_chat_agent(
     )
 
     # 定义 storage
-    storage = PostgresAgentStorage(table_name="casual_chat_sessions", db_url=syn_db_url, schema="public")
+    storage = WriteBehindAgentStorage(
+        agent_type=AgentType.CASUAL_CHAT,
+        table_name="casual_chat_sessions",
+        db_engine=sync_engine,
+        schema="public",
+    )
+
+    return AgentComponents(
+        agent_type=AgentType.CASUAL_CHAT,
+        model_id=model_id,
+        model_params={"api_key": settings.OPENAI_API_KEY, "base_url": settings.OPENAI_BASE_URL},
+        client=client,
+        async_client=async_client,
+        memory_db=memory_db,
+        knowledge=knowledge,
+        storage=storage,
+    )
+
+
+def get_casual_chat_agent(
+    model_id: str = "deepseek-v3-250324",
+    user_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    debug_mode: bool = True,
+) -> Agent:
+    # 定义 additional context
+    additional_context = ""
+    if user_id:
+        additional_context += "<context>"
+        additional_context += f"You are interacting with the user: {user_id}"
+        additional_context += "</context>"
+
+    # 从组件池获取可复用组件
+    components = agent_pool.get(AgentType.CASUAL_CHAT, model_id, build_casual_chat_components)
+
+    # 定义模型
+    model = components.new_model()
+
+    # 定义 memory
+    memory = components.new_memory(model)
 
     # 组合成 agent
-    casual_chat_agent = Agent(
+    casual_chat_agent = OffloadedAgent(
         name="Casual_chat",
         agent_id="casual_chat",
         user_id=user_id,
         session_id=session_id,
         model=model,
-        storage=storage,
-        knowledge=knowledge,
+        storage=components.storage,
+        knowledge=components.knowledge,
         search_knowledge=True,
         memory=memory,
         description=casual_chat_description,
@@ -83,6 +118,7 @@ def get_casual_chat_agent(
         add_datetime_to_instructions=True,
         add_history_to_messages=True,
         num_history_responses=10,
+        history_token_budget=settings.AGENT_HISTORY_TOKEN_BUDGET.get(AgentType.CASUAL_CHAT.value, 0),
         read_chat_history=True,
         debug_mode=debug_mode,
         monitoring=True,
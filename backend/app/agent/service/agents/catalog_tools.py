@@ -0,0 +1,102 @@
+import json
+
+from typing import List, Optional
+
+from agno.tools import Toolkit
+from backend.app.agent.schema.agent_request_schema import AlcoholLevel, DifficultyLevel
+from backend.app.agent.service.utils.cocktail_catalog import FLAVOR_DIMENSIONS, get_cocktail_catalog
+
+
+def _parse_enum(enum_cls, value: Optional[str]):
+    try:
+        return None if value is None else enum_cls(value)
+    except ValueError:
+        return None
+
+
+class CocktailCatalogTools(Toolkit):
+    """
+    内置经典酒单工具
+
+    在内存索引中查询经典配方，毫秒内返回，agent 应优先使用，找不到时再进行网络搜索或自行创作。
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(name="cocktail_catalog", **kwargs)
+        self.register(self.search_classic_cocktail)
+        self.register(self.find_cocktails_by_ingredients)
+
+    def search_classic_cocktail(self, name: str) -> str:
+        """Use this function to get the exact recipe of a classic cocktail from the local catalog.
+
+        Args:
+            name (str): Chinese or English name of the cocktail, e.g. "莫吉托" or "Mojito".
+
+        Returns:
+            The recipe as JSON, or a message saying the cocktail is not in the catalog.
+        """
+        catalog = get_cocktail_catalog()
+        cocktail = catalog.get(name)
+        if cocktail is None:
+            return f"{name} is not in the local catalog."
+        recipe = catalog.to_recommendation(cocktail, match_reason="").model_dump(exclude={"match_reason"})
+        return json.dumps(recipe, ensure_ascii=False)
+
+    def find_cocktails_by_ingredients(
+        self,
+        ingredients: List[str],
+        tools: Optional[List[str]] = None,
+        max_missing: int = 0,
+        alcohol_level: Optional[str] = None,
+        difficulty_level: Optional[str] = None,
+        flavors: Optional[List[str]] = None,
+        limit: int = 5,
+    ) -> str:
+        """Use this function to find classic cocktails that can be made with what the user has.
+
+        Args:
+            ingredients (List[str]): Spirits and other ingredients the user has, in Chinese or English.
+            tools (Optional[List[str]]): Bar tools the user has. Omit when unknown; pass [] when the user has none.
+            max_missing (int): How many required ingredients may be missing. Defaults to 0.
+            alcohol_level (Optional[str]): One of "low", "medium", "high".
+            difficulty_level (Optional[str]): Highest acceptable difficulty, one of "easy", "medium", "hard".
+            flavors (Optional[List[str]]): Preferred flavors used for ranking, from: sweet, sour, bitter, strong,
+                fruity, herbal, creamy, refreshing, spicy, smoky.
+            limit (int): Maximum number of cocktails to return. Defaults to 5.
+
+        Returns:
+            Matching cocktails as JSON with the ingredients each one is missing, and the names that were not recognized.
+        """
+        catalog = get_cocktail_catalog()
+        ingredient_ids, unknown = catalog.ingredients.resolve(ingredients)
+        tool_ids = None
+        if tools is not None:
+            tool_ids, unknown_tools = catalog.tools.resolve(tools)
+            unknown += unknown_tools
+        matches = catalog.find_makeable(
+            ingredient_ids,
+            tools=tool_ids,
+            max_missing=max(max_missing, 0),
+            alcohol_level=_parse_enum(AlcoholLevel, alcohol_level),
+            difficulty_level=_parse_enum(DifficultyLevel, difficulty_level),
+            flavors=[flavor for flavor in flavors or [] if flavor in FLAVOR_DIMENSIONS],
+            limit=min(max(limit, 1), 20),
+        )
+        names = catalog.ingredients.items
+        result = {
+            "cocktails": [
+                {
+                    "name": match.cocktail.name,
+                    "english_name": match.cocktail.english_name,
+                    "base_spirit": catalog.spirits.get(match.cocktail.base_spirit, match.cocktail.base_spirit),
+                    "alcohol_level": match.cocktail.alcohol_level.value,
+                    "difficulty_level": match.cocktail.difficulty_level.value,
+                    "flavor_profiles": match.cocktail.flavor_profiles,
+                    "ingredients": [names[item.id].name for item in match.cocktail.ingredients],
+                    "missing_ingredients": [names[item_id].name for item_id in match.missing],
+                }
+                for match in matches
+            ],
+            "unrecognized": unknown,
+        }
+        return json.dumps(result, ensure_ascii=False)
@@ -3,61 +3,58 @@ from typing import Optional
 from agno.agent import Agent, AgentKnowledge
 from agno.embedder.openai import OpenAIEmbedder
 from agno.memory.v2.db.postgres import PostgresMemoryDb
-from agno.memory.v2.memory import Memory
-from agno.models.openai.like import OpenAILike
-from agno.storage.agent.postgres import PostgresAgentStorage
 from agno.tools.duckduckgo import DuckDuckGoTools
 from agno.vectordb.pgvector import PgVector
+from backend.app.agent.schema.agent_request_schema import AgentType
 from backend.app.agent.schema.cocktail_schema import CocktailRecommendation
+from backend.app.agent.service.agents.agent_pool import AgentComponents, agent_pool
+from backend.app.agent.service.agents.catalog_tools import CocktailCatalogTools
+from backend.app.agent.service.agents.offloaded_agent import OffloadedAgent
+from backend.app.agent.service.agents.structured_agent import StreamingStructuredAgent
+from backend.app.agent.service.utils.session_store import WriteBehindAgentStorage
 from backend.core.conf import settings
-from backend.database.db import get_syn_db_url
+from backend.database.db import sync_engine
+from backend.utils.http_client import Upstream, http_clients
+from openai import AsyncOpenAI, OpenAI
 
 from .agent_prompt.classic_bartender_prompt import classic_bartender_description, classic_bartender_instructions
 
-syn_db_url = get_syn_db_url()
 
-
-def get_classic_bartender(
-    model_id: str = "deepseek-v3-250324",
-    user_id: Optional[str] = None,
-    session_id: Optional[str] = None,
-    debug_mode: bool = True,
-) -> Agent:
-    # 定义 additional context
-    additional_context = ""
-    if user_id:
-        additional_context += "<context>"
-        additional_context += f"You are interacting with the user: {user_id}"
-        additional_context += "</context>"
-
-    # 定义模型
-    model = OpenAILike(
-        id=model_id,
+def build_classic_bartender_components(model_id: str) -> AgentComponents:
+    # 定义模型客户端
+    client = OpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        http_client=http_clients.get_sync(Upstream.LLM),
+    )
+    async_client = AsyncOpenAI(
         api_key=settings.OPENAI_API_KEY,
         base_url=settings.OPENAI_BASE_URL,
-        temperature=0.7,
+        http_client=http_clients.get_async(Upstream.LLM),
     )
 
     # 定义 persistent memory for chat history
     memory_db = PostgresMemoryDb(
         table_name="classic_bartender_memory",
-        db_url=syn_db_url,
+        db_engine=sync_engine,
         schema="public",
     )
-    memory = Memory(model=model, db=memory_db)
 
     # 定义 Embedder
     embedder = OpenAIEmbedder(
         id=settings.SILICONFLOW_MODEL_NAME,
         dimensions=1024,
-        api_key=settings.SILICONFLOW_API_KEY,
-        base_url=settings.SILICONFLOW_BASE_URL,
+        openai_client=OpenAI(
+            api_key=settings.SILICONFLOW_API_KEY,
+            base_url=settings.SILICONFLOW_BASE_URL,
+            http_client=http_clients.get_sync(Upstream.EMBEDDING),
+        ),
     )
     # TODO: 需要修改，从数据库中获取
     # 定义 knowledge base
     knowledge = AgentKnowledge(
         vector_db=PgVector(
-            db_url=syn_db_url,
+            db_engine=sync_engine,
             table_name="classic_bartender_knowledge",
             schema="public",
             embedder=embedder,
@@ -66,20 +63,62 @@ def get_classic_bartender(
     )
 
     # 定义 storage
-    storage = PostgresAgentStorage(table_name="classic_bartender_storage", db_url=syn_db_url, schema="public")
+    storage = WriteBehindAgentStorage(
+        agent_type=AgentType.CLASSIC_BARTENDER,
+        table_name="classic_bartender_storage",
+        db_engine=sync_engine,
+        schema="public",
+    )
 
-    # 定义 tools
-    tools = [DuckDuckGoTools()]
+    # 定义 tools，内置酒单在前，找不到时再进行网络搜索
+    tools = [CocktailCatalogTools(), DuckDuckGoTools()]
 
-    # 组合成 agent
-    classic_bartender_agent = Agent(
+    return AgentComponents(
+        agent_type=AgentType.CLASSIC_BARTENDER,
+        model_id=model_id,
+        model_params={"api_key": settings.OPENAI_API_KEY, "base_url": settings.OPENAI_BASE_URL, "temperature": 0.7},
+        client=client,
+        async_client=async_client,
+        memory_db=memory_db,
+        knowledge=knowledge,
+        storage=storage,
+        tools=tools,
+    )
+
+
+def get_classic_bartender(
+    model_id: str = "deepseek-v3-250324",
+    user_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    debug_mode: bool = True,
+    stream: bool = False,
+) -> Agent:
+    # 定义 additional context
+    additional_context = ""
+    if user_id:
+        additional_context += "<context>"
+        additional_context += f"You are interacting with the user: {user_id}"
+        additional_context += "</context>"
+
+    # 从组件池获取可复用组件
+    components = agent_pool.get(AgentType.CLASSIC_BARTENDER, model_id, build_classic_bartender_components)
+
+    # 定义模型
+    model = components.new_model()
+
+    # 定义 memory
+    memory = components.new_memory(model)
+
+    # 组合成 agent，流式输出时由调用方增量解析 JSON，尽早返回已完整的字段
+    agent_cls = StreamingStructuredAgent if stream else OffloadedAgent
+    classic_bartender_agent = agent_cls(
         name="Classic Bartender",
         agent_id="classic_bartender",
         user_id=user_id,
         session_id=session_id,
         model=model,
-        storage=storage,
-        knowledge=knowledge,
+        storage=components.storage,
+        knowledge=components.knowledge,
         search_knowledge=True,
         memory=memory,
         enable_user_memories=True,
@@ -91,7 +130,7 @@ def get_classic_bartender(
         num_history_responses=10,
         read_chat_history=True,
         debug_mode=debug_mode,
-        tools=tools,
+        tools=components.tools,
         show_tool_calls=True,
         monitoring=True,
         response_model=CocktailRecommendation,
@@ -0,0 +1,273 @@
+import asyncio
+
+from typing import Any, AsyncIterator, Dict, List, Optional
+from uuid import uuid4
+
+from agno.agent import Agent
+from agno.memory.v2.memory import Memory, SessionSummary
+from agno.models.message import Message
+from agno.run.messages import RunMessages
+from agno.run.response import RunResponse
+from agno.storage.session.agent import AgentSession
+from backend.app.agent.service.utils.agent_io import agent_io
+from backend.app.agent.service.utils.history_budget import (
+    HistorySummary,
+    get_history_summary,
+    history_messages,
+    message_tokens,
+    schedule_history_summary,
+    split_history,
+    unsummarized_runs,
+)
+from backend.app.agent.service.utils.session_store import WriteBehindAgentStorage
+from backend.common.metrics import metrics
+
+
+class OffloadedMemory(Memory):
+    """
+    读写 memory_db 时不阻塞事件循环的 Memory
+
+    agno 的 Memory 在构造时同步读取整张 memory 表，异步方法内部也同步写库。
+    这里把读取推迟到 ahydrate，异步方法整体改为在 agent I/O 线程池中运行对应的同步版本。
+    """
+
+    def __init__(self, db=None, **kwargs):
+        super().__init__(**kwargs)
+        self.db = db
+        self.hydrated = False
+
+    def hydrate_from_db(self):
+        super().hydrate_from_db()
+        self.hydrated = True
+
+    async def ahydrate(self) -> None:
+        """首次使用前在线程池中读取 memory 表"""
+        if self.db is not None and not self.hydrated:
+            await agent_io.run(self.hydrate_from_db)
+
+    async def acreate_user_memories(
+        self, message: Optional[str] = None, messages: Optional[List[Message]] = None, user_id: Optional[str] = None
+    ) -> str:
+        return await agent_io.run(self.create_user_memories, message=message, messages=messages, user_id=user_id)
+
+    async def acreate_session_summary(self, session_id: str, user_id: Optional[str] = None) -> Optional[SessionSummary]:
+        return await agent_io.run(self.create_session_summary, session_id=session_id, user_id=user_id)
+
+    async def aupdate_memory_task(self, task: str, user_id: Optional[str] = None) -> str:
+        return await agent_io.run(self.update_memory_task, task=task, user_id=user_id)
+
+
+class OffloadedAgent(Agent):
+    """
+    会话存储、memory 和知识库 I/O 不阻塞事件循环的 agent
+
+    agno 的 arun 在事件循环中同步读写会话存储和知识库。这里在 arun 开始前于线程池中预先读取会话和 memory，
+    运行中的读取直接使用预读结果；写入在事件循环中只生成会话快照，实际写库交给线程池并按顺序执行，
+    arun 返回（流式时为迭代结束）前等待写入完成，调用方看到的持久化语义不变。
+    存储为 WriteBehindAgentStorage 时读写经由 Redis，见其说明：Redis 中有该会话时只读取历史窗口，
+    memory 中只有最近几次运行，写入时只追加本次新增的运行；read_chat_history 工具也只能看到窗口内的历史。
+    设置 history_token_budget 时，只原样发送预算内最近几次运行的历史，更早的运行由响应后在后台更新的滚动摘要代替；
+    摘要尚未覆盖的运行仍原样发送。
+    """
+
+    def __init__(self, history_token_budget: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        # 原样发送的历史 token 预算，超出部分以滚动摘要代替，0 表示不限制
+        self.history_token_budget = history_token_budget
+        self._history_summary: Optional[HistorySummary] = None
+        self._preloaded_session_id: Optional[str] = None
+        self._pending_write: Optional[asyncio.Future] = None
+        # 从历史窗口读取时，memory 中已写入存储的运行数；None 表示 memory 中为完整会话
+        self._stored_runs: Optional[int] = None
+
+    def read_from_storage(self, session_id: str, user_id: Optional[str] = None) -> Optional[AgentSession]:
+        if session_id is not None and session_id == self._preloaded_session_id:
+            return self.agent_session
+        return super().read_from_storage(session_id=session_id, user_id=user_id)
+
+    def write_to_storage(self, session_id: str, user_id: Optional[str] = None) -> Optional[AgentSession]:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # 已在线程池或同步上下文中，直接写入
+            if self._stored_runs is not None:
+                # memory 中只有历史窗口，整体写入会丢失更早的运行
+                raise RuntimeError("Windowed agent session must be written with awrite_to_storage")
+            return super().write_to_storage(session_id=session_id, user_id=user_id)
+        if self.storage is None:
+            return self.agent_session
+        session = self.get_agent_session(session_id=session_id, user_id=user_id)
+        new_runs = None
+        if self._stored_runs is not None:
+            runs = self.memory.runs.get(session_id, [])
+            new_runs, self._stored_runs = runs[self._stored_runs :], len(runs)
+        self._pending_write = asyncio.ensure_future(self._write_session(self._pending_write, session, new_runs))
+        return self.agent_session
+
+    async def _write_session(
+        self, previous: Optional[asyncio.Future], session: AgentSession, new_runs: Optional[List[RunResponse]]
+    ) -> None:
+        # 同一 agent 的写入按提交顺序执行，避免旧快照覆盖新快照
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        if new_runs is not None:
+            self.agent_session = await self.storage.aappend(session, new_runs)
+        elif isinstance(self.storage, WriteBehindAgentStorage):
+            self.agent_session = await self.storage.aupsert(session)
+        else:
+            self.agent_session = await agent_io.run(self.storage.upsert, session=session)
+
+    async def awrite_to_storage(self, session_id: str, user_id: Optional[str] = None) -> Optional[AgentSession]:
+        """
+        写入会话并等待完成
+
+        Args:
+            session_id: 会话ID
+            user_id: 用户ID
+
+        Returns:
+            写入的会话
+        """
+        self.write_to_storage(session_id=session_id, user_id=user_id)
+        await self.aflush_storage()
+        return self.agent_session
+
+    async def aflush_storage(self) -> None:
+        """等待已提交的会话写入完成"""
+        self._preloaded_session_id = None
+        pending, self._pending_write = self._pending_write, None
+        if pending is not None:
+            await pending
+
+    async def aread_from_storage(self, session_id: str, user_id: Optional[str] = None) -> Optional[AgentSession]:
+        """
+        读取会话和 memory，之后本次运行中的 read_from_storage 直接使用读取结果
+
+        Args:
+            session_id: 会话ID
+            user_id: 用户ID
+
+        Returns:
+            读取的会话，不存在时返回None
+        """
+        self._preloaded_session_id = None
+        self._stored_runs = None
+        if isinstance(self.memory, OffloadedMemory):
+            await self.memory.ahydrate()
+        if self._history_budgeted:
+            self._history_summary = await get_history_summary(self.agent_id, session_id)
+        window = None
+        if isinstance(self.storage, WriteBehindAgentStorage) and isinstance(self.memory, Memory):
+            window = await self.storage.aread_window(session_id, user_id=user_id)
+        if window is not None:
+            self.agent_session, runs = window
+            self.load_agent_session(session=self.agent_session)
+            if self.memory.runs is None:
+                self.memory.runs = {}
+            self.memory.runs[session_id] = runs
+            self._stored_runs = len(runs)
+        elif isinstance(self.storage, WriteBehindAgentStorage):
+            # 与 Agent.read_from_storage 一致地加载会话
+            self.agent_session = await self.storage.aread(session_id=session_id, user_id=user_id)
+            if self.agent_session is not None:
+                self.load_agent_session(session=self.agent_session)
+            else:
+                self.session_name = None
+        elif self.storage is not None:
+            await agent_io.run(super().read_from_storage, session_id=session_id, user_id=user_id)
+        self._preloaded_session_id = session_id
+        return self.agent_session
+
+    @property
+    def _history_budgeted(self) -> bool:
+        return (
+            self.history_token_budget > 0
+            and self.add_history_to_messages
+            and self.agent_id is not None
+            and isinstance(self.memory, Memory)
+        )
+
+    def get_run_messages(self, *, session_id: str, **kwargs: Any) -> RunMessages:
+        run_messages = super().get_run_messages(session_id=session_id, **kwargs)
+        if self._history_budgeted:
+            self._apply_history_budget(run_messages, session_id)
+        return run_messages
+
+    def _apply_history_budget(self, run_messages: RunMessages, session_id: str) -> None:
+        # agno 已按 num_history_runs 加入历史，这里只保留预算内最近几次运行的消息，更早的以摘要代替；
+        # 尚未并入摘要的运行即使超出预算也原样保留，否则在摘要更新前这些内容会丢失
+        before = sum(message_tokens(m) for m in run_messages.messages)
+        runs = (self.memory.runs or {}).get(session_id, [])
+        older, recent = split_history(
+            runs, self.history_token_budget, self.num_history_runs, skip_role=self.system_message_role
+        )
+        kept = unsummarized_runs(older, self._history_summary) + recent
+        older = older[: len(older) + len(recent) - len(kept)]
+        keep = sum(len(history_messages(run, skip_role=self.system_message_role)) for run in kept)
+        history = [m for m in run_messages.messages if m.from_history]
+        dropped = {id(m) for m in history[: len(history) - keep]}
+        run_messages.messages = [m for m in run_messages.messages if id(m) not in dropped]
+        if older and self._history_summary is not None:
+            summary = (
+                "Here is a summary of the earlier part of this conversation:\n\n"
+                f"<summary_of_previous_interactions>\n{self._history_summary.text}\n</summary_of_previous_interactions>"
+            )
+            if run_messages.system_message is not None and isinstance(run_messages.system_message.content, str):
+                run_messages.system_message.content += f"\n\n{summary}"
+            else:
+                run_messages.messages.insert(0, Message(role=self.system_message_role, content=summary))
+        after = sum(message_tokens(m) for m in run_messages.messages)
+        metrics.observe("agent_prompt_tokens", before, agent=self.agent_id, stage="full")
+        metrics.observe("agent_prompt_tokens", after, agent=self.agent_id, stage="budgeted")
+
+    def _schedule_history_summary(self, session_id: str) -> None:
+        if self._history_budgeted and self.model is not None:
+            schedule_history_summary(
+                self.model.get_async_client(),
+                self.model.id,
+                self.agent_id,
+                session_id,
+                (self.memory.runs or {}).get(session_id, []),
+                self.history_token_budget,
+                self.num_history_runs,
+            )
+
+    async def _flush_after(self, iterator: AsyncIterator, session_id: str) -> AsyncIterator:
+        async for item in iterator:
+            yield item
+        await self.aflush_storage()
+        self._schedule_history_summary(session_id)
+
+    async def arun(
+        self,
+        message: Any = None,
+        *,
+        stream: Optional[bool] = None,
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Any:
+        # 与 Agent.arun 一致地确定 user_id / session_id，以便提前读取会话
+        if user_id is None:
+            user_id = self.user_id
+        if not session_id:
+            if not self.session_id:
+                self.session_id = str(uuid4())
+            session_id = self.session_id
+        await self.aread_from_storage(session_id, user_id)
+        try:
+            response = await super().arun(message, stream=stream, user_id=user_id, session_id=session_id, **kwargs)
+        except BaseException:
+            self._preloaded_session_id = None
+            raise
+        if hasattr(response, "__aiter__"):
+            return self._flush_after(response, session_id)
+        await self.aflush_storage()
+        self._schedule_history_summary(session_id)
+        return response
+
+    async def aget_relevant_docs_from_knowledge(
+        self, query: str, num_documents: Optional[int] = None, **kwargs
+    ) -> Optional[List[Dict[str, Any]]]:
+        # PgVector 没有异步检索，agno 会在事件循环中回退到同步检索
+        return await agent_io.run(self.get_relevant_docs_from_knowledge, query, num_documents, **kwargs)
@@ -0,0 +1,17 @@
+from backend.app.agent.service.agents.offloaded_agent import OffloadedAgent
+
+
+class StreamingStructuredAgent(OffloadedAgent):
+    """
+    流式输出结构化结果的 agent
+
+    设置了 response_model 时 agno 会强制关闭流式输出，只在生成完毕后整体解析。
+    这里改用 JSON 模式并保留流式输出，模型输出原样交给调用方增量解析。
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(use_json_mode=True, parse_response=False, **kwargs)
+
+    @property
+    def is_streamable(self) -> bool:
+        return True
@@ -0,0 +1,76 @@
+import asyncio
+import functools
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from backend.common.metrics import metrics
+from backend.core.conf import settings
+
+T = TypeVar("T")
+
+
+class AgentIOExecutor:
+    """
+    agent 持久化 I/O 专用线程池
+
+    agno 的会话存储、memory 和知识库都基于同步引擎，在 async 处理函数中直接调用会阻塞事件循环，
+    拖慢同一 worker 上所有正在进行的流式输出。这些调用统一经由这里进入有界线程池，
+    与 asyncio 默认线程池（图片冷存储、嵌入等）隔离，数据库慢时排队而不是无限占用线程。
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="agent-io")
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        在线程池中执行同步调用
+
+        Args:
+            func: 同步函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            函数返回值
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._pending += 1
+        try:
+            return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        线程池统计信息
+
+        Returns:
+            最大线程数和正在执行或排队的调用数
+        """
+        return {"max_workers": self.max_workers, "pending": self._pending}
+
+    def shutdown(self) -> None:
+        """等待已提交的调用完成后关闭线程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+# 创建 agent I/O 线程池单例
+agent_io: AgentIOExecutor = AgentIOExecutor(settings.AGENT_IO_MAX_WORKERS)
+metrics.register_collector("agent_io", agent_io.stats)
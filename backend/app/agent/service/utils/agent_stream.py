@@ -0,0 +1,488 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+from asyncio import FIRST_COMPLETED
+from typing import Any, AsyncGenerator, Dict, List, Optional, Set, Tuple
+
+from agno.agent import Agent
+from agno.run.response import RunEvent, RunResponse
+from agno.utils.string import parse_response_model_str
+from backend.common.enums import StrEnum
+from backend.common.log import logger
+from backend.common.metrics import metrics
+from backend.core.conf import settings
+from backend.database.redis import redis_client
+from backend.utils.json_stream import JsonObjectStreamParser
+from backend.utils.sse import format_sse, format_sse_comment
+from backend.utils.token_counter import estimate_tokens
+from fastapi import Request
+
+# Redis 键前缀
+AGENT_STREAM_PREFIX = "agent_stream"
+
+# 读者租约和写入方存活标记的键后缀
+_READER_SUFFIX = "reader"
+_WRITER_SUFFIX = "writer"
+
+# 写入方存活标记的过期时间（秒），写入方至少每个检测间隔续期一次
+_WRITER_TTL_SECONDS = 5
+
+# 生产者结束标记
+_DONE = object()
+
+# 本进程中运行的 agent 任务，保留引用防止被回收
+_running_runs: Set[asyncio.Task] = set()
+
+
+class CompletionLengthTracker:
+    """
+    按 agent 记录完整回复的平均 token 数（指数移动平均），用于估算取消运行节省的 token
+    """
+
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._averages: Dict[str, float] = {}
+
+    def record(self, agent_name: str, tokens: int) -> None:
+        """
+        记录一次完整回复的 token 数
+
+        Args:
+            agent_name: agent 名称
+            tokens: 回复 token 数
+        """
+        with self._lock:
+            average = self._averages.get(agent_name)
+            self._averages[agent_name] = tokens if average is None else average + self.alpha * (tokens - average)
+
+    def estimate_saved(self, agent_name: str, generated: int) -> int:
+        """
+        估算取消运行节省的 token 数
+
+        Args:
+            agent_name: agent 名称
+            generated: 取消前已生成的 token 数
+
+        Returns:
+            平均回复长度减去已生成长度，没有历史数据时为 0
+        """
+        with self._lock:
+            average = self._averages.get(agent_name)
+        if average is None:
+            return 0
+        return max(int(average) - generated, 0)
+
+
+completion_lengths = CompletionLengthTracker()
+
+
+def _retrieve_result(task: asyncio.Task) -> None:
+    # 生产者的异常已由消费方抛出或随取消丢弃，避免 "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+class StreamEvent(StrEnum):
+    """agent 流式输出的 SSE 事件类型"""
+
+    DELTA = "delta"  # 回复增量
+    TOOL_CALL = "tool_call"  # 工具调用开始或结束
+    USAGE = "usage"  # token 用量
+    DONE = "done"  # 正常结束
+    ERROR = "error"  # 运行出错
+    FIELD = "field"  # 结构化结果中已完整的顶层字段
+    RESULT = "result"  # 校验后的完整结构化结果
+
+
+class DeltaCoalescer:
+    """
+    合并细碎的回复增量
+
+    缓冲的字符数达到上限，或最早一段缓冲的等待时间达到上限时输出，既减少写次数，又限制了额外延迟。
+    """
+
+    def __init__(self, max_chars: int, max_latency: float):
+        self.max_chars = max_chars
+        self.max_latency = max_latency
+        self._parts: List[str] = []
+        self._chars = 0
+        self._first_at: Optional[float] = None
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """缓冲最晚需要输出的时间"""
+        return None if self._first_at is None else self._first_at + self.max_latency
+
+    def add(self, text: str) -> None:
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+        self._parts.append(text)
+        self._chars += len(text)
+
+    def due(self, now: float) -> bool:
+        return self._chars >= self.max_chars or (self._first_at is not None and now >= self.deadline)
+
+    def drain(self) -> str:
+        text = "".join(self._parts)
+        self._parts, self._chars, self._first_at = [], 0, None
+        return text
+
+
+def _usage_payload(agent: Agent, generated: int) -> Dict[str, Any]:
+    run_metrics = (agent.run_response.metrics if agent.run_response else None) or {}
+    usage = {key: sum(run_metrics.get(key) or []) for key in ("input_tokens", "output_tokens", "total_tokens")}
+    if not usage["output_tokens"]:
+        # 上游未返回用量时给出估算值
+        usage = {"output_tokens": generated, "estimated": True}
+    return usage
+
+
+def _tool_call_payload(chunk: RunResponse) -> Dict[str, Any]:
+    tool = chunk.tools[-1] if chunk.tools else {}
+    return {
+        "status": "started" if chunk.event == RunEvent.tool_call_started.value else "completed",
+        "tool_call_id": tool.get("tool_call_id"),
+        "tool_name": tool.get("tool_name"),
+        "tool_args": tool.get("tool_args"),
+    }
+
+
+def _record_run(agent_name: str, result: str, generated: int) -> None:
+    metrics.incr("agent_stream_runs_total", agent=agent_name, result=result)
+    metrics.incr("agent_stream_tokens_total", generated, agent=agent_name)
+    if result == "completed":
+        completion_lengths.record(agent_name, generated)
+    elif result == "cancelled":
+        saved = completion_lengths.estimate_saved(agent_name, generated)
+        metrics.incr("agent_stream_tokens_saved_total", saved, agent=agent_name)
+
+
+def agent_stream_key(user_id: int, session_id: str, stream_id: str) -> str:
+    """
+    agent 运行输出缓冲的键
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+        stream_id: 运行输出流ID
+
+    Returns:
+        Redis Stream 键
+    """
+    return f"{AGENT_STREAM_PREFIX}:{user_id}:{session_id}:{stream_id}"
+
+
+def _parse_entry_id(entry_id: str) -> Tuple[int, int]:
+    milliseconds, sequence = entry_id.split("-")
+    return int(milliseconds), int(sequence)
+
+
+async def _append_events(key: str, events: List[Tuple[StreamEvent, Dict[str, Any]]], check_reader: bool) -> bool:
+    # 写入事件并续期写入方存活标记，需要时一并检查读者租约，整批只需一次往返
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for event, data in events:
+            fields = {"event": event.value, "data": json.dumps(data, ensure_ascii=False, separators=(",", ":"))}
+            pipe.xadd(key, fields, maxlen=settings.AGENT_STREAM_BUFFER_MAXLEN, approximate=True)
+        if events:
+            pipe.expire(key, settings.AGENT_STREAM_BUFFER_EXPIRE_SECONDS)
+        pipe.set(f"{key}:{_WRITER_SUFFIX}", 1, ex=_WRITER_TTL_SECONDS)
+        if check_reader:
+            pipe.exists(f"{key}:{_READER_SUFFIX}")
+        results = await pipe.execute()
+    return bool(results[-1]) if check_reader else True
+
+
+async def _pump_agent_run(agent: Agent, message: str, key: str, agent_name: str) -> None:
+    # 不限长度：生产者不会阻塞在入队上，取消时总是停在读取上游响应处，从而关闭上游连接
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce() -> None:
+        run_response = await agent.arun(message, stream=True, stream_intermediate_steps=True)
+        async for chunk in run_response:
+            logger.debug(f"Chunk: {chunk}")
+            await queue.put(chunk)
+        await queue.put(_DONE)
+
+    poll_interval = settings.AGENT_STREAM_DISCONNECT_POLL_SECONDS
+    coalescer = DeltaCoalescer(settings.AGENT_STREAM_COALESCE_CHARS, settings.AGENT_STREAM_COALESCE_LATENCY_SECONDS)
+    producer = asyncio.create_task(produce())
+    producer.add_done_callback(_retrieve_result)
+    getter = None
+    generated = 0
+    result = "cancelled"
+    last_check = time.monotonic()
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(queue.get())
+            now = time.monotonic()
+            deadline = last_check + poll_interval
+            if coalescer.deadline is not None:
+                deadline = min(deadline, coalescer.deadline)
+            # 生产者正常结束后结束标记已在队列中，只需等待取出
+            waits = {getter} if producer.done() and not producer.exception() else {getter, producer}
+            done, _ = await asyncio.wait(waits, timeout=max(deadline - now, 0), return_when=FIRST_COMPLETED)
+
+            # 本轮产生的事件合并为一次写入
+            events: List[Tuple[StreamEvent, Dict[str, Any]]] = []
+            finished = False
+            if getter in done:
+                item, getter = getter.result(), None
+                if item is _DONE:
+                    if coalescer.deadline is not None:
+                        events.append((StreamEvent.DELTA, {"content": coalescer.drain()}))
+                    events.append((StreamEvent.USAGE, _usage_payload(agent, generated)))
+                    run_id = agent.run_response.run_id if agent.run_response else None
+                    events.append((StreamEvent.DONE, {"run_id": run_id, "session_id": agent.session_id}))
+                    result, finished = "completed", True
+                elif item.event == RunEvent.run_response.value:
+                    if isinstance(item.content, str) and item.content:
+                        generated += estimate_tokens(item.content)
+                        coalescer.add(item.content)
+                elif item.event in (RunEvent.tool_call_started.value, RunEvent.tool_call_completed.value):
+                    # 工具事件前先输出已缓冲的增量，保持顺序
+                    if coalescer.deadline is not None:
+                        events.append((StreamEvent.DELTA, {"content": coalescer.drain()}))
+                    events.append((StreamEvent.TOOL_CALL, _tool_call_payload(item)))
+            elif producer in done:
+                # agent 运行出错，已输出的内容保留，以 error 事件结束
+                logger.error(f"{agent_name} run failed: {producer.exception()!r}")
+                if coalescer.deadline is not None:
+                    events.append((StreamEvent.DELTA, {"content": coalescer.drain()}))
+                events.append((StreamEvent.ERROR, {"message": "Agent run failed"}))
+                result, finished = "error", True
+
+            now = time.monotonic()
+            if coalescer.due(now):
+                events.append((StreamEvent.DELTA, {"content": coalescer.drain()}))
+            # 按间隔确认仍有读者，读者租约过期说明客户端断开后没有在宽限期内重连
+            check_reader = not finished and now - last_check >= poll_interval
+            if check_reader:
+                last_check = now
+            if (events or check_reader) and not await _append_events(key, events, check_reader):
+                logger.info(f"No reader for {agent_name} run, cancel it after {generated} tokens")
+                # 宽限期后才重连的读者补发完缓冲即可结束
+                await _append_events(key, [(StreamEvent.ERROR, {"message": "Agent run cancelled"})], False)
+                break
+            if finished:
+                break
+    except Exception as e:
+        # 无法写入缓冲时客户端收不到后续内容，继续运行没有意义
+        logger.error(f"Failed to buffer {agent_name} run output: {str(e)}")
+        result = "error"
+    finally:
+        if getter is not None:
+            getter.cancel()
+        # 只取消一次、不等待：等待时若当前任务也被取消，会把取消再次传给生产者，
+        # 打断 httpcore 关闭上游连接的清理过程，导致上游流继续生成
+        producer.cancel()
+        _record_run(agent_name, result, generated)
+
+
+async def start_agent_run(agent: Agent, message: str, user_id: int, session_id: str, agent_name: str) -> str:
+    """
+    在后台启动 agent 运行，输出写入 Redis Stream 缓冲
+
+    运行与请求连接解耦：客户端断线后带 Last-Event-ID 重连（可以落在其他进程），先补发缓冲中的事件再继续接收实时输出；
+    超过 AGENT_STREAM_RESUME_GRACE_SECONDS 没有读者时取消运行，不再消耗 token，agent 也不会写入记忆和会话存储。
+
+    Args:
+        agent: agent 实例
+        message: 用户消息
+        user_id: 用户ID
+        session_id: 会话ID
+        agent_name: agent 名称，用于指标
+
+    Returns:
+        运行输出流ID
+    """
+    stream_id = uuid.uuid4().hex
+    key = agent_stream_key(user_id, session_id, stream_id)
+    # 先登记读者租约和写入方标记：首个读者连接前运行不会被取消，读者也不会误判运行已中断
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.set(f"{key}:{_READER_SUFFIX}", 1, ex=settings.AGENT_STREAM_RESUME_GRACE_SECONDS)
+        pipe.set(f"{key}:{_WRITER_SUFFIX}", 1, ex=_WRITER_TTL_SECONDS)
+        await pipe.execute()
+    task = asyncio.create_task(_pump_agent_run(agent, message, key, agent_name))
+    _running_runs.add(task)
+    task.add_done_callback(_running_runs.discard)
+    return stream_id
+
+
+async def agent_stream_exists(user_id: int, session_id: str, stream_id: str) -> bool:
+    """
+    运行输出流是否存在（仍在运行或缓冲未过期）
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+        stream_id: 运行输出流ID
+
+    Returns:
+        是否存在
+    """
+    key = agent_stream_key(user_id, session_id, stream_id)
+    return await redis_client.exists(key, f"{key}:{_WRITER_SUFFIX}") > 0
+
+
+async def read_agent_stream(
+    user_id: int, session_id: str, stream_id: str, request: Request, last_event_id: Optional[str] = None
+) -> AsyncGenerator:
+    """
+    以 SSE 输出缓冲中的 agent 运行事件
+
+    先补发 last_event_id 之后的事件，再实时跟随直到运行结束。事件ID即缓冲条目ID；
+    客户端断开时只停止读取，运行会在宽限期内继续，等待重连。
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+        stream_id: 运行输出流ID
+        request: 当前请求，用于检测客户端是否断开
+        last_event_id: 客户端已收到的最后一个事件ID，为空时从头输出
+
+    Yields:
+        SSE 编码后的事件
+    """
+    key = agent_stream_key(user_id, session_id, stream_id)
+    poll_interval = settings.AGENT_STREAM_DISCONNECT_POLL_SECONDS
+    heartbeat_interval = settings.AGENT_STREAM_HEARTBEAT_SECONDS
+    block_ms = max(int(min(poll_interval, heartbeat_interval) * 1000), 1)
+
+    if last_event_id:
+        metrics.incr("agent_stream_resumes_total")
+        first = await redis_client.xrange(key, count=1)
+        if first and _parse_entry_id(first[0][0]) > _parse_entry_id(last_event_id):
+            # 缓冲头部已被裁剪，无法保证补发完整
+            yield format_sse({"message": "Stream history expired"}, event=StreamEvent.ERROR.value)
+            return
+
+    last_id = last_event_id or "0-0"
+    last_check = 0.0
+    last_write = time.monotonic()
+    while True:
+        now = time.monotonic()
+        if now - last_check >= poll_interval:
+            last_check = now
+            # 断开时也续期一次，宽限期从断开时算起
+            await redis_client.set(f"{key}:{_READER_SUFFIX}", 1, ex=settings.AGENT_STREAM_RESUME_GRACE_SECONDS)
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected from agent stream {stream_id}, keep the run for reconnect")
+                return
+
+        response = await redis_client.xread({key: last_id}, block=block_ms)
+        out: List[str] = []
+        finished = False
+        for _, entries in response:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                out.append(format_sse(fields["data"], event=fields["event"], event_id=entry_id))
+                finished = finished or fields["event"] in (StreamEvent.DONE.value, StreamEvent.ERROR.value)
+        if not response and not await redis_client.exists(f"{key}:{_WRITER_SUFFIX}"):
+            # 写入方没有写入结束事件就退出了（进程重启等），不再等待
+            out.append(format_sse({"message": "Agent run interrupted"}, event=StreamEvent.ERROR.value))
+            finished = True
+
+        now = time.monotonic()
+        if not out and now - last_write >= heartbeat_interval:
+            out.append(format_sse_comment("keep-alive"))
+        if out:
+            last_write = now
+            yield "".join(out)
+        if finished:
+            return
+
+
+async def shutdown_agent_runs() -> None:
+    """取消本进程中仍在运行的 agent，读者会在写入方标记过期后收到 error 事件"""
+    for task in list(_running_runs):
+        task.cancel()
+    await asyncio.gather(*_running_runs, return_exceptions=True)
+
+
+async def stream_structured_run(agent: Agent, message: str, request: Request, agent_name: str) -> AsyncGenerator:
+    """
+    流式运行结构化输出的 agent，增量解析模型输出的 JSON
+
+    顶层字段完整后立即产出 field 事件，结束时产出按 response_model 校验后的 result 事件，以及 usage、done；
+    客户端断开时取消运行。
+
+    Args:
+        agent: 以 JSON 模式流式输出的 agent，见 StreamingStructuredAgent
+        message: 用户消息
+        request: 当前请求，用于检测客户端是否断开
+        agent_name: agent 名称，用于指标
+
+    Yields:
+        (事件类型, 事件数据)，由调用方编码为 SSE
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce() -> None:
+        run_response = await agent.arun(message, stream=True, stream_intermediate_steps=True)
+        async for chunk in run_response:
+            logger.debug(f"Chunk: {chunk}")
+            await queue.put(chunk)
+        await queue.put(_DONE)
+
+    poll_interval = settings.AGENT_STREAM_DISCONNECT_POLL_SECONDS
+    parser = JsonObjectStreamParser()
+    parts: List[str] = []
+    producer = asyncio.create_task(produce())
+    producer.add_done_callback(_retrieve_result)
+    getter = None
+    generated = 0
+    result = "cancelled"
+    last_check = time.monotonic()
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(queue.get())
+            timeout = max(last_check + poll_interval - time.monotonic(), 0)
+            waits = {getter} if producer.done() and not producer.exception() else {getter, producer}
+            done, _ = await asyncio.wait(waits, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if getter in done:
+                item, getter = getter.result(), None
+                if item is _DONE:
+                    structured = parse_response_model_str("".join(parts), agent.response_model)
+                    if structured is None:
+                        logger.error(f"{agent_name} returned an invalid {agent.response_model.__name__}")
+                        yield StreamEvent.ERROR, {"message": "Invalid structured response"}
+                        result = "error"
+                        break
+                    yield StreamEvent.RESULT, structured.model_dump()
+                    yield StreamEvent.USAGE, _usage_payload(agent, generated)
+                    run_id = agent.run_response.run_id if agent.run_response else None
+                    yield StreamEvent.DONE, {"run_id": run_id, "session_id": agent.session_id}
+                    result = "completed"
+                    break
+                elif item.event == RunEvent.run_response.value:
+                    if isinstance(item.content, str) and item.content:
+                        generated += estimate_tokens(item.content)
+                        parts.append(item.content)
+                        for name, value in parser.feed(item.content):
+                            yield StreamEvent.FIELD, {"name": name, "value": value}
+                elif item.event in (RunEvent.tool_call_started.value, RunEvent.tool_call_completed.value):
+                    yield StreamEvent.TOOL_CALL, _tool_call_payload(item)
+            elif producer in done:
+                logger.error(f"{agent_name} run failed: {producer.exception()!r}")
+                yield StreamEvent.ERROR, {"message": "Agent run failed"}
+                result = "error"
+                break
+
+            if time.monotonic() - last_check >= poll_interval:
+                last_check = time.monotonic()
+                if await request.is_disconnected():
+                    logger.info(f"Client disconnected, cancel {agent_name} run after {generated} tokens")
+                    break
+    finally:
+        if getter is not None:
+            getter.cancel()
+        # 与 _pump_agent_run 相同，只取消一次、不等待
+        producer.cancel()
+        _record_run(agent_name, result, generated)
@@ -0,0 +1,243 @@
+import json
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from backend.app.agent.schema.agent_request_schema import AlcoholLevel, DifficultyLevel
+from backend.app.agent.schema.catalog_schema import CatalogCocktail, CatalogData, CatalogItem
+from backend.app.agent.schema.cocktail_schema import CocktailRecommendation, Ingredient, Tool
+from backend.app.agent.service.utils.recommendation_cache import normalize_text
+from backend.common.log import logger
+from backend.core.path_conf import COCKTAIL_CATALOG_PATH
+
+# 口味维度，配方的 flavor 按此顺序组成向量
+FLAVOR_DIMENSIONS = ("sweet", "sour", "bitter", "strong", "fruity", "herbal", "creamy", "refreshing", "spicy", "smoky")
+
+_ALCOHOL_CODES = {AlcoholLevel.LOW: 0, AlcoholLevel.MEDIUM: 1, AlcoholLevel.HIGH: 2}
+_DIFFICULTY_CODES = {DifficultyLevel.EASY: 0, DifficultyLevel.MEDIUM: 1, DifficultyLevel.HARD: 2}
+_ALCOHOL_LABELS = {AlcoholLevel.LOW: "低度", AlcoholLevel.MEDIUM: "中度", AlcoholLevel.HIGH: "高度"}
+
+# 每个字节的置位数，numpy 没有 bitwise_count 时使用
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+_WORD_MASK = (1 << 64) - 1
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    # 每个 uint64 的置位数
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    return _POPCOUNT_TABLE[words.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+class _Vocabulary:
+    """原料或工具词表：ID 到位图中的位置，以及规范化别名到 ID 的映射"""
+
+    def __init__(self, items: Dict[str, CatalogItem]):
+        self.items = items
+        self.ids = list(items)
+        self.bits = {item_id: i for i, item_id in enumerate(self.ids)}
+        self.words = max((len(self.ids) + 63) // 64, 1)
+        self.aliases: Dict[str, Set[str]] = {}
+        for item_id, item in items.items():
+            for alias in (item_id, item_id.replace("_", " "), item.name, *item.aliases):
+                self.aliases.setdefault(normalize_text(alias), set()).add(item_id)
+
+    def resolve(self, names: Iterable[str]) -> Tuple[Set[str], List[str]]:
+        ids: Set[str] = set()
+        unknown: List[str] = []
+        for name in names:
+            matched = self.aliases.get(normalize_text(name))
+            if matched:
+                ids |= matched
+            elif name.strip():
+                unknown.append(name)
+        return ids, unknown
+
+    def mask(self, ids: Iterable[str]) -> int:
+        bits = 0
+        for item_id in ids:
+            bit = self.bits.get(item_id)
+            if bit is not None:
+                bits |= 1 << bit
+        return bits
+
+    def columns(self, masks: List[int]) -> np.ndarray:
+        # 按 64 位分段转置为 (words, n)，每段是一个连续数组，查询时逐段做向量运算
+        return np.array(
+            [[(bits >> (64 * w)) & _WORD_MASK for bits in masks] for w in range(self.words)], dtype=np.uint64
+        ).reshape(self.words, len(masks))
+
+    def decode(self, bits: int) -> List[str]:
+        ids = []
+        while bits:
+            low = bits & -bits
+            ids.append(self.ids[low.bit_length() - 1])
+            bits ^= low
+        return ids
+
+
+@dataclass
+class CatalogMatch:
+    """酒单查询结果"""
+
+    cocktail: CatalogCocktail
+    missing: List[str]
+
+
+class CocktailCatalog:
+    """
+    内置经典鸡尾酒酒单的内存索引
+
+    每个配方的必需原料和所需工具各编码为一行 uint64 位图，酒精浓度和难度编码为整数，口味编码为向量；
+    “现有原料能做什么”的查询只需对整张表做几次向量化的位运算，不依赖大模型和网络搜索。
+    """
+
+    def __init__(self, data: CatalogData):
+        self.spirits = data.spirits
+        self.cocktails = data.cocktails
+        self.ingredients = _Vocabulary(data.ingredients)
+        self.tools = _Vocabulary(data.tools)
+        self._by_name: Dict[str, int] = {}
+        for i, cocktail in enumerate(self.cocktails):
+            for name in (cocktail.id, cocktail.name, cocktail.english_name):
+                self._by_name[normalize_text(name)] = i
+
+        self._required_bits = [
+            self.ingredients.mask(item.id for item in cocktail.ingredients if not item.optional)
+            for cocktail in self.cocktails
+        ]
+        self._required = self.ingredients.columns(self._required_bits)
+        self._tools = self.tools.columns([self.tools.mask(cocktail.tools) for cocktail in self.cocktails])
+        self._alcohol = np.array([_ALCOHOL_CODES.get(c.alcohol_level, -1) for c in self.cocktails], dtype=np.int8)
+        self._difficulty = np.array(
+            [_DIFFICULTY_CODES.get(c.difficulty_level, -1) for c in self.cocktails], dtype=np.int8
+        )
+        self._spirits = np.array([c.base_spirit for c in self.cocktails])
+        self._flavor = np.array(
+            [[c.flavor.get(dimension, 0.0) for dimension in FLAVOR_DIMENSIONS] for c in self.cocktails],
+            dtype=np.float32,
+        )
+
+    def __len__(self) -> int:
+        return len(self.cocktails)
+
+    def get(self, name: str) -> Optional[CatalogCocktail]:
+        """
+        按 ID、中文名或英文名查找配方
+
+        Args:
+            name: 鸡尾酒名称
+
+        Returns:
+            配方，不存在时返回None
+        """
+        index = self._by_name.get(normalize_text(name))
+        return None if index is None else self.cocktails[index]
+
+    def find_makeable(
+        self,
+        ingredients: Iterable[str],
+        tools: Optional[Iterable[str]] = None,
+        max_missing: int = 0,
+        alcohol_level: Optional[AlcoholLevel] = None,
+        difficulty_level: Optional[DifficultyLevel] = None,
+        base_spirit: Optional[str] = None,
+        flavors: Optional[Iterable[str]] = None,
+        limit: int = 5,
+    ) -> List[CatalogMatch]:
+        """
+        查找用现有原料能做的配方
+
+        Args:
+            ingredients: 现有原料ID
+            tools: 现有工具ID，为空时不限制工具
+            max_missing: 最多允许缺少的必需原料数
+            alcohol_level: 酒精浓度，为空或任意时不限制
+            difficulty_level: 最高制作难度，为空或任意时不限制
+            base_spirit: 基酒类型ID
+            flavors: 偏好的口味维度，用于排序
+            limit: 最多返回的配方数
+
+        Returns:
+            按缺少原料数从少到多、口味匹配度从高到低排序的配方
+        """
+        have = self.ingredients.mask(ingredients)
+        counts = np.zeros(len(self), dtype=np.int16)
+        if max_missing <= 0:
+            # 不允许缺少原料时只需判断每段是否全部满足
+            selected = np.ones(len(self), dtype=bool)
+            for w in range(self.ingredients.words):
+                selected &= (self._required[w] & np.uint64(~have >> (64 * w) & _WORD_MASK)) == 0
+        else:
+            for w in range(self.ingredients.words):
+                counts += _popcount(self._required[w] & np.uint64(~have >> (64 * w) & _WORD_MASK))
+            selected = counts <= max_missing
+        if tools is not None:
+            available = self.tools.mask(tools)
+            for w in range(self.tools.words):
+                selected &= (self._tools[w] & np.uint64(~available >> (64 * w) & _WORD_MASK)) == 0
+        if alcohol_level in _ALCOHOL_CODES:
+            selected &= self._alcohol == _ALCOHOL_CODES[alcohol_level]
+        if difficulty_level in _DIFFICULTY_CODES:
+            selected &= self._difficulty <= _DIFFICULTY_CODES[difficulty_level]
+        if base_spirit is not None:
+            selected &= self._spirits == base_spirit
+
+        candidates = np.flatnonzero(selected)
+        if candidates.size == 0:
+            return []
+        preferred = set(flavors or ())
+        weights = np.array([dimension in preferred for dimension in FLAVOR_DIMENSIONS], dtype=np.float32)
+        scores = self._flavor[candidates] @ weights
+        order = candidates[np.lexsort((-scores, counts[candidates]))[:limit]]
+        return [CatalogMatch(self.cocktails[i], self.ingredients.decode(self._required_bits[i] & ~have)) for i in order]
+
+    def to_recommendation(self, cocktail: CatalogCocktail, match_reason: str) -> CocktailRecommendation:
+        """
+        把配方转换为推荐
+
+        Args:
+            cocktail: 配方
+            match_reason: 推荐理由
+
+        Returns:
+            鸡尾酒推荐
+        """
+        ingredients = self.ingredients.items
+        tools = self.tools.items
+        return CocktailRecommendation(
+            name=cocktail.name,
+            english_name=cocktail.english_name,
+            description=cocktail.description,
+            time_required=cocktail.time_required,
+            match_reason=match_reason,
+            base_spirit=self.spirits.get(cocktail.base_spirit, cocktail.base_spirit),
+            alcohol_level=_ALCOHOL_LABELS.get(cocktail.alcohol_level, cocktail.alcohol_level.value),
+            flavor_profiles=cocktail.flavor_profiles,
+            ingredients=[
+                Ingredient(name=ingredients[item.id].name, amount=item.amount, unit=item.unit)
+                for item in cocktail.ingredients
+            ],
+            steps=cocktail.steps,
+            tools=[Tool(name=tools[tool].name, alternative=tools[tool].alternative) for tool in cocktail.tools],
+            serving_glass=cocktail.serving_glass,
+        )
+
+
+@lru_cache
+def get_cocktail_catalog() -> CocktailCatalog:
+    """
+    加载内置酒单并建立索引，每个进程只加载一次
+
+    Returns:
+        酒单索引
+    """
+    with open(COCKTAIL_CATALOG_PATH, encoding="utf-8") as f:
+        catalog = CocktailCatalog(CatalogData.model_validate(json.load(f)))
+    logger.info(f"Loaded cocktail catalog with {len(catalog)} recipes")
+    return catalog
@@ -0,0 +1,260 @@
+import hashlib
+import math
+
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from backend.app.agent.schema.catalog_schema import CatalogCocktail
+from backend.app.agent.schema.cocktail_schema import CocktailRecommendation
+from backend.app.agent.service.utils.cocktail_catalog import FLAVOR_DIMENSIONS, CocktailCatalog, get_cocktail_catalog
+from backend.app.agent.service.utils.recommendation_cache import normalize_text
+from backend.common.log import logger
+
+# 向量由口味和原料两部分组成，各自归一化后按权重拼接，整体仍为单位向量
+FLAVOR_EMBEDDING_DIMENSIONS = 32
+_INGREDIENT_BUCKETS = FLAVOR_EMBEDDING_DIMENSIONS - len(FLAVOR_DIMENSIONS)
+_FLAVOR_WEIGHT = 0.8
+_INGREDIENT_WEIGHT = math.sqrt(1 - _FLAVOR_WEIGHT**2)
+
+# 口味描述中的关键词到口味维度，按长度从长到短匹配
+_PROFILE_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "苦甜": ("bitter", "sweet"),
+    "酸甜": ("sour", "sweet"),
+    "甜": ("sweet",),
+    "酸": ("sour",),
+    "苦": ("bitter",),
+    "烈": ("strong",),
+    "浓郁": ("strong",),
+    "醇厚": ("strong",),
+    "干": ("strong",),
+    "果": ("fruity",),
+    "西柚": ("fruity",),
+    "草本": ("herbal",),
+    "薄荷": ("herbal", "refreshing"),
+    "花香": ("herbal",),
+    "奶": ("creamy",),
+    "丝滑": ("creamy",),
+    "巧克力": ("creamy", "sweet"),
+    "咖啡": ("bitter",),
+    "清爽": ("refreshing",),
+    "气泡": ("refreshing",),
+    "辛辣": ("spicy",),
+    "辣": ("spicy",),
+    "姜": ("spicy",),
+    "咸": ("spicy",),
+    "烟熏": ("smoky",),
+    "温暖": ("strong",),
+}
+_PROFILE_KEYWORDS.update({dimension: (dimension,) for dimension in FLAVOR_DIMENSIONS})
+_SORTED_PROFILE_KEYWORDS = sorted(_PROFILE_KEYWORDS.items(), key=lambda item: -len(item[0]))
+_FLAVOR_INDEX = {dimension: i for i, dimension in enumerate(FLAVOR_DIMENSIONS)}
+
+
+def _profile_flavor(profiles: Iterable[str]) -> Dict[str, float]:
+    flavor: Dict[str, float] = {}
+    for profile in profiles:
+        text = normalize_text(profile)
+        for keyword, dimensions in _SORTED_PROFILE_KEYWORDS:
+            if keyword in text:
+                text = text.replace(keyword, "\0")
+                for dimension in dimensions:
+                    flavor[dimension] = 1.0
+    return flavor
+
+
+def _ingredient_bucket(key: str) -> int:
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % _INGREDIENT_BUCKETS
+
+
+def _compose(flavor: Dict[str, float], ingredient_keys: Iterable[str]) -> np.ndarray:
+    vector = np.zeros(FLAVOR_EMBEDDING_DIMENSIONS, dtype=np.float32)
+    flavor_part = vector[: len(FLAVOR_DIMENSIONS)]
+    ingredient_part = vector[len(FLAVOR_DIMENSIONS) :]
+    for dimension, value in flavor.items():
+        if dimension in _FLAVOR_INDEX:
+            flavor_part[_FLAVOR_INDEX[dimension]] = value
+    for key in ingredient_keys:
+        ingredient_part[_ingredient_bucket(key)] += 1.0
+    for part, weight in ((flavor_part, _FLAVOR_WEIGHT), (ingredient_part, _INGREDIENT_WEIGHT)):
+        norm = np.linalg.norm(part)
+        if norm > 0:
+            part *= weight / norm
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def embed_catalog_cocktail(cocktail: CatalogCocktail) -> np.ndarray:
+    """
+    把酒单配方映射为口味向量
+
+    Args:
+        cocktail: 配方
+
+    Returns:
+        单位长度的 float32 向量
+    """
+    flavor = cocktail.flavor or _profile_flavor(cocktail.flavor_profiles)
+    keys = [item.id for item in cocktail.ingredients if not item.optional]
+    return _compose(flavor, keys)
+
+
+def embed_recommendation(cocktail: CocktailRecommendation, catalog: Optional[CocktailCatalog] = None) -> np.ndarray:
+    """
+    把推荐映射为口味向量
+
+    口味来自 flavor_profiles 中的关键词；原料名称能在酒单词表中识别时使用酒单ID，与酒单配方落在同一位置。
+
+    Args:
+        cocktail: 鸡尾酒推荐
+        catalog: 用于识别原料的酒单
+
+    Returns:
+        单位长度的 float32 向量
+    """
+    keys: List[str] = []
+    for ingredient in cocktail.ingredients:
+        ids = catalog.ingredients.aliases.get(normalize_text(ingredient.name)) if catalog else None
+        # 共用别名的原料（如“朗姆酒”）取其中一个即可，避免同一原料计数多次
+        keys.append(min(ids) if ids else normalize_text(ingredient.name))
+    return _compose(_profile_flavor(cocktail.flavor_profiles), keys)
+
+
+class FlavorIndex:
+    """
+    口味向量的最近邻索引
+
+    规模较小时对整个矩阵做一次矩阵乘法并用 argpartition 取 top-k；超过 exact_max 时建立倒排索引（IVF）：
+    用球面 k-means 把向量分为约 sqrt(n) 个簇并按簇连续存放，查询时只扫描与查询最接近的 nprobe 个簇，
+    候选不足 k 个时继续扫描后续的簇。
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        exact_max: int = 4096,
+        nprobe: int = 8,
+        kmeans_iterations: int = 8,
+        seed: int = 0,
+    ):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.nprobe = nprobe
+        self._centroids: Optional[np.ndarray] = None
+        self._ids = np.arange(len(self.vectors))
+        self._offsets: Optional[np.ndarray] = None
+        if len(self.vectors) > exact_max:
+            self._build_ivf(kmeans_iterations, seed)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def _build_ivf(self, iterations: int, seed: int) -> None:
+        n = len(self.vectors)
+        nlist = int(math.sqrt(n))
+        rng = np.random.default_rng(seed)
+        # 在样本上训练簇中心，再对全部向量分配
+        sample = self.vectors[rng.choice(n, size=min(n, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # 空簇保留原中心
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        assign = np.argmax(self.vectors @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        self.vectors = np.ascontiguousarray(self.vectors[order])
+        self._ids = order
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=nlist))))
+        self._centroids = centroids.astype(np.float32)
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def _search_one(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(-(self._centroids @ query), kind="stable")
+        # 至少探测 nprobe 个簇；簇较小或为空导致候选不足 k 个时，继续按相似度探测后续的簇
+        covered = np.cumsum(np.diff(self._offsets)[order])
+        count = max(self.nprobe, int(np.searchsorted(covered, k)) + 1)
+        probes = order[:count]
+        rows = np.concatenate([np.arange(self._offsets[p], self._offsets[p + 1]) for p in probes])
+        scores = self.vectors[rows] @ query
+        top = self._top(scores, k)
+        return self._ids[rows[top]], scores[top]
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """
+        批量查询最相似的向量
+
+        Args:
+            queries: 形状为 (d,) 或 (m, d) 的单位向量
+            k: 每个查询返回的数量
+
+        Returns:
+            (每个查询的下标数组, 每个查询的余弦相似度数组)，按相似度从高到低排列
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if len(self) == 0 or k <= 0:
+            empty = [np.empty(0, dtype=np.int64)] * len(queries)
+            return empty, [np.empty(0, dtype=np.float32)] * len(queries)
+        if self._centroids is not None:
+            results = [self._search_one(query, k) for query in queries]
+            return [ids for ids, _ in results], [scores for _, scores in results]
+        # 精确检索：一次矩阵乘法算出全部查询的相似度
+        all_scores = queries @ self.vectors.T
+        indices, scores = [], []
+        for row in all_scores:
+            top = self._top(row, k)
+            indices.append(self._ids[top])
+            scores.append(row[top])
+        return indices, scores
+
+
+@lru_cache
+def get_catalog_flavor_index() -> FlavorIndex:
+    """
+    为内置酒单建立口味索引，每个进程只建立一次
+
+    Returns:
+        与 get_cocktail_catalog().cocktails 下标一致的口味索引
+    """
+    catalog = get_cocktail_catalog()
+    vectors = np.stack([embed_catalog_cocktail(cocktail) for cocktail in catalog.cocktails])
+    logger.info(f"Built flavor index for {len(vectors)} recipes")
+    return FlavorIndex(vectors)
+
+
+def find_similar_cocktails(cocktail: CocktailRecommendation, limit: int = 5) -> List[CocktailRecommendation]:
+    """
+    查找与推荐口味相近的经典鸡尾酒，不调用大模型
+
+    Args:
+        cocktail: 之前得到的推荐
+        limit: 最多返回的数量
+
+    Returns:
+        按相似度从高到低排列的推荐，不包含输入的鸡尾酒本身
+    """
+    catalog = get_cocktail_catalog()
+    query = embed_recommendation(cocktail, catalog)
+    same = {normalize_text(name) for name in (cocktail.name, cocktail.english_name) if name}
+    # 多取一个，以便排除输入本身
+    indices, _ = get_catalog_flavor_index().search(query, limit + 1)
+    similar = []
+    shared_profiles = set(cocktail.flavor_profiles)
+    for i in indices[0]:
+        match = catalog.cocktails[i]
+        if {normalize_text(match.name), normalize_text(match.english_name)} & same:
+            continue
+        shared = [profile for profile in match.flavor_profiles if profile in shared_profiles]
+        reason = f"与{cocktail.name}口味相近" + (f"，同样{'、'.join(shared)}" if shared else "")
+        similar.append(catalog.to_recommendation(match, match_reason=reason))
+    return similar[:limit]
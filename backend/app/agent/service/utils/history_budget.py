@@ -0,0 +1,222 @@
+import asyncio
+import json
+import time
+
+from typing import Dict, List, Optional, Tuple
+
+import msgspec
+
+from agno.models.message import Message
+from agno.run.response import RunResponse
+from backend.common.log import logger
+from backend.common.metrics import metrics
+from backend.core.conf import settings
+from backend.database.redis import redis_client
+from backend.utils.token_counter import estimate_tokens
+from openai import AsyncOpenAI
+
+# Redis key 前缀
+HISTORY_SUMMARY_PREFIX = "agent_history_summary"
+
+# 每条消息的角色、分隔符等固定开销
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+_SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an assistant.
+Update the existing summary with the new turns below. Keep facts the user shared about themselves, their
+preferences and constraints, open questions and anything the assistant promised. Drop small talk.
+Write in the language of the conversation, in at most {max_tokens} tokens, and output only the summary."""
+
+
+class HistorySummary(msgspec.Struct):
+    """会话中较早运行的滚动摘要"""
+
+    text: str
+    # 已并入摘要的最后一次运行
+    run_id: str
+
+
+_summary_decoder = msgspec.json.Decoder(HistorySummary)
+# 正在更新摘要的会话
+_summary_tasks: Dict[str, asyncio.Task] = {}
+
+
+def history_messages(run: RunResponse, skip_role: str = "system") -> List[Message]:
+    """
+    运行中会被 agno 作为历史发送的消息
+
+    Args:
+        run: 运行
+        skip_role: 跳过的角色
+
+    Returns:
+        消息列表
+    """
+    return [m for m in run.messages or [] if m.role != skip_role and not m.from_history]
+
+
+def message_tokens(message: Message) -> int:
+    """
+    估算消息占用的 token 数
+
+    Args:
+        message: 消息
+
+    Returns:
+        token 数
+    """
+    tokens = _MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.get_content_string())
+    if message.tool_calls:
+        tokens += estimate_tokens(json.dumps(message.tool_calls, ensure_ascii=False))
+    return tokens
+
+
+def split_history(
+    runs: List[RunResponse], budget: int, max_runs: int, skip_role: str = "system"
+) -> Tuple[List[RunResponse], List[RunResponse]]:
+    """
+    从最新的运行往前，按 token 预算和运行次数切分历史
+
+    Args:
+        runs: 会话中的运行，从旧到新
+        budget: 原样保留的历史 token 预算
+        max_runs: 最多原样保留的运行次数
+        skip_role: 不计入历史的角色
+
+    Returns:
+        (较早的运行, 原样保留的最近运行)
+    """
+    used = 0
+    start = len(runs)
+    while start > 0 and len(runs) - start < max_runs:
+        tokens = sum(message_tokens(m) for m in history_messages(runs[start - 1], skip_role))
+        if used + tokens > budget:
+            break
+        used += tokens
+        start -= 1
+    return runs[:start], runs[start:]
+
+
+def _summary_key(agent_id: str, session_id: str) -> str:
+    return f"{HISTORY_SUMMARY_PREFIX}:{agent_id}:{session_id}"
+
+
+async def get_history_summary(agent_id: str, session_id: str) -> Optional[HistorySummary]:
+    """
+    读取会话的滚动摘要
+
+    Args:
+        agent_id: agent ID
+        session_id: 会话ID
+
+    Returns:
+        摘要，不存在时返回None
+    """
+    try:
+        value = await redis_client.get(_summary_key(agent_id, session_id))
+    except Exception as e:
+        logger.error(f"Failed to read history summary for session {session_id}: {str(e)}")
+        return None
+    return _summary_decoder.decode(value) if value else None
+
+
+def unsummarized_runs(older: List[RunResponse], summary: Optional[HistorySummary]) -> List[RunResponse]:
+    """
+    未原样保留、尚未并入摘要的运行
+
+    Args:
+        older: 较早的运行
+        summary: 当前摘要
+
+    Returns:
+        运行列表
+    """
+    if summary is None:
+        return older
+    for index, run in enumerate(older):
+        if run.run_id == summary.run_id:
+            return older[index + 1 :]
+    # 摘要覆盖的运行已不在内存中，说明内存中的运行都比它新
+    return older
+
+
+async def _summarize(
+    client: AsyncOpenAI, model_id: str, summary: Optional[HistorySummary], runs: List[RunResponse]
+) -> HistorySummary:
+    transcript = "\n".join(
+        f"{m.role}: {m.get_content_string()}" for run in runs for m in history_messages(run) if m.role != "tool"
+    )
+    previous = summary.text if summary is not None else ""
+    max_tokens = settings.AGENT_HISTORY_SUMMARY_MAX_TOKENS
+    response = await client.chat.completions.create(
+        model=model_id,
+        messages=[
+            {"role": "system", "content": _SUMMARY_PROMPT.format(max_tokens=max_tokens)},
+            {"role": "user", "content": f"<summary>\n{previous}\n</summary>\n\n<turns>\n{transcript}\n</turns>"},
+        ],
+        max_tokens=max_tokens,
+        temperature=0,
+    )
+    return HistorySummary(text=(response.choices[0].message.content or "").strip(), run_id=runs[-1].run_id)
+
+
+async def _refresh_history_summary(
+    client: AsyncOpenAI,
+    model_id: str,
+    agent_id: str,
+    session_id: str,
+    runs: List[RunResponse],
+    budget: int,
+    max_runs: int,
+) -> None:
+    summary = await get_history_summary(agent_id, session_id)
+    older, _ = split_history(runs, budget, max_runs)
+    pending = unsummarized_runs(older, summary)
+    if len(pending) < settings.AGENT_HISTORY_SUMMARY_MIN_RUNS:
+        return
+    start = time.perf_counter()
+    try:
+        summary = await _summarize(client, model_id, summary, pending)
+        await redis_client.set(
+            _summary_key(agent_id, session_id),
+            msgspec.json.encode(summary),
+            ex=settings.AGENT_SESSION_CACHE_EXPIRE_SECONDS,
+        )
+    except Exception as e:
+        metrics.incr("agent_history_summary_total", agent=agent_id, result="error")
+        logger.error(f"Failed to summarize history for session {session_id}: {str(e)}")
+        return
+    metrics.incr("agent_history_summary_total", agent=agent_id, result="updated")
+    metrics.observe("agent_history_summary_seconds", time.perf_counter() - start, agent=agent_id)
+
+
+def schedule_history_summary(
+    client: AsyncOpenAI,
+    model_id: str,
+    agent_id: str,
+    session_id: str,
+    runs: List[RunResponse],
+    budget: int,
+    max_runs: int,
+) -> None:
+    """
+    在后台把不再原样保留的运行并入会话摘要，不阻塞本次响应
+
+    同一会话正在更新摘要时不重复发起。
+
+    Args:
+        client: 调用模型的客户端
+        model_id: 生成摘要的模型
+        agent_id: agent ID
+        session_id: 会话ID
+        runs: 会话中的运行，从旧到新
+        budget: 原样保留的历史 token 预算
+        max_runs: 最多原样保留的运行次数
+    """
+    key = f"{agent_id}:{session_id}"
+    if key in _summary_tasks:
+        return
+    task = asyncio.create_task(
+        _refresh_history_summary(client, model_id, agent_id, session_id, list(runs), budget, max_runs)
+    )
+    _summary_tasks[key] = task
+    task.add_done_callback(lambda _: _summary_tasks.pop(key, None))
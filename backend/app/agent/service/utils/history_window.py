@@ -0,0 +1,81 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+import msgspec
+
+from agno.models.message import Message
+from agno.run.response import RunResponse
+
+
+class HistoryMessage(msgspec.Struct, array_like=True, omit_defaults=True):
+    """历史消息，只保留拼接历史所需的字段"""
+
+    role: str
+    content: Any = None
+    name: Optional[str] = None
+    tool_call_id: Optional[str] = None
+    tool_calls: Optional[List[Dict[str, Any]]] = None
+
+
+class HistoryRun(msgspec.Struct, array_like=True):
+    """一次运行中可作为历史的消息"""
+
+    run_id: str
+    messages: List[HistoryMessage]
+
+
+_encoder = msgspec.json.Encoder()
+_decoder = msgspec.json.Decoder(HistoryRun)
+
+
+def encode_history_run(run: Dict[str, Any]) -> bytes:
+    """
+    把运行压缩为历史窗口中的一项
+
+    与 agno 拼接历史时的规则一致：跳过 system 消息和本次运行中引用的历史消息。
+
+    Args:
+        run: RunResponse.to_dict() 的结果
+
+    Returns:
+        msgspec 编码的历史运行
+    """
+    messages = [
+        HistoryMessage(
+            role=message["role"],
+            content=message.get("content"),
+            name=message.get("name"),
+            tool_call_id=message.get("tool_call_id"),
+            tool_calls=message.get("tool_calls"),
+        )
+        for message in run.get("messages") or []
+        if message.get("role") != "system" and not message.get("from_history")
+    ]
+    return _encoder.encode(HistoryRun(run_id=run.get("run_id") or "", messages=messages))
+
+
+def decode_history_runs(values: Iterable[Any], session_id: str) -> List[RunResponse]:
+    """
+    把历史窗口还原为只包含消息的 RunResponse，供 agent 拼接历史
+
+    Args:
+        values: 历史窗口中的项，从旧到新
+        session_id: 会话ID
+
+    Returns:
+        RunResponse 列表
+    """
+    runs = []
+    for value in values:
+        history_run = _decoder.decode(value)
+        messages = [
+            Message(
+                role=m.role,
+                content=m.content,
+                name=m.name,
+                tool_call_id=m.tool_call_id,
+                tool_calls=m.tool_calls,
+            )
+            for m in history_run.messages
+        ]
+        runs.append(RunResponse(run_id=history_run.run_id, session_id=session_id, messages=messages))
+    return runs
@@ -0,0 +1,250 @@
+import asyncio
+import os
+import re
+import tempfile
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+from backend.common.log import logger
+from backend.core.conf import settings
+
+# 内容键只允许十六进制摘要（变体带 .尺寸.格式 后缀），防止拼接出越界路径
+_IMAGE_KEY_PATTERN = re.compile(r"^[0-9a-f]{16,128}(\.[0-9]+\.[a-z0-9]+)?$")
+
+# 磁盘占用统计的刷新间隔（秒）
+_DISK_USAGE_REFRESH_SECONDS = 60
+
+
+def _check_key(image_key: str) -> str:
+    if not _IMAGE_KEY_PATTERN.match(image_key):
+        raise ValueError(f"Invalid image key: {image_key}")
+    return image_key
+
+
+class ColdImageStore(ABC):
+    """冷层图片存储：容量大、读取较慢，作为图片的持久副本"""
+
+    name: str
+
+    @abstractmethod
+    async def get(self, image_key: str) -> Optional[bytes]:
+        """
+        读取图片
+
+        Args:
+            image_key: 共享图片的内容键
+
+        Returns:
+            图片字节，不存在则返回None
+        """
+
+    @abstractmethod
+    async def put(self, image_key: str, data: bytes) -> None:
+        """
+        写入图片
+
+        Args:
+            image_key: 共享图片的内容键
+            data: 图片字节
+        """
+
+    @abstractmethod
+    async def exists(self, image_key: str) -> bool:
+        """
+        图片是否存在
+
+        Args:
+            image_key: 共享图片的内容键
+
+        Returns:
+            是否存在
+        """
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """
+        存储占用统计
+
+        Returns:
+            统计信息
+        """
+
+
+class DiskImageStore(ColdImageStore):
+    """本地磁盘存储，按内容键前两位分目录"""
+
+    name = "disk"
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._usage: Dict[str, Any] = {"objects": 0, "bytes": 0}
+        self._usage_at = 0.0
+
+    def _path(self, image_key: str) -> str:
+        _check_key(image_key)
+        return os.path.join(self.root, image_key[:2], image_key)
+
+    def _read(self, image_key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(image_key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, image_key: str, data: bytes) -> None:
+        path = self._path(image_key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # 先写临时文件再原子替换，读者不会看到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    async def get(self, image_key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, image_key)
+
+    async def put(self, image_key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._write, image_key, data)
+
+    async def exists(self, image_key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self._path(image_key))
+
+    def _scan_usage(self) -> Dict[str, Any]:
+        objects, total = 0, 0
+        if os.path.isdir(self.root):
+            for shard in os.scandir(self.root):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.is_file() and not entry.name.startswith("."):
+                        objects += 1
+                        total += entry.stat().st_size
+        return {"objects": objects, "bytes": total}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            # 目录扫描开销随文件数增长，限制刷新频率
+            if time.monotonic() - self._usage_at > _DISK_USAGE_REFRESH_SECONDS:
+                self._usage = self._scan_usage()
+                self._usage_at = time.monotonic()
+            return {"backend": self.name, "root": self.root, **self._usage}
+
+
+class S3ImageStore(ColdImageStore):
+    """S3 兼容对象存储，本地开发可使用 MinIO 代替"""
+
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        region: Optional[str] = None,
+    ):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self._client = None
+        self._lock = threading.Lock()
+        self._written = {"objects": 0, "bytes": 0}
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                try:
+                    import boto3
+                except ImportError as e:
+                    raise RuntimeError("IMAGE_STORE_COLD_BACKEND=s3 requires boto3, please install it first") from e
+
+                client = boto3.client(
+                    "s3",
+                    endpoint_url=self.endpoint_url,
+                    aws_access_key_id=self.access_key,
+                    aws_secret_access_key=self.secret_key,
+                    region_name=self.region,
+                )
+                try:
+                    client.head_bucket(Bucket=self.bucket)
+                except client.exceptions.ClientError:
+                    logger.info(f"Creating image bucket {self.bucket}")
+                    client.create_bucket(Bucket=self.bucket)
+                self._client = client
+            return self._client
+
+    def _object_key(self, image_key: str) -> str:
+        return f"{self.prefix}{_check_key(image_key)}"
+
+    def _read(self, image_key: str) -> Optional[bytes]:
+        client = self._get_client()
+        try:
+            response = client.get_object(Bucket=self.bucket, Key=self._object_key(image_key))
+        except client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read()
+
+    def _write(self, image_key: str, data: bytes) -> None:
+        self._get_client().put_object(Bucket=self.bucket, Key=self._object_key(image_key), Body=data)
+        with self._lock:
+            self._written["objects"] += 1
+            self._written["bytes"] += len(data)
+
+    def _exists(self, image_key: str) -> bool:
+        client = self._get_client()
+        try:
+            client.head_object(Bucket=self.bucket, Key=self._object_key(image_key))
+        except client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    async def get(self, image_key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, image_key)
+
+    async def put(self, image_key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._write, image_key, data)
+
+    async def exists(self, image_key: str) -> bool:
+        return await asyncio.to_thread(self._exists, image_key)
+
+    def stats(self) -> Dict[str, Any]:
+        # 对象存储的总占用需要列举整个前缀，这里只统计本进程写入的量
+        with self._lock:
+            return {"backend": self.name, "bucket": self.bucket, "written": dict(self._written)}
+
+
+def create_cold_store() -> ColdImageStore:
+    """
+    根据配置创建冷层存储
+
+    Returns:
+        冷层图片存储
+    """
+    if settings.IMAGE_STORE_COLD_BACKEND == "s3":
+        return S3ImageStore(
+            bucket=settings.IMAGE_STORE_S3_BUCKET,
+            prefix=settings.IMAGE_STORE_S3_PREFIX,
+            endpoint_url=settings.IMAGE_STORE_S3_ENDPOINT_URL,
+            access_key=settings.IMAGE_STORE_S3_ACCESS_KEY,
+            secret_key=settings.IMAGE_STORE_S3_SECRET_KEY,
+            region=settings.IMAGE_STORE_S3_REGION,
+        )
+    return DiskImageStore(settings.IMAGE_STORE_DISK_DIR)
@@ -0,0 +1,216 @@
+import asyncio
+
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+from backend.app.agent.schema.image_job_schema import ImageEvent, ImageEventStatus, ImageJobStatus
+from backend.app.agent.service.utils.image_queue import get_session_image_job
+from backend.app.agent.service.utils.image_store import get_session_image_key, has_image
+from backend.common.log import logger
+from backend.common.metrics import metrics
+from backend.database.redis import redis_client
+
+# Redis 频道前缀
+IMAGE_EVENT_CHANNEL_PREFIX = "cocktail_image_event"
+
+
+def image_event_channel(user_id: int, session_id: str) -> str:
+    """
+    会话图片事件的频道名
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+
+    Returns:
+        频道名
+    """
+    return f"{IMAGE_EVENT_CHANNEL_PREFIX}:{user_id}:{session_id}"
+
+
+async def publish_image_event(user_id: int, session_id: str, event: ImageEvent) -> None:
+    """
+    发布会话图片事件，所有 API 进程都会收到，由持有该会话连接的进程投递给客户端
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+        event: 事件内容
+    """
+    try:
+        await redis_client.publish(image_event_channel(user_id, session_id), event.model_dump_json())
+    except Exception as e:
+        # 通知失败不影响图片写入，等待方超时后会重新检查状态
+        logger.error(f"Failed to publish image event for user {user_id}: {session_id}, error: {str(e)}")
+
+
+class ImageEventHub:
+    """
+    进程内共享的图片事件订阅
+
+    每个进程只用一个 Redis 连接按模式订阅所有会话的图片事件，再分发给本进程中等待对应会话的请求，
+    避免每个等待中的请求各占一个订阅连接。
+    """
+
+    def __init__(self, reconnect_interval: float = 1.0):
+        self.reconnect_interval = reconnect_interval
+        self._waiters: Dict[str, Set[asyncio.Future]] = defaultdict(set)
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{IMAGE_EVENT_CHANNEL_PREFIX}:*")
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message["type"] == "psubscribe":
+                        # 订阅生效后等待方才能开始检查状态，避免漏掉检查与订阅之间发布的事件
+                        self._ready.set()
+                    elif message["type"] == "pmessage":
+                        self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Image event subscription failed, reconnecting: {str(e)}")
+                await asyncio.sleep(self.reconnect_interval)
+            finally:
+                self._ready.clear()
+                await pubsub.aclose()
+
+    def _dispatch(self, channel: str, data: str) -> None:
+        waiters = self._waiters.pop(channel, None)
+        if not waiters:
+            return
+        try:
+            event = ImageEvent.model_validate_json(data)
+        except ValueError:
+            logger.warning(f"Ignore malformed image event on {channel}: {data}")
+            return
+        for future in waiters:
+            if not future.done():
+                future.set_result(event)
+        metrics.incr("image_events_delivered_total", len(waiters))
+
+    async def subscribe(self, user_id: int, session_id: str, timeout: float) -> asyncio.Future:
+        """
+        登记等待会话的下一个图片事件
+
+        返回时订阅已生效，调用方此后再检查当前状态即可保证不漏事件。
+
+        Args:
+            user_id: 用户ID
+            session_id: 会话ID
+            timeout: 等待订阅生效的最长时间
+
+        Returns:
+            事件到达时完成的 future，使用完毕后需调用 unsubscribe
+        """
+        self._ensure_started()
+        channel = image_event_channel(user_id, session_id)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[channel].add(future)
+        metrics.add("image_event_waiters", 1)
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Image event subscription not ready, fall back to status check")
+        except BaseException:
+            self.unsubscribe(user_id, session_id, future)
+            raise
+        return future
+
+    def unsubscribe(self, user_id: int, session_id: str, future: asyncio.Future) -> None:
+        """
+        取消等待
+
+        Args:
+            user_id: 用户ID
+            session_id: 会话ID
+            future: subscribe 返回的 future
+        """
+        channel = image_event_channel(user_id, session_id)
+        waiters = self._waiters.get(channel)
+        if waiters is not None:
+            waiters.discard(future)
+            if not waiters:
+                self._waiters.pop(channel, None)
+        future.cancel()
+        metrics.add("image_event_waiters", -1)
+
+    async def close(self) -> None:
+        """停止订阅"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for waiters in self._waiters.values():
+            for future in waiters:
+                future.cancel()
+        self._waiters.clear()
+
+
+# 创建图片事件订阅单例
+image_event_hub: ImageEventHub = ImageEventHub()
+
+
+async def get_session_image_event(user_id: int, session_id: str) -> Optional[ImageEvent]:
+    """
+    根据当前存储状态构造会话图片事件
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+
+    Returns:
+        图片已就绪或任务已失败时返回对应事件，否则返回None
+    """
+    image_key = await get_session_image_key(user_id, session_id)
+    if image_key and await has_image(image_key):
+        return ImageEvent(status=ImageEventStatus.READY, image_key=image_key)
+    job = await get_session_image_job(user_id, session_id)
+    if job is not None and job.status in (ImageJobStatus.FAILED, ImageJobStatus.CANCELLED):
+        return ImageEvent(status=ImageEventStatus.FAILED, error=job.error)
+    return None
+
+
+async def wait_for_session_image(user_id: int, session_id: str, timeout: float) -> ImageEvent:
+    """
+    等待会话图片就绪
+
+    先订阅再检查当前状态，图片已就绪时立即返回，否则等待 worker 发布的事件直到超时。
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+        timeout: 最长等待秒数
+
+    Returns:
+        图片事件，超时返回 pending
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    future = await image_event_hub.subscribe(user_id, session_id, timeout=timeout)
+    try:
+        event = await get_session_image_event(user_id, session_id)
+        if event is None:
+            try:
+                event = await asyncio.wait_for(asyncio.shield(future), timeout=max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                # 订阅断线期间可能漏掉事件，超时前再检查一次
+                event = await get_session_image_event(user_id, session_id)
+        event = event or ImageEvent(status=ImageEventStatus.PENDING)
+        metrics.incr("image_event_waits_total", result=event.status.value)
+        return event
+    finally:
+        image_event_hub.unsubscribe(user_id, session_id, future)
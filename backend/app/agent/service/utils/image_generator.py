@@ -1,19 +1,24 @@
-import base64
+import hashlib
+import json
 import traceback
+import unicodedata
 
-from datetime import timedelta
 from typing import List, Optional
 
-import httpx
-
-from backend.app.agent.schema.cocktail_schema import CocktailRecommendation
+from backend.app.agent.schema.cocktail_schema import CocktailImageSubject
+from backend.app.agent.service.utils.image_store import has_image, put_image
+from backend.app.agent.service.utils.image_transcoder import store_image_variants
 from backend.common.log import logger
 from backend.core.conf import settings
-from backend.database.redis import redis_client
-from pydantic import BaseModel, Field
+from backend.utils.http_client import Upstream, http_clients
+from backend.utils.single_flight import SingleFlight
+from pydantic import BaseModel, ConfigDict, Field
+
+# 随机种子取值范围
+IMAGE_SEED_MODULUS = 10000000000
 
-# Redis key 前缀
-COCKTAIL_IMAGE_KEY_PREFIX = "cocktail_image"
+# 相同图片的并发生成合并
+_image_single_flight = SingleFlight(lock_prefix="cocktail_image_lock")
 
 
 class ImageGenerationRequest(BaseModel):
@@ -40,128 +45,203 @@ class ImageGenerationResponse(BaseModel):
     seed: int
 
 
-async def generate_cocktail_image(
-    cocktail: CocktailRecommendation,
-) -> Optional[str]:
+def normalize_cocktail_name(name: str) -> str:
     """
-    根据鸡尾酒信息生成图片
+    规范化鸡尾酒名称：Unicode NFKC、大小写折叠并合并空白
 
     Args:
-        cocktail: 鸡尾酒推荐信息
-        image_size: 生成图片的尺寸，默认为1024x1024
-        negative_prompt: 负面提示词
-        num_inference_steps: 推理步数，默认为20
-        guidance_scale: 引导尺度，默认为7.5
-        input_image: 用于图像到图像生成的输入图像(base64格式)
+        name: 鸡尾酒名称
 
     Returns:
-        生成的图片URL，如果生成失败则返回None
+        规范化后的名称
     """
-    try:
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+def derive_image_seed(name: str) -> int:
+    """
+    由鸡尾酒名称派生稳定的随机种子
+
+    使用带密钥的 BLAKE2b 摘要，而不是受 PYTHONHASHSEED 影响的 hash()，
+    保证不同 worker、不同进程、重启前后得到相同的种子。
+
+    Args:
+        name: 鸡尾酒名称
+
+    Returns:
+        [0, IMAGE_SEED_MODULUS) 范围内的种子
+    """
+    digest = hashlib.blake2b(
+        normalize_cocktail_name(name).encode("utf-8"),
+        key=settings.IMAGE_SEED_KEY.encode("utf-8"),
+        digest_size=8,
+    ).digest()
+    return int.from_bytes(digest, "big") % IMAGE_SEED_MODULUS
+
+
+class ImageGenerationSpec(ImageGenerationRequest):
+    """
+    可复现的图片生成规格
+
+    规格只由鸡尾酒名称和固定参数决定，相同的鸡尾酒在任何进程中都得到相同的请求和缓存键。
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    seed: int = Field(..., description="由鸡尾酒名称派生的稳定随机种子")
+
+    @classmethod
+    def from_cocktail(cls, cocktail: CocktailImageSubject) -> "ImageGenerationSpec":
+        """
+        根据鸡尾酒信息构建图片生成规格
+
+        Args:
+            cocktail: 鸡尾酒图片信息
+
+        Returns:
+            图片生成规格
+        """
         # 构建prompt
         prompt = f"""
         Create a high-resolution image featuring a cocktail named {cocktail.english_name} prominently in the center, elegantly garnished. The background should be intentionally blurred to draw attention to the {cocktail.english_name} cocktail. Maintain a consistent top-down perspective for various name variations, ensuring the cocktail’s allure is always showcased. Capture the image using a Canon EOS 5D Mark IV camera with a 50mm prime lens, set at ISO 100, shutter speed 1/200 sec, and aperture f/1.8 to create a shallow depth of field. The photo should have a vivid and clear style, highlighting the intricate details and vibrant colors of the {cocktail.english_name} cocktail.
         """  # noqa: E501
 
-        negative_prompt = "low quality, blurry, out of focus, low resolution"
-
-        image_size = "512x512"
-        guidance_scale = 4.5
-        num_inference_steps = 20
-        # 构建请求
-        request = ImageGenerationRequest(
-            prompt=prompt,
-            negative_prompt=negative_prompt,
-            image_size=image_size,
-            seed=hash(cocktail.name) % 10000000000,  # 使用鸡尾酒名称生成固定seed
-            num_inference_steps=num_inference_steps,
-            guidance_scale=guidance_scale,
+        return cls(
+            prompt=" ".join(prompt.split()),
+            negative_prompt="low quality, blurry, out of focus, low resolution",
+            image_size="512x512",
+            # prompt 只依赖英文名称，种子也由英文名称派生，缺失时退回中文名称
+            seed=derive_image_seed(cocktail.english_name or cocktail.name),
+            num_inference_steps=20,
+            guidance_scale=4.5,
         )
 
+    def cache_key(self) -> str:
+        """
+        内容寻址的缓存键：规范化后的 prompt 与全部生成参数（含种子）的稳定哈希
+
+        Returns:
+            十六进制摘要
+        """
+        params = self.model_dump()
+        for field in ("prompt", "negative_prompt"):
+            if params.get(field):
+                params[field] = " ".join(params[field].split()).lower()
+        canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+async def generate_cocktail_image(
+    cocktail: CocktailImageSubject,
+    request: Optional[ImageGenerationRequest] = None,
+) -> Optional[str]:
+    """
+    根据鸡尾酒信息生成图片
+
+    Args:
+        cocktail: 鸡尾酒图片信息
+        request: 已构建好的图片生成请求，为空时使用鸡尾酒的图片生成规格
+
+    Returns:
+        生成的图片URL，如果生成失败则返回None
+    """
+    try:
+        if request is None:
+            request = ImageGenerationSpec.from_cocktail(cocktail)
+
         # 调用API
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://api.siliconflow.cn/v1/images/generations",
-                headers={"Authorization": f"Bearer {settings.SILICONFLOW_API_KEY}", "Content-Type": "application/json"},
-                json=request.model_dump(exclude_none=True),
-            )
-
-            if response.status_code == 200:
-                result = ImageGenerationResponse.model_validate(response.json())
-                return result.images[0]["url"]
-            else:
-                logger.error(f"Image generation failed with status code {response.status_code}: {response.text}")
-                return None
+        client = http_clients.get_async(Upstream.IMAGE)
+        response = await client.post(
+            settings.SILICONFLOW_IMAGE_URL,
+            headers={"Authorization": f"Bearer {settings.SILICONFLOW_API_KEY}", "Content-Type": "application/json"},
+            json=request.model_dump(exclude_none=True),
+        )
+
+        if response.status_code == 200:
+            result = ImageGenerationResponse.model_validate(response.json())
+            return result.images[0]["url"]
+        else:
+            logger.error(f"Image generation failed with status code {response.status_code}: {response.text}")
+            return None
 
     except Exception as e:
         logger.error(f"Error generating cocktail image: {str(e)}{traceback.format_exc()}")
         return None
 
 
-async def download_and_convert_to_base64(image_url: str) -> Optional[str]:
+async def download_image(image_url: str) -> Optional[bytes]:
     """
-    下载图片并转换为base64格式
+    下载图片
 
     Args:
         image_url: 图片URL
 
     Returns:
-        base64编码的图片字符串，如果失败则返回None
+        图片字节，如果失败则返回None
     """
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(image_url)
-            if response.status_code == 200:
-                # 将图片内容转换为base64
-                image_bytes = response.content
-                base64_image = base64.b64encode(image_bytes).decode("utf-8")
-                return base64_image
-            else:
-                logger.error(f"Failed to download image: {response.status_code}")
-                return None
+        client = http_clients.get_async(Upstream.IMAGE_DOWNLOAD)
+        response = await client.get(image_url)
+        if response.status_code == 200:
+            return response.content
+        else:
+            logger.error(f"Failed to download image: {response.status_code}")
+            return None
     except Exception as e:
-        logger.error(f"Error downloading and converting image: {str(e)}{traceback.format_exc()}")
+        logger.error(f"Error downloading image: {str(e)}{traceback.format_exc()}")
         return None
 
 
-async def store_cocktail_image_url(user_id: int, session_id: str, image_url: str) -> None:
-    """
-    存储鸡尾酒图片URL和base64数据
+async def _get_shared_image(image_key: str) -> Optional[str]:
+    if await has_image(image_key):
+        return image_key
+    return None
 
-    Args:
-        user_id: 用户ID
-        session_id: 会话ID
-        image_url: 图片URL
-    """
+
+async def _create_shared_image(cocktail: CocktailImageSubject, spec: ImageGenerationSpec) -> Optional[str]:
+    image_key = spec.cache_key()
+    image_url = await generate_cocktail_image(cocktail, spec)
+    if not image_url:
+        return None
+
+    # 下载图片，以原始字节存储，不再做 base64 转换
+    image_bytes = await download_image(image_url)
+    if not image_bytes:
+        logger.error(f"Failed to download image for cocktail {cocktail.english_name}")
+        return None
+
+    await put_image(image_key, image_bytes)
+
+    # 生成缩略图与 WebP/AVIF 变体，失败时读取方会按需重新生成
     try:
-        # 下载图片并转换为base64
-        base64_image = await download_and_convert_to_base64(image_url)
-        if not base64_image:
-            logger.error(f"Failed to convert image to base64 for user {user_id}: {session_id}")
-            return
-
-        # 存储base64数据到Redis
-        image_key = f"{COCKTAIL_IMAGE_KEY_PREFIX}:{user_id}:{session_id}"
-        expire_time = timedelta(days=3650)
-        await redis_client.setex(image_key, expire_time, base64_image)
-        logger.info(f"Stored cocktail image base64 for user {user_id}: {session_id}")
+        await store_image_variants(image_key, image_bytes)
     except Exception as e:
-        logger.error(f"Error storing cocktail image: {str(e)}{traceback.format_exc()}")
+        logger.error(f"Error transcoding cocktail image {image_key}: {str(e)}{traceback.format_exc()}")
+    return image_key
 
 
-async def get_cocktail_image_url(user_id: int, session_id: str) -> Optional[str]:
+async def get_or_create_shared_image(cocktail: CocktailImageSubject) -> Optional[str]:
     """
-    获取鸡尾酒图片base64数据
+    获取鸡尾酒对应的共享图片，不存在时生成
+
+    相同 prompt 与参数的图片只生成一次，所有用户共享；并发请求同一张图片时只有一个上游调用。
 
     Args:
-        user_id: 用户ID
-        session_id: 会话ID
+        cocktail: 鸡尾酒图片信息
 
     Returns:
-        图片base64数据,如果不存在则返回None
+        共享图片的内容键，失败返回None
     """
-    image_key = f"{COCKTAIL_IMAGE_KEY_PREFIX}:{user_id}:{session_id}"
-    base64_image = await redis_client.get(image_key)
-    if base64_image:
-        return base64_image
-    return None
+    try:
+        spec = ImageGenerationSpec.from_cocktail(cocktail)
+        image_key = spec.cache_key()
+        return await _image_single_flight.do(
+            image_key,
+            lambda: _create_shared_image(cocktail, spec),
+            check=lambda: _get_shared_image(image_key),
+            lock_seconds=settings.IMAGE_SINGLE_FLIGHT_LOCK_SECONDS,
+            wait_seconds=settings.IMAGE_SINGLE_FLIGHT_LOCK_SECONDS,
+        )
+    except Exception as e:
+        logger.error(f"Error creating shared cocktail image: {str(e)}{traceback.format_exc()}")
+        return None
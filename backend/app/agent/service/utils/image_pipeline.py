@@ -0,0 +1,106 @@
+import asyncio
+
+from typing import Any, Dict, Optional, Set
+
+from backend.app.agent.schema.cocktail_schema import CocktailImageSubject, CocktailRecommendation
+from backend.app.agent.service.utils.image_generator import ImageGenerationSpec
+from backend.app.agent.service.utils.image_queue import cancel_image_job, enqueue_image_job
+from backend.common.log import logger
+from backend.common.metrics import metrics
+
+# 后台取消任务，保留引用防止被回收
+_pending_cancels: Set[asyncio.Task] = set()
+
+
+class SpeculativeImageJob:
+    """
+    跟随调酒师推荐的流式输出提前提交图片生成任务
+
+    英文名称解析出来后立即提交，图片生成与推荐剩余部分的生成重叠进行；最终校验后的推荐生成的图片
+    与提前提交的不同时，先按最终结果提交新任务，再取消提前提交的任务，推荐失败时直接取消。
+    """
+
+    def __init__(self, user_id: int, session_id: str):
+        self.user_id = user_id
+        self.session_id = session_id
+        self._fields: Dict[str, Any] = {}
+        self._speculating = True
+        self._subject: Optional[CocktailImageSubject] = None
+        self._job_id: Optional[str] = None
+
+    async def on_field(self, name: str, value: Any) -> None:
+        """
+        处理解析出的推荐字段，名称齐全后提交任务
+
+        Args:
+            name: 字段名
+            value: 字段值
+        """
+        if not self._speculating:
+            return
+        self._fields[name] = value
+        # english_name 紧随 name 生成
+        if "english_name" not in self._fields or not self._fields.get("name"):
+            return
+        self._speculating = False
+        try:
+            subject = CocktailImageSubject.model_validate(self._fields)
+        except ValueError:
+            logger.warning(f"Invalid streamed cocktail name for user {self.user_id}: {self.session_id}")
+            return
+        self._subject, self._job_id = subject, await self._submit(subject)
+        if self._job_id is not None:
+            metrics.incr("image_speculative_jobs_total", result="submitted")
+
+    async def on_result(self, cocktail: CocktailRecommendation) -> None:
+        """
+        根据最终推荐确认或替换提前提交的任务
+
+        Args:
+            cocktail: 校验后的鸡尾酒推荐
+        """
+        self._speculating = False
+        subject = CocktailImageSubject(name=cocktail.name, english_name=cocktail.english_name)
+        if self._job_id is not None and self._same_image(subject):
+            metrics.incr("image_speculative_jobs_total", result="confirmed")
+            return
+        # 先提交新任务再取消旧任务，会话始终指向有效的任务
+        previous = self._job_id
+        self._subject, self._job_id = subject, await self._submit(subject)
+        if previous is not None:
+            metrics.incr("image_speculative_jobs_total", result="replaced")
+            await self._cancel(previous)
+
+    def discard(self) -> None:
+        """
+        推荐失败或客户端断开时在后台取消提前提交的任务
+
+        不在当前任务中等待，已被取消的请求任务中也可以调用。
+        """
+        self._speculating = False
+        if self._job_id is None:
+            return
+        metrics.incr("image_speculative_jobs_total", result="discarded")
+        task = asyncio.create_task(self._cancel(self._job_id))
+        _pending_cancels.add(task)
+        task.add_done_callback(_pending_cancels.discard)
+        self._job_id = None
+
+    def _same_image(self, subject: CocktailImageSubject) -> bool:
+        # 生成规格相同即为同一张图片，名称的无关差异不必重新生成
+        return ImageGenerationSpec.from_cocktail(subject).cache_key() == (
+            ImageGenerationSpec.from_cocktail(self._subject).cache_key()
+        )
+
+    async def _submit(self, subject: CocktailImageSubject) -> Optional[str]:
+        try:
+            return await enqueue_image_job(subject, self.user_id, self.session_id)
+        except Exception as e:
+            logger.error(f"Failed to enqueue image job for user {self.user_id}: {self.session_id}, error: {str(e)}")
+            return None
+
+    async def _cancel(self, job_id: str) -> None:
+        try:
+            await cancel_image_job(job_id)
+        except Exception as e:
+            logger.error(f"Failed to cancel image job {job_id}, error: {str(e)}")
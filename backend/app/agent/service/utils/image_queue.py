@@ -0,0 +1,337 @@
+import random
+import time
+import uuid
+
+from datetime import datetime
+from typing import Optional
+
+from backend.app.agent.schema.cocktail_schema import CocktailImageSubject, CocktailRecommendation
+from backend.app.agent.schema.image_job_schema import ImageJob, ImageJobStatus
+from backend.common.log import logger
+from backend.core.conf import settings
+from backend.database.redis import redis_client
+
+# Redis key 前缀
+IMAGE_JOB_KEY_PREFIX = "cocktail_image_job"
+IMAGE_JOB_QUEUE_KEY = f"{IMAGE_JOB_KEY_PREFIX}:queue"
+IMAGE_JOB_PROCESSING_KEY = f"{IMAGE_JOB_KEY_PREFIX}:processing"
+IMAGE_JOB_DELAYED_KEY = f"{IMAGE_JOB_KEY_PREFIX}:delayed"
+IMAGE_JOB_LEASES_KEY = f"{IMAGE_JOB_KEY_PREFIX}:leases"
+
+# 从队列取出任务并写入租约，两步在同一个脚本中完成，worker 中途崩溃也不会留下没有租约的任务
+# KEYS: 待处理队列, 处理中列表, 租约有序集合; ARGV: 租约到期时间
+_CLAIM_SCRIPT = """
+local job_id = redis.call("lmove", KEYS[1], KEYS[2], "RIGHT", "LEFT")
+if job_id then
+    redis.call("zadd", KEYS[3], ARGV[1], job_id)
+end
+return job_id
+"""
+
+# 租约已过期或不存在时把任务从处理中列表放回队列，同时写入排队状态
+# KEYS: 待处理队列, 处理中列表, 租约有序集合, 任务键; ARGV: 任务ID, 当前时间, 任务数据, 任务保留时间
+_REQUEUE_SCRIPT = """
+local lease = redis.call("zscore", KEYS[3], ARGV[1])
+if lease and tonumber(lease) >= tonumber(ARGV[2]) then
+    return 0
+end
+if redis.call("lrem", KEYS[2], 1, ARGV[1]) == 0 then
+    return 0
+end
+redis.call("zrem", KEYS[3], ARGV[1])
+redis.call("set", KEYS[4], ARGV[3], "EX", ARGV[4])
+redis.call("lpush", KEYS[1], ARGV[1])
+return 1
+"""
+
+
+def _job_key(job_id: str) -> str:
+    return f"{IMAGE_JOB_KEY_PREFIX}:job:{job_id}"
+
+
+def _session_job_key(user_id: int, session_id: str) -> str:
+    return f"{IMAGE_JOB_KEY_PREFIX}:session:{user_id}:{session_id}"
+
+
+def _cancel_key(job_id: str) -> str:
+    return f"{IMAGE_JOB_KEY_PREFIX}:cancelled:{job_id}"
+
+
+def backoff_seconds(attempts: int) -> float:
+    """
+    计算第 attempts 次失败后的退避时间（指数退避 + 抖动）
+
+    Args:
+        attempts: 已尝试次数
+
+    Returns:
+        退避秒数
+    """
+    delay = settings.IMAGE_JOB_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0))
+    delay = min(delay, settings.IMAGE_JOB_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def save_image_job(job: ImageJob) -> None:
+    """
+    保存任务状态
+
+    Args:
+        job: 图片生成任务
+    """
+    job.updated_at = datetime.now()
+    await redis_client.setex(_job_key(job.job_id), settings.IMAGE_JOB_EXPIRE_SECONDS, job.model_dump_json())
+
+
+async def get_image_job(job_id: str) -> Optional[ImageJob]:
+    """
+    获取任务
+
+    Args:
+        job_id: 任务ID
+
+    Returns:
+        图片生成任务，不存在则返回None
+    """
+    data = await redis_client.get(_job_key(job_id))
+    if not data:
+        return None
+    return ImageJob.model_validate_json(data)
+
+
+async def get_session_image_job(user_id: int, session_id: str) -> Optional[ImageJob]:
+    """
+    获取会话最近一次的图片生成任务
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+
+    Returns:
+        图片生成任务，不存在则返回None
+    """
+    job_id = await redis_client.get(_session_job_key(user_id, session_id))
+    if not job_id:
+        return None
+    return await get_image_job(job_id)
+
+
+async def enqueue_image_job(
+    cocktail: CocktailRecommendation | CocktailImageSubject, user_id: int, session_id: str
+) -> str:
+    """
+    提交图片生成任务，由独立的 worker 进程异步处理
+
+    Args:
+        cocktail: 鸡尾酒推荐信息，流式推荐时可以只有名称
+        user_id: 用户ID
+        session_id: 会话ID
+
+    Returns:
+        任务ID
+    """
+    # 任务只保存生成图片所需的名称
+    subject = CocktailImageSubject(name=cocktail.name, english_name=cocktail.english_name)
+    job = ImageJob(job_id=uuid.uuid4().hex, user_id=str(user_id), session_id=str(session_id), cocktail=subject)
+    await save_image_job(job)
+    await redis_client.setex(_session_job_key(user_id, session_id), settings.IMAGE_JOB_EXPIRE_SECONDS, job.job_id)
+    await redis_client.lpush(IMAGE_JOB_QUEUE_KEY, job.job_id)
+    logger.info(f"Enqueued image job {job.job_id} for user {user_id}: {session_id}")
+    return job.job_id
+
+
+async def _release_image_job(job_id: str) -> None:
+    # 先移出处理中列表再删除租约，处理中的任务始终带有租约
+    await redis_client.lrem(IMAGE_JOB_PROCESSING_KEY, 1, job_id)
+    await redis_client.zrem(IMAGE_JOB_LEASES_KEY, job_id)
+
+
+async def claim_image_job(timeout: int = 5) -> Optional[ImageJob]:
+    """
+    阻塞获取一个待处理任务，移入处理中列表并写入租约
+
+    Args:
+        timeout: 阻塞等待秒数，需小于 Redis socket 超时时间
+
+    Returns:
+        获取到的任务，超时返回None
+    """
+    while True:
+        lease_until = time.time() + settings.IMAGE_JOB_LEASE_SECONDS
+        job_id = await redis_client.eval(
+            _CLAIM_SCRIPT, 3, IMAGE_JOB_QUEUE_KEY, IMAGE_JOB_PROCESSING_KEY, IMAGE_JOB_LEASES_KEY, lease_until
+        )
+        if job_id:
+            break
+        # 脚本中不能阻塞，队列为空时用同一列表首尾不变的 BLMOVE 等待新任务，不会取出任务
+        if not await redis_client.blmove(IMAGE_JOB_QUEUE_KEY, IMAGE_JOB_QUEUE_KEY, timeout, "RIGHT", "RIGHT"):
+            return None
+    job = await get_image_job(job_id)
+    if job is None:
+        # 任务状态已过期，直接丢弃
+        await _release_image_job(job_id)
+        return None
+    if await is_image_job_cancelled(job_id):
+        await mark_image_job_cancelled(job)
+        return None
+    job.status = ImageJobStatus.RUNNING
+    job.attempts += 1
+    job.lease_until = lease_until
+    await save_image_job(job)
+    return job
+
+
+async def renew_image_job_lease(job: ImageJob) -> bool:
+    """
+    续期处理中任务的租约
+
+    Args:
+        job: 图片生成任务
+
+    Returns:
+        是否续期成功，租约已过期被重新入队时返回False
+    """
+    lease_until = time.time() + settings.IMAGE_JOB_LEASE_SECONDS
+    if not await redis_client.zadd(IMAGE_JOB_LEASES_KEY, {job.job_id: lease_until}, xx=True, ch=True):
+        return False
+    job.lease_until = lease_until
+    await save_image_job(job)
+    return True
+
+
+async def complete_image_job(job: ImageJob) -> None:
+    """
+    标记任务完成
+
+    Args:
+        job: 图片生成任务
+    """
+    job.status = ImageJobStatus.SUCCEEDED
+    job.error = None
+    job.lease_until = None
+    await save_image_job(job)
+    await _release_image_job(job.job_id)
+
+
+async def fail_image_job(job: ImageJob, error: str) -> None:
+    """
+    标记任务失败，未超过最大尝试次数时按退避时间延迟重试
+
+    Args:
+        job: 图片生成任务
+        error: 失败原因
+    """
+    job.error = error
+    job.lease_until = None
+    if job.attempts < settings.IMAGE_JOB_MAX_ATTEMPTS:
+        delay = backoff_seconds(job.attempts)
+        job.status = ImageJobStatus.RETRYING
+        await save_image_job(job)
+        await redis_client.zadd(IMAGE_JOB_DELAYED_KEY, {job.job_id: time.time() + delay})
+        logger.warning(f"Image job {job.job_id} failed (attempt {job.attempts}), retry in {delay:.1f}s: {error}")
+    else:
+        job.status = ImageJobStatus.FAILED
+        await save_image_job(job)
+        logger.error(f"Image job {job.job_id} failed after {job.attempts} attempts: {error}")
+    await _release_image_job(job.job_id)
+
+
+async def cancel_image_job(job_id: str) -> None:
+    """
+    取消图片生成任务
+
+    排队中和等待重试的任务直接移除；处理中的任务由 worker 检测到取消标记后中止上游请求，且不再关联到会话。
+
+    Args:
+        job_id: 任务ID
+    """
+    # 先写取消标记，之后才被领取的任务也会在领取时跳过
+    await redis_client.setex(_cancel_key(job_id), settings.IMAGE_JOB_EXPIRE_SECONDS, 1)
+    removed = await redis_client.lrem(IMAGE_JOB_QUEUE_KEY, 0, job_id)
+    removed += await redis_client.zrem(IMAGE_JOB_DELAYED_KEY, job_id)
+    if removed:
+        job = await get_image_job(job_id)
+        if job is not None:
+            job.status = ImageJobStatus.CANCELLED
+            job.error = "cancelled"
+            await save_image_job(job)
+    logger.info(f"Cancelled image job {job_id}")
+
+
+async def is_image_job_cancelled(job_id: str) -> bool:
+    """
+    任务是否已被取消
+
+    Args:
+        job_id: 任务ID
+
+    Returns:
+        是否已取消
+    """
+    return bool(await redis_client.exists(_cancel_key(job_id)))
+
+
+async def mark_image_job_cancelled(job: ImageJob) -> None:
+    """
+    worker 放弃已被取消的任务
+
+    Args:
+        job: 图片生成任务
+    """
+    job.status = ImageJobStatus.CANCELLED
+    job.error = "cancelled"
+    job.lease_until = None
+    await save_image_job(job)
+    await _release_image_job(job.job_id)
+
+
+async def promote_delayed_jobs() -> int:
+    """
+    将到期的重试任务放回队列
+
+    Returns:
+        放回队列的任务数
+    """
+    job_ids = await redis_client.zrangebyscore(IMAGE_JOB_DELAYED_KEY, "-inf", time.time())
+    promoted = 0
+    for job_id in job_ids:
+        # 多个 worker 同时扫描时只有删除成功的一方负责入队
+        if await redis_client.zrem(IMAGE_JOB_DELAYED_KEY, job_id):
+            await redis_client.lpush(IMAGE_JOB_QUEUE_KEY, job_id)
+            promoted += 1
+    return promoted
+
+
+async def requeue_expired_jobs() -> int:
+    """
+    将租约过期的处理中任务重新入队（worker 崩溃或被强制终止时）
+
+    没有租约的处理中任务同样视为过期。
+
+    Returns:
+        重新入队的任务数
+    """
+    requeued = 0
+    now = time.time()
+    for job_id in await redis_client.lrange(IMAGE_JOB_PROCESSING_KEY, 0, -1):
+        job = await get_image_job(job_id)
+        if job is None:
+            await _release_image_job(job_id)
+            continue
+        job.status = ImageJobStatus.QUEUED
+        job.lease_until = None
+        job.updated_at = datetime.now()
+        # 检查租约、写入状态与移回队列在同一个脚本中完成，不会与续期或其他 worker 的领取交错
+        requeued += await redis_client.eval(
+            _REQUEUE_SCRIPT,
+            4,
+            IMAGE_JOB_QUEUE_KEY,
+            IMAGE_JOB_PROCESSING_KEY,
+            IMAGE_JOB_LEASES_KEY,
+            _job_key(job_id),
+            job_id,
+            now,
+            job.model_dump_json(),
+            settings.IMAGE_JOB_EXPIRE_SECONDS,
+        )
+    return requeued
@@ -0,0 +1,318 @@
+import base64
+import binascii
+import hashlib
+import threading
+import time
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from backend.app.agent.service.utils.image_cold_store import ColdImageStore, create_cold_store
+from backend.common.log import logger
+from backend.common.metrics import metrics
+from backend.core.conf import settings
+from backend.database.redis import redis_binary_client, redis_client
+
+# Redis key 前缀
+COCKTAIL_IMAGE_KEY_PREFIX = "cocktail_image"  # 旧版：按会话存储的 base64 图片
+COCKTAIL_IMAGE_BLOB_KEY_PREFIX = "cocktail_image_blob"  # 旧版：共享的 base64 图片
+COCKTAIL_IMAGE_REF_KEY_PREFIX = "cocktail_image_ref"
+COCKTAIL_IMAGE_BYTES_KEY_PREFIX = "cocktail_image_bytes"  # 热层图片字节
+COCKTAIL_IMAGE_HOT_LRU_KEY = "cocktail_image_hot:lru"  # 热层图片最近读取时间
+COCKTAIL_IMAGE_HOT_SIZE_KEY = "cocktail_image_hot:size"  # 热层图片大小
+COCKTAIL_IMAGE_HOT_BYTES_KEY = "cocktail_image_hot:bytes"  # 热层总字节数
+
+# 读取热层图片并续期，顺带把未计入预算的旧数据纳入统计
+# KEYS: 图片键, LRU 有序集合, 大小哈希, 总字节数; ARGV: 当前时间, TTL, 内容键
+_HOT_TOUCH_SCRIPT = """
+local data = redis.call("get", KEYS[1])
+if not data then
+    return false
+end
+redis.call("expire", KEYS[1], ARGV[2])
+redis.call("zadd", KEYS[2], ARGV[1], ARGV[3])
+if redis.call("hsetnx", KEYS[3], ARGV[3], string.len(data)) == 1 then
+    redis.call("incrby", KEYS[4], string.len(data))
+end
+return data
+"""
+
+# 写入热层图片，回收已过期的条目，超出字节预算时按最近读取时间淘汰
+# KEYS: 图片键, LRU 有序集合, 大小哈希, 总字节数; ARGV: 图片字节, 当前时间, TTL, 字节预算, 内容键, 图片键前缀
+_HOT_PUT_SCRIPT = """
+local function drop(member)
+    redis.call("zrem", KEYS[2], member)
+    redis.call("del", ARGV[6] .. member)
+    local size = tonumber(redis.call("hget", KEYS[3], member) or "0")
+    redis.call("hdel", KEYS[3], member)
+    return redis.call("incrby", KEYS[4], -size)
+end
+
+local now, ttl = tonumber(ARGV[2]), tonumber(ARGV[3])
+for _, member in ipairs(redis.call("zrangebyscore", KEYS[2], "-inf", now - ttl, "LIMIT", 0, 100)) do
+    drop(member)
+end
+
+local old = tonumber(redis.call("hget", KEYS[3], ARGV[5]) or "0")
+local size = string.len(ARGV[1])
+redis.call("set", KEYS[1], ARGV[1], "EX", ttl)
+redis.call("hset", KEYS[3], ARGV[5], size)
+redis.call("zadd", KEYS[2], now, ARGV[5])
+local total = redis.call("incrby", KEYS[4], size - old)
+
+local evicted = 0
+while total > tonumber(ARGV[4]) do
+    local oldest = redis.call("zrange", KEYS[2], 0, 0)[1]
+    if not oldest or oldest == ARGV[5] then
+        break
+    end
+    total = drop(oldest)
+    evicted = evicted + 1
+end
+return {total, evicted}
+"""
+
+_IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+# 冷层存储与各层命中统计
+_cold_store: ColdImageStore = create_cold_store()
+_stats_lock = threading.Lock()
+_tier_stats: Dict[str, Dict[str, int]] = {"hot": {"hit": 0, "miss": 0}, "cold": {"hit": 0, "miss": 0}}
+_hot_usage = {"bytes": 0}
+
+
+@dataclass(frozen=True)
+class StoredImage:
+    """存储的图片"""
+
+    data: bytes
+    content_type: str
+    etag: str
+
+
+def sniff_image_type(data: bytes) -> str:
+    """
+    根据文件头判断图片类型
+
+    Args:
+        data: 图片字节
+
+    Returns:
+        MIME 类型，无法识别时返回 application/octet-stream
+    """
+    for signature, content_type in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "application/octet-stream"
+
+
+def _to_stored_image(data: bytes) -> StoredImage:
+    return StoredImage(
+        data=data,
+        content_type=sniff_image_type(data),
+        etag=f'"{hashlib.blake2b(data, digest_size=16).hexdigest()}"',
+    )
+
+
+def _decode_legacy(base64_image: str) -> Optional[bytes]:
+    try:
+        return base64.b64decode(base64_image, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def _hot_key(image_key: str) -> str:
+    return f"{COCKTAIL_IMAGE_BYTES_KEY_PREFIX}:{image_key}"
+
+
+def _hot_tier_keys(image_key: str) -> list:
+    return [_hot_key(image_key), COCKTAIL_IMAGE_HOT_LRU_KEY, COCKTAIL_IMAGE_HOT_SIZE_KEY, COCKTAIL_IMAGE_HOT_BYTES_KEY]
+
+
+def _record(tier: str, hit: bool) -> None:
+    result = "hit" if hit else "miss"
+    metrics.incr("image_store_requests_total", tier=tier, result=result)
+    with _stats_lock:
+        _tier_stats[tier][result] += 1
+
+
+def image_store_stats() -> Dict[str, Any]:
+    """
+    各存储层的命中率与占用
+
+    Returns:
+        统计信息
+    """
+    with _stats_lock:
+        tiers = {tier: dict(counts) for tier, counts in _tier_stats.items()}
+        hot_bytes = _hot_usage["bytes"]
+    for counts in tiers.values():
+        total = counts["hit"] + counts["miss"]
+        counts["hit_rate"] = counts["hit"] / total if total else None
+    tiers["hot"].update(bytes=hot_bytes, max_bytes=settings.IMAGE_STORE_HOT_MAX_BYTES)
+    tiers["cold"].update(_cold_store.stats())
+    return tiers
+
+
+async def _hot_get(image_key: str) -> Optional[bytes]:
+    data = await redis_binary_client.eval(
+        _HOT_TOUCH_SCRIPT, 4, *_hot_tier_keys(image_key), time.time(), settings.IMAGE_STORE_HOT_TTL_SECONDS, image_key
+    )
+    _record("hot", data is not None)
+    return data
+
+
+async def _hot_put(image_key: str, data: bytes) -> None:
+    total, evicted = await redis_binary_client.eval(
+        _HOT_PUT_SCRIPT,
+        4,
+        *_hot_tier_keys(image_key),
+        data,
+        time.time(),
+        settings.IMAGE_STORE_HOT_TTL_SECONDS,
+        settings.IMAGE_STORE_HOT_MAX_BYTES,
+        image_key,
+        f"{COCKTAIL_IMAGE_BYTES_KEY_PREFIX}:",
+    )
+    with _stats_lock:
+        _hot_usage["bytes"] = int(total)
+    if evicted:
+        metrics.incr("image_store_evictions_total", int(evicted), tier="hot")
+        logger.info(f"Evicted {evicted} cocktail images from the hot tier, {total} bytes held")
+
+
+async def has_image(image_key: str) -> bool:
+    """
+    共享图片是否存在
+
+    Args:
+        image_key: 共享图片的内容键
+
+    Returns:
+        是否存在
+    """
+    if await redis_binary_client.exists(_hot_key(image_key)):
+        return True
+    if await _cold_store.exists(image_key):
+        return True
+    return bool(await redis_client.exists(f"{COCKTAIL_IMAGE_BLOB_KEY_PREFIX}:{image_key}"))
+
+
+async def put_image(image_key: str, data: bytes) -> None:
+    """
+    存储共享图片：先写冷层作为持久副本，再写入热层
+
+    Args:
+        image_key: 共享图片的内容键
+        data: 图片字节
+    """
+    await _cold_store.put(image_key, data)
+    await _hot_put(image_key, data)
+    logger.info(f"Stored shared cocktail image {image_key}: {len(data)} bytes")
+
+
+async def get_image(image_key: str) -> Optional[StoredImage]:
+    """
+    读取共享图片，依次查找热层、冷层，冷层命中时回填热层
+
+    Args:
+        image_key: 共享图片的内容键
+
+    Returns:
+        存储的图片，不存在则返回None
+    """
+    data = await _hot_get(image_key)
+    if data is None:
+        data = await _cold_store.get(image_key)
+        _record("cold", data is not None)
+        if data is None:
+            # 兼容旧版 base64 存储
+            base64_image = await redis_client.get(f"{COCKTAIL_IMAGE_BLOB_KEY_PREFIX}:{image_key}")
+            data = _decode_legacy(base64_image) if base64_image else None
+            if data is None:
+                return None
+            await _cold_store.put(image_key, data)
+        await _hot_put(image_key, data)
+    return _to_stored_image(data)
+
+
+async def link_session_image(user_id: int, session_id: str, image_key: str) -> None:
+    """
+    将会话指向共享图片
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+        image_key: 共享图片的内容键
+    """
+    ref_key = f"{COCKTAIL_IMAGE_REF_KEY_PREFIX}:{user_id}:{session_id}"
+    await redis_client.setex(ref_key, settings.IMAGE_SESSION_REF_EXPIRE_SECONDS, image_key)
+    logger.info(f"Linked cocktail image {image_key} for user {user_id}: {session_id}")
+
+
+async def get_session_image_key(user_id: int, session_id: str) -> Optional[str]:
+    """
+    获取会话指向的共享图片内容键
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+
+    Returns:
+        共享图片的内容键，不存在则返回None
+    """
+    return await redis_client.get(f"{COCKTAIL_IMAGE_REF_KEY_PREFIX}:{user_id}:{session_id}")
+
+
+async def get_session_image(user_id: int, session_id: str) -> Optional[StoredImage]:
+    """
+    获取会话的图片
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+
+    Returns:
+        存储的图片，不存在则返回None
+    """
+    image_key = await get_session_image_key(user_id, session_id)
+    if image_key:
+        image = await get_image(image_key)
+        if image is not None:
+            return image
+
+    # 兼容旧版按会话存储的图片
+    base64_image = await redis_client.get(f"{COCKTAIL_IMAGE_KEY_PREFIX}:{user_id}:{session_id}")
+    data = _decode_legacy(base64_image) if base64_image else None
+    if data is None:
+        return None
+    return _to_stored_image(data)
+
+
+async def get_cocktail_image_url(user_id: int, session_id: str) -> Optional[str]:
+    """
+    获取鸡尾酒图片base64数据，供旧版 JSON 接口使用
+
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+
+    Returns:
+        图片base64数据,如果不存在则返回None
+    """
+    image = await get_session_image(user_id, session_id)
+    if image is None:
+        return None
+    return base64.b64encode(image.data).decode("utf-8")
+
+
+metrics.register_collector("image_store", image_store_stats)
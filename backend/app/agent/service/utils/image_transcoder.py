@@ -0,0 +1,175 @@
+import asyncio
+import io
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Pillow 10 以前通过插件注册 AVIF 编码器
+import pillow_avif  # noqa: F401
+
+from backend.app.agent.service.utils.image_store import StoredImage, get_image, put_image
+from backend.common.log import logger
+from backend.common.metrics import metrics
+from backend.core.conf import settings
+from backend.utils.single_flight import SingleFlight
+from PIL import Image
+
+# Pillow 保存时使用的格式名
+_PIL_FORMATS = {"webp": "WEBP", "avif": "AVIF"}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# 同一图片的按需转码合并
+_transcode_single_flight = SingleFlight(lock_prefix="cocktail_image_transcode_lock")
+
+
+@lru_cache
+def supported_formats() -> Tuple[str, ...]:
+    """
+    当前环境可以编码的变体格式
+
+    Returns:
+        配置中且 Pillow 支持编码的格式
+    """
+    Image.init()
+    formats = tuple(fmt for fmt in settings.IMAGE_VARIANT_FORMATS if _PIL_FORMATS.get(fmt) in Image.SAVE)
+    skipped = set(settings.IMAGE_VARIANT_FORMATS) - set(formats)
+    if skipped:
+        logger.warning(f"Pillow cannot encode image variant formats {sorted(skipped)}, skipped")
+    return formats
+
+
+def variant_name(size: int, fmt: str) -> str:
+    """
+    变体名称，例如 256.webp
+
+    Args:
+        size: 最长边像素
+        fmt: 图片格式
+
+    Returns:
+        变体名称
+    """
+    return f"{size}.{fmt}"
+
+
+def variant_key(image_key: str, size: int, fmt: str) -> str:
+    """
+    变体的存储键
+
+    Args:
+        image_key: 原图的内容键
+        size: 最长边像素
+        fmt: 图片格式
+
+    Returns:
+        变体的存储键
+    """
+    return f"{image_key}.{variant_name(size, fmt)}"
+
+
+def _transcode(data: bytes, sizes: List[int], formats: List[str], quality: Dict[str, int]) -> Dict[str, bytes]:
+    # 在子进程中执行，只能使用可序列化的参数
+    variants = {}
+    with Image.open(io.BytesIO(data)) as source:
+        source.load()
+        image = source.convert("RGBA" if source.mode in ("RGBA", "LA", "P") else "RGB")
+    for size in sizes:
+        resized = image.copy()
+        # 只缩小不放大
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            buffer = io.BytesIO()
+            resized.save(buffer, format=_PIL_FORMATS[fmt], quality=quality[fmt])
+            variants[variant_name(size, fmt)] = buffer.getvalue()
+    return variants
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_TRANSCODE_WORKERS)
+        return _executor
+
+
+def shutdown_transcoder() -> None:
+    """关闭转码进程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+async def transcode_image(data: bytes) -> Dict[str, bytes]:
+    """
+    在进程池中生成所有尺寸与格式的变体，不阻塞事件循环
+
+    Args:
+        data: 原图字节
+
+    Returns:
+        变体名称到图片字节的映射，环境不支持时为空
+    """
+    formats = list(supported_formats())
+    if not formats:
+        return {}
+    quality = {"webp": settings.IMAGE_WEBP_QUALITY, "avif": settings.IMAGE_AVIF_QUALITY}
+    loop = asyncio.get_running_loop()
+    variants = await loop.run_in_executor(
+        _get_executor(), _transcode, data, settings.IMAGE_VARIANT_SIZES, formats, quality
+    )
+    metrics.incr("image_transcode_total")
+    metrics.incr("image_transcode_bytes_total", len(data), kind="input")
+    metrics.incr("image_transcode_bytes_total", sum(len(v) for v in variants.values()), kind="output")
+    return variants
+
+
+async def store_image_variants(image_key: str, data: bytes) -> List[str]:
+    """
+    转码并存储原图的所有变体
+
+    Args:
+        image_key: 原图的内容键
+        data: 原图字节
+
+    Returns:
+        已存储的变体名称
+    """
+    variants = await transcode_image(data)
+    for name, variant in variants.items():
+        await put_image(f"{image_key}.{name}", variant)
+    if variants:
+        logger.info(f"Stored {len(variants)} variants for cocktail image {image_key}")
+    return list(variants)
+
+
+async def get_image_variant(image_key: str, size: int, fmt: str) -> Optional[StoredImage]:
+    """
+    读取图片变体，不存在时由原图按需生成（兼容转码流程上线前生成的图片）
+
+    Args:
+        image_key: 原图的内容键
+        size: 最长边像素
+        fmt: 图片格式
+
+    Returns:
+        存储的变体，原图不存在或环境不支持转码时返回None
+    """
+    key = variant_key(image_key, size, fmt)
+    image = await get_image(key)
+    if image is not None or fmt not in supported_formats():
+        return image
+
+    async def create() -> Optional[StoredImage]:
+        original = await get_image(image_key)
+        if original is None:
+            return None
+        await store_image_variants(image_key, original.data)
+        return await get_image(key)
+
+    return await _transcode_single_flight.do(key, create)
@@ -0,0 +1,38 @@
+import hashlib
+import math
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from agno.embedder.base import Embedder
+
+
+@dataclass
+class HashingEmbedder(Embedder):
+    """
+    本地确定性 embedder
+
+    把文本的字符 n-gram 哈希到固定维度并归一化，不依赖外部接口，相同文本总是得到相同向量。
+    字面相近的文本余弦相似度高，适合离线测试和没有嵌入接口的开发环境，语义效果不及模型。
+    """
+
+    dimensions: Optional[int] = 1024
+    ngram_range: Tuple[int, int] = (1, 3)
+
+    def get_embedding(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        text = " ".join(text.lower().split())
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(text) - n + 1):
+                digest = hashlib.blake2b(text[i : i + n].encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "big")
+                # 最低位决定符号，减少哈希冲突带来的偏差
+                vector[(value >> 1) % self.dimensions] += 1.0 if value & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm == 0:
+            return vector
+        return [v / norm for v in vector]
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        return self.get_embedding(text), None
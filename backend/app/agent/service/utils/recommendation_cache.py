@@ -0,0 +1,253 @@
+import hashlib
+import json
+import re
+import unicodedata
+import uuid
+
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from agno.models.message import Message
+from agno.run.response import RunResponse
+from backend.app.agent.schema.agent_request_schema import AlcoholLevel, BartenderRequest, DifficultyLevel
+from backend.app.agent.schema.cocktail_schema import CocktailRecommendation
+from backend.app.agent.service.agents.offloaded_agent import OffloadedAgent
+from backend.common.log import logger
+from backend.common.metrics import metrics
+from backend.core.conf import settings
+from backend.database.redis import redis_client
+from backend.utils.single_flight import SingleFlight
+
+# Redis key 前缀
+RECOMMENDATION_CACHE_PREFIX = "bartender_cache"
+RECOMMENDATION_CACHE_OPT_OUT_KEY = f"{RECOMMENDATION_CACHE_PREFIX}:opt_out"
+
+_WHITESPACE = re.compile(r"\s+")
+
+# 相同问卷的并发请求只运行一次 agent
+_recommendation_single_flight = SingleFlight(lock_prefix=f"{RECOMMENDATION_CACHE_PREFIX}_lock")
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化用户输入，全角半角、大小写和多余空白不影响推荐
+
+    Args:
+        text: 用户输入
+
+    Returns:
+        规范化后的文本
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip().lower()
+
+
+def _canonical_options(body: BartenderRequest) -> Dict[str, Any]:
+    return {
+        "model": body.model.value,
+        "alcohol_level": (body.alcohol_level or AlcoholLevel.ANY).value,
+        "has_tools": body.has_tools,
+        "difficulty_level": (body.difficulty_level or DifficultyLevel.ANY).value,
+        "base_spirits": sorted({normalize_text(spirit) for spirit in body.base_spirits or [] if spirit.strip()}),
+    }
+
+
+def _digest(data: Dict[str, Any]) -> str:
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+def recommendation_options_hash(body: BartenderRequest) -> str:
+    """
+    由规范化后的结构化选项（不含用户需求）生成摘要
+
+    Args:
+        body: 调酒师请求
+
+    Returns:
+        选项摘要
+    """
+    return _digest(_canonical_options(body))
+
+
+def recommendation_cache_key(agent_name: str, body: BartenderRequest) -> str:
+    """
+    由规范化后的问卷生成缓存键
+
+    Args:
+        agent_name: agent 名称
+        body: 调酒师请求
+
+    Returns:
+        缓存键
+    """
+    digest = _digest({"agent": agent_name, "message": normalize_text(body.message), **_canonical_options(body)})
+    return f"{RECOMMENDATION_CACHE_PREFIX}:{agent_name}:{digest}"
+
+
+def _opt_out_member(user_id: int | str) -> str:
+    # 请求体中的用户ID是字符串，与 int 类型的接口参数统一成同一个成员，"007" 与 7 视为同一用户
+    try:
+        return str(int(user_id))
+    except ValueError:
+        return str(user_id)
+
+
+async def is_recommendation_cache_enabled(user_id: Optional[int | str]) -> bool:
+    """
+    用户是否使用推荐缓存
+
+    Args:
+        user_id: 用户ID
+
+    Returns:
+        全局开启且用户没有选择退出时为 True
+    """
+    if not settings.BARTENDER_CACHE_ENABLED:
+        return False
+    if user_id is None:
+        return True
+    return not await redis_client.sismember(RECOMMENDATION_CACHE_OPT_OUT_KEY, _opt_out_member(user_id))
+
+
+async def set_recommendation_cache_opt_out(user_id: int, opted_out: bool) -> None:
+    """
+    设置用户是否退出推荐缓存
+
+    Args:
+        user_id: 用户ID
+        opted_out: 是否退出
+    """
+    if opted_out:
+        await redis_client.sadd(RECOMMENDATION_CACHE_OPT_OUT_KEY, _opt_out_member(user_id))
+    else:
+        await redis_client.srem(RECOMMENDATION_CACHE_OPT_OUT_KEY, _opt_out_member(user_id))
+
+
+async def get_cached_recommendation(key: str) -> Optional[CocktailRecommendation]:
+    """
+    读取缓存的推荐
+
+    Args:
+        key: 缓存键
+
+    Returns:
+        鸡尾酒推荐，未命中返回None
+    """
+    data = await redis_client.get(key)
+    if not data:
+        return None
+    try:
+        return CocktailRecommendation.model_validate_json(data)
+    except ValueError:
+        # 推荐结构变更后旧缓存不再可用
+        logger.warning(f"Drop incompatible cached recommendation {key}")
+        await redis_client.delete(key)
+        return None
+
+
+async def lookup_recommendation(key: str, agent_name: str) -> Optional[CocktailRecommendation]:
+    """
+    读取缓存的推荐并记录命中指标
+
+    流式接口逐字段输出，无法与其他请求合并，未命中时由调用方直接运行 agent，结束后写入缓存。
+
+    Args:
+        key: 缓存键
+        agent_name: agent 名称，用于指标
+
+    Returns:
+        鸡尾酒推荐，未命中返回None
+    """
+    cocktail = await get_cached_recommendation(key)
+    metrics.incr("bartender_cache_requests_total", agent=agent_name, result="miss" if cocktail is None else "hit")
+    return cocktail
+
+
+async def cache_recommendation(key: str, cocktail: CocktailRecommendation) -> None:
+    """
+    写入推荐缓存
+
+    Args:
+        key: 缓存键
+        cocktail: 鸡尾酒推荐
+    """
+    await redis_client.setex(key, settings.BARTENDER_CACHE_EXPIRE_SECONDS, cocktail.model_dump_json())
+
+
+async def get_or_create_recommendation(
+    key: str, agent_name: str, create: Callable[[], Awaitable[Any]]
+) -> Tuple[Any, bool]:
+    """
+    读取缓存的推荐，未命中时运行 agent 并写入缓存
+
+    相同键的并发请求（包括其他进程中的）只有一个运行 agent，其余等待其结果。
+
+    Args:
+        key: 缓存键
+        agent_name: agent 名称，用于指标
+        create: 运行 agent 得到推荐的函数
+
+    Returns:
+        (推荐, 是否来自缓存)；由其他请求运行得到的结果也视为来自缓存
+    """
+    cocktail = await get_cached_recommendation(key)
+    if cocktail is not None:
+        metrics.incr("bartender_cache_requests_total", agent=agent_name, result="hit")
+        return cocktail, True
+
+    created = False
+
+    async def run() -> Any:
+        nonlocal created
+        created = True
+        result = await create()
+        # agent 输出未能解析为推荐时不缓存
+        if isinstance(result, CocktailRecommendation):
+            await cache_recommendation(key, result)
+        return result
+
+    result = await _recommendation_single_flight.do(
+        key,
+        run,
+        check=lambda: get_cached_recommendation(key),
+        lock_seconds=settings.BARTENDER_CACHE_LOCK_SECONDS,
+        wait_seconds=settings.BARTENDER_CACHE_LOCK_SECONDS,
+    )
+    metrics.incr("bartender_cache_requests_total", agent=agent_name, result="miss" if created else "coalesced")
+    return result, not created
+
+
+async def _write_cached_run(agent: OffloadedAgent, message: str, cocktail: CocktailRecommendation) -> None:
+    session_id, user_id = agent.session_id, agent.user_id
+    await agent.aread_from_storage(session_id=session_id, user_id=user_id)
+    run = RunResponse(
+        run_id=str(uuid.uuid4()),
+        session_id=session_id,
+        agent_id=agent.agent_id,
+        content=cocktail,
+        content_type=CocktailRecommendation.__name__,
+        model=agent.model.id if agent.model else None,
+        messages=[
+            Message(role="user", content=message),
+            Message(role="assistant", content=cocktail.model_dump_json()),
+        ],
+    )
+    agent.memory.add_run(session_id=session_id, run=run)
+    await agent.awrite_to_storage(session_id=session_id, user_id=user_id)
+
+
+async def record_cached_run(agent: OffloadedAgent, message: str, cocktail: CocktailRecommendation) -> None:
+    """
+    把缓存命中的推荐写入用户的会话历史，后续追问时 agent 能看到这次推荐
+
+    Args:
+        agent: 当前会话的 agent
+        message: 用户提示
+        cocktail: 缓存的推荐
+    """
+    if agent.session_id is None:
+        return
+    try:
+        await _write_cached_run(agent, message, cocktail)
+    except Exception as e:
+        logger.error(f"Failed to record cached recommendation for session {agent.session_id}: {str(e)}")
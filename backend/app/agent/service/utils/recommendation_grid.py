@@ -0,0 +1,289 @@
+import asyncio
+import itertools
+import json
+import time
+
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple
+
+from agno.agent import Agent
+from backend.app.agent.schema.agent_request_schema import AgentType, AlcoholLevel, BartenderRequest, DifficultyLevel
+from backend.app.agent.schema.cocktail_schema import CocktailRecommendation
+from backend.app.agent.service.agents.classic_bartender_agent import get_classic_bartender
+from backend.app.agent.service.agents.creative_bartender_agent import get_creative_bartender
+from backend.app.agent.service.utils.recommendation_cache import normalize_text
+from backend.common.log import logger
+from backend.common.metrics import metrics
+from backend.core.conf import settings
+from backend.database.redis import redis_client
+
+# Redis key 前缀
+RECOMMENDATION_GRID_PREFIX = "bartender_grid"
+_REFRESH_LOCK_PREFIX = f"{RECOMMENDATION_GRID_PREFIX}_refresh"
+
+# 问卷中可选的基酒，与前端选项一致；不选或全选视为任意
+GRID_BASE_SPIRITS = ("gin", "rum", "vodka", "whiskey", "tequila", "brandy")
+_ANY_SPIRIT = "any"
+_ALL_SPIRITS = "all"
+
+_BARTENDER_FACTORIES: Dict[str, Callable[..., Agent]] = {
+    AgentType.CLASSIC_BARTENDER.value: get_classic_bartender,
+    AgentType.CREATIVE_BARTENDER.value: get_creative_bartender,
+}
+
+# 后台刷新任务，保留引用防止被回收
+_refresh_tasks: Set[asyncio.Task] = set()
+
+
+@dataclass(frozen=True)
+class MoodBucket:
+    """心情分类：用户需求命中关键词时归入该分类，预生成时使用 prompt 作为用户需求"""
+
+    name: str
+    prompt: str
+    keywords: Tuple[str, ...]
+
+
+MOOD_BUCKETS: Tuple[MoodBucket, ...] = (
+    MoodBucket("happy", "今天心情很好，想喝点开心的", ("开心", "高兴", "快乐", "愉快", "心情好", "心情很好", "happy")),
+    MoodBucket(
+        "sad",
+        "有点难过，想要一杯安慰自己的酒",
+        ("难过", "伤心", "悲伤", "失落", "沮丧", "不开心", "不高兴", "心情不好", "心情差", "sad", "down"),
+    ),
+    MoodBucket("stressed", "压力很大，想放松一下", ("压力", "焦虑", "紧张", "烦躁", "放松", "stressed")),
+    MoodBucket("tired", "很累，想提提神", ("累", "疲惫", "疲倦", "困", "提神", "tired")),
+    MoodBucket("romantic", "约会，想要浪漫的氛围", ("浪漫", "约会", "恋爱", "romantic", "date")),
+    MoodBucket("celebrate", "想庆祝一下", ("庆祝", "派对", "聚会", "生日", "celebrate", "party")),
+    MoodBucket("calm", "想一个人安静地待一会儿", ("平静", "安静", "独处", "放空", "calm")),
+)
+
+# 长关键词优先匹配，避免“不开心”被当作“开心”
+_MOOD_KEYWORDS = sorted(
+    ((keyword, bucket) for bucket in MOOD_BUCKETS for keyword in bucket.keywords), key=lambda item: -len(item[0])
+)
+
+
+@dataclass(frozen=True)
+class GridCell:
+    """问卷选项空间中的一个格子"""
+
+    agent_name: str
+    model: str
+    mood: MoodBucket
+    alcohol_level: AlcoholLevel
+    difficulty_level: DifficultyLevel
+    has_tools: bool
+    base_spirit: str
+
+    @property
+    def key(self) -> str:
+        tools = "tools" if self.has_tools else "no_tools"
+        return (
+            f"{RECOMMENDATION_GRID_PREFIX}:{self.agent_name}:{self.model}:{self.mood.name}:"
+            f"{self.alcohol_level.value}:{self.difficulty_level.value}:{tools}:{self.base_spirit}"
+        )
+
+    def to_request(self) -> BartenderRequest:
+        """
+        生成该格子对应的调酒师请求
+
+        Returns:
+            调酒师请求
+        """
+        return BartenderRequest(
+            message=self.mood.prompt,
+            model=self.model,
+            alcohol_level=self.alcohol_level,
+            has_tools=self.has_tools,
+            difficulty_level=self.difficulty_level,
+            base_spirits=None if self.base_spirit == _ANY_SPIRIT else [self.base_spirit],
+        )
+
+
+def match_mood_bucket(message: str) -> Optional[MoodBucket]:
+    """
+    把用户需求归入心情分类
+
+    只处理较短的需求，且必须只命中一个分类；带有更具体要求的需求交给 agent 处理。
+
+    Args:
+        message: 用户需求
+
+    Returns:
+        心情分类，无法确定时返回None
+    """
+    text = normalize_text(message)
+    if not text or len(text) > settings.BARTENDER_GRID_MAX_MESSAGE_CHARS:
+        return None
+    matched = set()
+    for keyword, bucket in _MOOD_KEYWORDS:
+        if keyword in text:
+            matched.add(bucket)
+            # 已匹配的部分不再参与更短关键词的匹配
+            text = text.replace(keyword, "\0")
+    return matched.pop() if len(matched) == 1 else None
+
+
+def _grid_base_spirit(base_spirits: Optional[list]) -> Optional[str]:
+    spirits = {normalize_text(spirit) for spirit in base_spirits or [] if spirit.strip()} - {_ALL_SPIRITS}
+    if not spirits or spirits == set(GRID_BASE_SPIRITS):
+        return _ANY_SPIRIT
+    if len(spirits) == 1 and spirits <= set(GRID_BASE_SPIRITS):
+        return spirits.pop()
+    return None
+
+
+def grid_cell_for_request(agent_name: str, body: BartenderRequest) -> Optional[GridCell]:
+    """
+    找到请求对应的格子
+
+    Args:
+        agent_name: agent 名称
+        body: 调酒师请求
+
+    Returns:
+        格子，请求不在预生成的选项空间内时返回None
+    """
+    if agent_name not in _BARTENDER_FACTORIES or body.model.value != settings.BARTENDER_GRID_MODEL:
+        return None
+    if body.has_tools is None:
+        return None
+    base_spirit = _grid_base_spirit(body.base_spirits)
+    mood = match_mood_bucket(body.message)
+    if base_spirit is None or mood is None:
+        return None
+    return GridCell(
+        agent_name=agent_name,
+        model=settings.BARTENDER_GRID_MODEL,
+        mood=mood,
+        alcohol_level=body.alcohol_level or AlcoholLevel.ANY,
+        difficulty_level=body.difficulty_level or DifficultyLevel.ANY,
+        has_tools=body.has_tools,
+        base_spirit=base_spirit,
+    )
+
+
+def iter_grid_cells(agent_name: str) -> Iterator[GridCell]:
+    """
+    遍历 agent 的全部格子
+
+    Args:
+        agent_name: agent 名称
+
+    Yields:
+        格子
+    """
+    for mood, alcohol_level, difficulty_level, has_tools, base_spirit in itertools.product(
+        MOOD_BUCKETS, AlcoholLevel, DifficultyLevel, (True, False), (_ANY_SPIRIT, *GRID_BASE_SPIRITS)
+    ):
+        yield GridCell(
+            agent_name=agent_name,
+            model=settings.BARTENDER_GRID_MODEL,
+            mood=mood,
+            alcohol_level=alcohol_level,
+            difficulty_level=difficulty_level,
+            has_tools=has_tools,
+            base_spirit=base_spirit,
+        )
+
+
+async def get_grid_entry(cell: GridCell) -> Optional[Tuple[CocktailRecommendation, float]]:
+    """
+    读取格子中预生成的推荐
+
+    Args:
+        cell: 格子
+
+    Returns:
+        (鸡尾酒推荐, 生成时间戳)，不存在或结构不兼容时返回None
+    """
+    data = await redis_client.get(cell.key)
+    if not data:
+        return None
+    try:
+        entry = json.loads(data)
+        return CocktailRecommendation.model_validate(entry["recommendation"]), float(entry["generated_at"])
+    except (ValueError, KeyError, TypeError):
+        logger.warning(f"Drop incompatible grid entry {cell.key}")
+        await redis_client.delete(cell.key)
+        return None
+
+
+async def generate_grid_cell(cell: GridCell) -> CocktailRecommendation:
+    """
+    运行 agent 生成格子的推荐并写入
+
+    Args:
+        cell: 格子
+
+    Returns:
+        鸡尾酒推荐
+
+    Raises:
+        ValueError: agent 输出无法解析为推荐
+    """
+    agent = _BARTENDER_FACTORIES[cell.agent_name](model_id=cell.model, debug_mode=False)
+    # 预生成与具体用户无关，不写入会话历史和用户记忆
+    agent.storage = None
+    agent.enable_user_memories = False
+    response = await agent.arun(cell.to_request().get_user_prompt(), stream=False)
+    if not isinstance(response.content, CocktailRecommendation):
+        raise ValueError(f"agent output is not a recommendation: {cell.key}")
+    entry = {"recommendation": response.content.model_dump(mode="json"), "generated_at": time.time()}
+    await redis_client.set(cell.key, json.dumps(entry, ensure_ascii=False))
+    return response.content
+
+
+async def _refresh_grid_cell(cell: GridCell) -> None:
+    lock_key = f"{_REFRESH_LOCK_PREFIX}:{cell.key}"
+    # 多个请求或进程同时发现过期时只刷新一次
+    if not await redis_client.set(lock_key, "1", ex=settings.BARTENDER_GRID_REFRESH_LOCK_SECONDS, nx=True):
+        return
+    try:
+        await generate_grid_cell(cell)
+        metrics.incr("bartender_grid_refresh_total", agent=cell.agent_name, result="success")
+    except Exception as e:
+        logger.error(f"Failed to refresh grid entry {cell.key}: {str(e)}")
+        metrics.incr("bartender_grid_refresh_total", agent=cell.agent_name, result="error")
+        # 失败后允许下一次请求重试
+        await redis_client.delete(lock_key)
+
+
+async def find_grid_recommendation(agent_name: str, body: BartenderRequest) -> Optional[CocktailRecommendation]:
+    """
+    从预生成的推荐网格中查找推荐
+
+    过期的推荐照常返回，同时在后台重新生成（stale-while-revalidate）。
+
+    Args:
+        agent_name: agent 名称
+        body: 调酒师请求
+
+    Returns:
+        鸡尾酒推荐，请求不在网格内或格子尚未生成时返回None
+    """
+    if not settings.BARTENDER_GRID_ENABLED:
+        return None
+    cell = grid_cell_for_request(agent_name, body)
+    if cell is None:
+        return None
+    try:
+        entry = await get_grid_entry(cell)
+    except Exception as e:
+        logger.error(f"Grid lookup failed for {cell.key}: {str(e)}")
+        return None
+    if entry is None:
+        metrics.incr("bartender_grid_requests_total", agent=agent_name, result="miss")
+        return None
+
+    cocktail, generated_at = entry
+    if time.time() - generated_at < settings.BARTENDER_GRID_STALE_SECONDS:
+        metrics.incr("bartender_grid_requests_total", agent=agent_name, result="hit")
+        return cocktail
+    metrics.incr("bartender_grid_requests_total", agent=agent_name, result="stale")
+    if settings.BARTENDER_GRID_REFRESH:
+        task = asyncio.create_task(_refresh_grid_cell(cell))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+    return cocktail
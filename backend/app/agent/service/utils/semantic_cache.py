@@ -0,0 +1,175 @@
+import asyncio
+
+from datetime import timedelta
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from agno.embedder.base import Embedder
+from agno.embedder.openai import OpenAIEmbedder
+from backend.app.agent.model import BartenderSemanticCache
+from backend.app.agent.schema.agent_request_schema import BartenderRequest
+from backend.app.agent.schema.cocktail_schema import CocktailRecommendation
+from backend.app.agent.service.utils.local_embedder import HashingEmbedder
+from backend.app.agent.service.utils.recommendation_cache import recommendation_options_hash
+from backend.common.log import logger
+from backend.common.metrics import metrics
+from backend.core.conf import settings
+from backend.database.db import async_db_session
+from backend.utils.http_client import Upstream, http_clients
+from backend.utils.timezone import timezone
+from openai import OpenAI
+from sqlalchemy import Select, delete, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@lru_cache
+def get_semantic_cache_embedder() -> Embedder:
+    """
+    获取语义缓存使用的 embedder
+
+    Returns:
+        嵌入接口 embedder，配置为 local 时返回本地确定性 embedder
+    """
+    if settings.BARTENDER_SEMANTIC_CACHE_EMBEDDER == "local":
+        return HashingEmbedder(dimensions=settings.BARTENDER_SEMANTIC_CACHE_DIMENSIONS)
+    return OpenAIEmbedder(
+        id=settings.SILICONFLOW_MODEL_NAME,
+        dimensions=settings.BARTENDER_SEMANTIC_CACHE_DIMENSIONS,
+        openai_client=OpenAI(
+            api_key=settings.SILICONFLOW_API_KEY,
+            base_url=settings.SILICONFLOW_BASE_URL,
+            http_client=http_clients.get_sync(Upstream.EMBEDDING),
+        ),
+    )
+
+
+async def set_vector_search_options(db: AsyncSession) -> None:
+    """
+    设置本事务内 HNSW 检索的参数
+
+    开启 pgvector 0.8 的迭代扫描：HNSW 先取 ef_search 个近邻再按 agent 和选项过滤，不足时继续扫描索引，
+    分区外的近邻占满候选时也能找到分区内的条目；strict_order 保证结果仍按距离排序。
+
+    Args:
+        db: 数据库会话，需在事务中
+    """
+    await db.execute(text(f"SET LOCAL hnsw.ef_search = {int(settings.BARTENDER_SEMANTIC_CACHE_EF_SEARCH)}"))
+    await db.execute(text("SET LOCAL hnsw.iterative_scan = strict_order"))
+    await db.execute(text(f"SET LOCAL hnsw.max_scan_tuples = {int(settings.BARTENDER_SEMANTIC_CACHE_MAX_SCAN_TUPLES)}"))
+
+
+def nearest_entry_query(agent_name: str, options_hash: str, embedding: List[float]) -> Select:
+    """
+    在 agent 和选项都相同、未过期的条目中查找与向量最相近的一条
+
+    按余弦距离排序走 HNSW 索引，需先调用 set_vector_search_options。
+
+    Args:
+        agent_name: agent 名称
+        options_hash: 结构化选项摘要
+        embedding: 用户提示的向量
+
+    Returns:
+        查询 id、推荐和余弦距离的语句
+    """
+    table = BartenderSemanticCache
+    distance = table.embedding.cosine_distance(embedding)
+    expired = timezone.now() - timedelta(seconds=settings.BARTENDER_SEMANTIC_CACHE_EXPIRE_SECONDS)
+    return (
+        select(table.id, table.recommendation, distance.label("distance"))
+        .where(table.agent == agent_name, table.options_hash == options_hash, table.created_time >= expired)
+        .order_by(distance)
+        .limit(1)
+    )
+
+
+async def find_similar_recommendation(
+    agent_name: str, body: BartenderRequest, prompt: str
+) -> Tuple[Optional[CocktailRecommendation], Optional[List[float]]]:
+    """
+    查找结构化选项相同、用户提示语义相近的缓存推荐
+
+    检索或嵌入失败时视为未命中，不影响正常推荐。
+
+    Args:
+        agent_name: agent 名称
+        body: 调酒师请求
+        prompt: 组装后的用户提示
+
+    Returns:
+        (鸡尾酒推荐, 用户提示的向量)；未命中时推荐为None，向量可在运行 agent 后写入缓存
+    """
+    if not settings.BARTENDER_SEMANTIC_CACHE_ENABLED:
+        return None, None
+
+    embedding = None
+    try:
+        embedding = await asyncio.to_thread(get_semantic_cache_embedder().get_embedding, prompt)
+        if not embedding:
+            # 嵌入接口出错时返回空向量
+            metrics.incr("bartender_semantic_cache_requests_total", agent=agent_name, result="error")
+            return None, None
+
+        table = BartenderSemanticCache
+        async with async_db_session.begin() as db:
+            await set_vector_search_options(db)
+            row = (
+                await db.execute(nearest_entry_query(agent_name, recommendation_options_hash(body), embedding))
+            ).first()
+            similarity = None if row is None else 1 - row.distance
+            if similarity is not None:
+                metrics.observe("bartender_semantic_cache_similarity", similarity, agent=agent_name)
+            if similarity is None or similarity < settings.BARTENDER_SEMANTIC_CACHE_THRESHOLD:
+                metrics.incr("bartender_semantic_cache_requests_total", agent=agent_name, result="miss")
+                return None, embedding
+            await db.execute(
+                update(table).where(table.id == row.id).values(hits=table.hits + 1, last_hit_time=timezone.now())
+            )
+        cocktail = CocktailRecommendation.model_validate(row.recommendation)
+    except Exception as e:
+        logger.error(f"Semantic cache lookup failed for agent {agent_name}: {str(e)}")
+        metrics.incr("bartender_semantic_cache_requests_total", agent=agent_name, result="error")
+        return None, embedding
+
+    metrics.incr("bartender_semantic_cache_requests_total", agent=agent_name, result="hit")
+    return cocktail, embedding
+
+
+async def store_similar_recommendation(
+    agent_name: str, body: BartenderRequest, prompt: str, embedding: List[float], cocktail: CocktailRecommendation
+) -> None:
+    """
+    写入语义缓存，并淘汰过期和超出数量上限的条目
+
+    Args:
+        agent_name: agent 名称
+        body: 调酒师请求
+        prompt: 组装后的用户提示
+        embedding: 用户提示的向量
+        cocktail: 鸡尾酒推荐
+    """
+    table = BartenderSemanticCache
+    expired = timezone.now() - timedelta(seconds=settings.BARTENDER_SEMANTIC_CACHE_EXPIRE_SECONDS)
+    try:
+        async with async_db_session.begin() as db:
+            db.add(
+                table(
+                    agent=agent_name,
+                    options_hash=recommendation_options_hash(body),
+                    prompt=prompt,
+                    embedding=embedding,
+                    recommendation=cocktail.model_dump(mode="json"),
+                )
+            )
+            await db.flush()
+            await db.execute(delete(table).where(table.agent == agent_name, table.created_time < expired))
+            # 超出上限时淘汰最久未命中的条目
+            evicted = (
+                select(table.id)
+                .where(table.agent == agent_name)
+                .order_by(table.last_hit_time.desc())
+                .offset(settings.BARTENDER_SEMANTIC_CACHE_MAX_ENTRIES)
+            )
+            await db.execute(delete(table).where(table.id.in_(evicted)))
+    except Exception as e:
+        logger.error(f"Failed to store semantic cache entry for agent {agent_name}: {str(e)}")
@@ -0,0 +1,378 @@
+import asyncio
+import time
+import uuid
+
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+import msgspec
+
+from agno.run.response import RunResponse
+from agno.storage.agent.postgres import PostgresAgentStorage
+from agno.storage.session.agent import AgentSession
+from backend.app.agent.schema.agent_request_schema import AgentType
+from backend.app.agent.service.utils.agent_io import agent_io
+from backend.app.agent.service.utils.history_window import decode_history_runs, encode_history_run
+from backend.common.log import logger
+from backend.common.metrics import metrics
+from backend.core.conf import settings
+from backend.database.redis import redis_client
+from redis.exceptions import WatchError
+from sqlalchemy.dialects import postgresql
+
+# Redis key 前缀
+AGENT_SESSION_PREFIX = "agent_session"
+AGENT_HISTORY_PREFIX = "agent_history"
+_RUNS_PREFIX = f"{AGENT_SESSION_PREFIX}_runs"
+_DIRTY_PREFIX = f"{AGENT_SESSION_PREFIX}_dirty"
+_FLUSH_LOCK_PREFIX = f"{AGENT_SESSION_PREFIX}_flush"
+
+SessionDurability = Literal["sync", "write_behind"]
+
+# 只移除写入 Postgres 期间没有再次更新的会话，分数即写入 Redis 的时间
+_REMOVE_FLUSHED_SCRIPT = """
+local removed = 0
+for i = 1, #ARGV, 2 do
+    if tonumber(redis.call("zscore", KEYS[1], ARGV[i])) == tonumber(ARGV[i + 1]) then
+        removed = removed + redis.call("zrem", KEYS[1], ARGV[i])
+    end
+end
+return removed
+"""
+
+# 仅当锁仍归属自己时才删除
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+_SESSION_COLUMNS = ("agent_id", "team_session_id", "user_id", "memory", "agent_data", "session_data", "extra_data")
+
+
+def _split_session(session: AgentSession) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    # 会话行拆为不含运行记录的元数据和运行记录列表
+    data = session.to_dict()
+    memory = dict(data.get("memory") or {})
+    runs = memory.pop("runs", None) or []
+    data["memory"] = memory
+    return data, runs
+
+
+def _owned_by(owner: Optional[str], user_id: Optional[str]) -> bool:
+    # 与 PostgresAgentStorage.read 一致：指定用户ID时只返回该用户的会话
+    return not user_id or owner == user_id
+
+
+def _join_session(meta: Any, runs: List[Any]) -> Optional[AgentSession]:
+    data = msgspec.json.decode(meta)
+    data["memory"] = {**(data.get("memory") or {}), "runs": [msgspec.json.decode(run) for run in runs]}
+    return AgentSession.from_dict(data)
+
+
+class WriteBehindAgentStorage(PostgresAgentStorage):
+    """
+    带 Redis 缓存的会话存储
+
+    最近的会话缓存在 Redis 中，拆为三部分：不含运行记录的元数据、完整的运行记录列表，
+    以及只保留最近 AGENT_HISTORY_WINDOW_RUNS 次运行、只含历史消息的历史窗口。
+    agent 读取元数据和历史窗口即可拼接历史，写入时只追加新的运行，不需要读写整个会话。
+
+    写入按 agent 类型的持久性配置处理：
+
+    - sync：同步写入 Postgres 后返回，同时更新 Redis
+    - write_behind：只写入 Redis 并标记为待写入，由 SessionWriteBehind 定期批量写入 Postgres；
+      同一会话在两次写入之间的多次更新只写一次，Redis 数据丢失时最多丢失一个刷新周期内的更新，
+      Redis 需配置为不淘汰数据（noeviction）
+
+    Redis 中的会话过期后再追加运行时，先从 Postgres 恢复完整的运行记录，避免只含新运行的列表被写回 Postgres。
+
+    异步读写由 OffloadedAgent 调用；同步的 read / upsert 保持 PostgresAgentStorage 的行为。
+    Redis 中的会话按 session_id 存放，读取时与 read 一致地校验用户ID，属于其他用户的会话视为不在缓存中。
+    """
+
+    def __init__(self, agent_type: AgentType, **kwargs):
+        super().__init__(**kwargs)
+        self.agent_type = agent_type
+        self._dirty_key = f"{_DIRTY_PREFIX}:{self.table_name}"
+        session_write_behind.register(self)
+
+    @property
+    def durability(self) -> SessionDurability:
+        return settings.AGENT_SESSION_DURABILITY.get(self.agent_type.value, "sync")
+
+    def _keys(self, session_id: str) -> Tuple[str, str, str]:
+        base = f"{self.table_name}:{session_id}"
+        return f"{AGENT_SESSION_PREFIX}:{base}", f"{_RUNS_PREFIX}:{base}", f"{AGENT_HISTORY_PREFIX}:{base}"
+
+    def _queue_cache(self, pipe, meta: Dict[str, Any], runs: List[Dict[str, Any]], replace: bool, dirty: bool) -> None:
+        meta_key, runs_key, history_key = self._keys(meta["session_id"])
+        expire = settings.AGENT_SESSION_CACHE_EXPIRE_SECONDS
+        window = settings.AGENT_HISTORY_WINDOW_RUNS
+        pipe.set(meta_key, msgspec.json.encode(meta), ex=expire)
+        if replace:
+            pipe.delete(runs_key, history_key)
+        if runs:
+            pipe.rpush(runs_key, *(msgspec.json.encode(run) for run in runs))
+            pipe.rpush(history_key, *(encode_history_run(run) for run in runs[-window:]))
+            pipe.ltrim(history_key, -window, -1)
+        pipe.expire(runs_key, expire)
+        pipe.expire(history_key, expire)
+        if dirty:
+            # 已在队列中的会话只更新分数，多次更新合并为一次写入
+            pipe.zadd(self._dirty_key, {meta["session_id"]: time.time()})
+
+    async def _cache(self, meta: Dict[str, Any], runs: List[Dict[str, Any]], replace: bool, dirty: bool) -> None:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            self._queue_cache(pipe, meta, runs, replace=replace, dirty=dirty)
+            await pipe.execute()
+
+    async def _cache_if(
+        self, cached: bool, meta: Dict[str, Any], runs: List[Dict[str, Any]], replace: bool, dirty: bool
+    ) -> bool:
+        # 仅当 Redis 中是否已有该会话与 cached 一致时写入；检查与写入在同一事务中，期间会话被修改则放弃
+        meta_key, _, _ = self._keys(meta["session_id"])
+        async with redis_client.pipeline(transaction=True) as pipe:
+            await pipe.watch(meta_key)
+            if bool(await pipe.exists(meta_key)) != cached:
+                return False
+            pipe.multi()
+            self._queue_cache(pipe, meta, runs, replace=replace, dirty=dirty)
+            try:
+                await pipe.execute()
+            except WatchError:
+                return False
+        return True
+
+    async def aread(self, session_id: str, user_id: Optional[str] = None) -> Optional[AgentSession]:
+        """
+        读取完整会话，Redis 中没有时从 Postgres 读取并写入 Redis
+
+        Args:
+            session_id: 会话ID
+            user_id: 用户ID
+
+        Returns:
+            会话，不存在或属于其他用户时返回None
+        """
+        meta_key, runs_key, _ = self._keys(session_id)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.get(meta_key)
+            pipe.lrange(runs_key, 0, -1)
+            meta, runs = await pipe.execute()
+        if meta:
+            session = _join_session(meta, runs)
+            if _owned_by(session.user_id, user_id):
+                metrics.incr("agent_session_reads_total", agent=self.agent_type.value, source="redis")
+                return session
+        metrics.incr("agent_session_reads_total", agent=self.agent_type.value, source="postgres")
+        # 按用户ID从 Postgres 读取
+        session = await agent_io.run(self.read, session_id=session_id, user_id=user_id)
+        if session is not None:
+            # 读取 Postgres 期间已有新的写入时保留 Redis 中较新的会话
+            await self._cache_if(False, *_split_session(session), replace=True, dirty=False)
+        return session
+
+    async def aread_window(
+        self, session_id: str, user_id: Optional[str] = None
+    ) -> Optional[Tuple[AgentSession, List[RunResponse]]]:
+        """
+        从 Redis 读取会话元数据和历史窗口
+
+        Args:
+            session_id: 会话ID
+            user_id: 用户ID
+
+        Returns:
+            (不含运行记录的会话, 最近几次运行)，Redis 中没有该会话或会话属于其他用户时返回None
+        """
+        meta_key, _, history_key = self._keys(session_id)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.get(meta_key)
+            pipe.lrange(history_key, 0, -1)
+            meta, history = await pipe.execute()
+        if not meta:
+            return None
+        data = msgspec.json.decode(meta)
+        if not _owned_by(data.get("user_id"), user_id):
+            return None
+        metrics.incr("agent_session_reads_total", agent=self.agent_type.value, source="window")
+        return AgentSession.from_dict(data), decode_history_runs(history, session_id)
+
+    async def aupsert(self, session: AgentSession) -> AgentSession:
+        """
+        按持久性配置写入完整会话，替换已有的运行记录
+
+        Args:
+            session: 会话
+
+        Returns:
+            写入的会话
+        """
+        if self.durability == "sync":
+            session = await agent_io.run(self.upsert, session) or session
+            await self._cache(*_split_session(session), replace=True, dirty=False)
+        else:
+            session.updated_at = int(time.time())
+            await self._cache(*_split_session(session), replace=True, dirty=True)
+        metrics.incr("agent_session_writes_total", agent=self.agent_type.value, mode=self.durability)
+        return session
+
+    async def aappend(self, session: AgentSession, runs: List[RunResponse]) -> AgentSession:
+        """
+        按持久性配置写入会话元数据并追加新的运行，已有的运行记录不变
+
+        Args:
+            session: 会话，其中的运行记录被忽略
+            runs: 新的运行
+
+        Returns:
+            写入的会话
+        """
+        meta, _ = _split_session(session)
+        new_runs = [run.to_dict() for run in runs]
+        if self.durability == "sync":
+            stored = await agent_io.run(self._append_to_postgres, meta, new_runs)
+            # Postgres 中已是完整的会话，Redis 中没有时直接缓存完整会话
+            if not await self._cache_if(True, meta, new_runs, replace=False, dirty=False):
+                await self._cache_if(False, *_split_session(stored), replace=True, dirty=False)
+        else:
+            meta["updated_at"] = int(time.time())
+            while not await self._cache_if(True, meta, new_runs, replace=False, dirty=True):
+                # Redis 中的会话已过期，从 Postgres 恢复已写入的运行后再追加；恢复期间有其他写入时重新追加
+                stored_runs = await agent_io.run(self._read_postgres_runs, meta["session_id"])
+                if await self._cache_if(False, meta, stored_runs + new_runs, replace=True, dirty=True):
+                    metrics.incr("agent_session_rehydrations_total", agent=self.agent_type.value)
+                    break
+        metrics.incr("agent_session_writes_total", agent=self.agent_type.value, mode=self.durability)
+        return session
+
+    def _read_postgres_runs(self, session_id: str) -> List[Dict[str, Any]]:
+        stored = self.read(session_id=session_id)
+        return (stored.memory or {}).get("runs", []) if stored is not None else []
+
+    def _append_to_postgres(self, meta: Dict[str, Any], runs: List[Dict[str, Any]]) -> AgentSession:
+        stored_runs = self._read_postgres_runs(meta["session_id"])
+        session = AgentSession.from_dict({**meta, "memory": {**meta["memory"], "runs": stored_runs + runs}})
+        return self.upsert(session) or session
+
+    def upsert_many(self, sessions: List[AgentSession]) -> None:
+        """
+        在一个事务中批量写入会话
+
+        Args:
+            sessions: 会话列表
+        """
+        if self.auto_upgrade_schema and not self._schema_up_to_date:
+            self.upgrade_schema()
+        if not self.table_exists():
+            self.create()
+        stmt = postgresql.insert(self.table).values([
+            {"session_id": s.session_id, **{c: getattr(s, c) for c in _SESSION_COLUMNS}} for s in sessions
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["session_id"],
+            set_={**{c: stmt.excluded[c] for c in _SESSION_COLUMNS}, "updated_at": int(time.time())},
+        )
+        with self.Session() as sess, sess.begin():
+            sess.execute(stmt)
+
+    async def flush(self, limit: int) -> int:
+        """
+        把最早标记的一批待写入会话写入 Postgres
+
+        多个 worker 通过锁互斥，避免旧版本晚于新版本写入。
+
+        Args:
+            limit: 单批最多写入的会话数
+
+        Returns:
+            写入的会话数
+        """
+        lock_key = f"{_FLUSH_LOCK_PREFIX}:{self.table_name}"
+        token = uuid.uuid4().hex
+        if not await redis_client.set(lock_key, token, nx=True, ex=settings.AGENT_SESSION_FLUSH_LOCK_SECONDS):
+            return 0
+        try:
+            entries = await redis_client.zrange(self._dirty_key, 0, limit - 1, withscores=True)
+            if not entries:
+                return 0
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for session_id, _ in entries:
+                    meta_key, runs_key, _ = self._keys(session_id)
+                    pipe.get(meta_key)
+                    pipe.lrange(runs_key, 0, -1)
+                values = await pipe.execute()
+            sessions = [_join_session(meta, runs) for meta, runs in zip(values[::2], values[1::2]) if meta]
+            if len(sessions) < len(entries):
+                # 缓存在写入前过期，这些更新已无法恢复
+                logger.warning(f"{len(entries) - len(sessions)} sessions in {self.table_name} expired before flush")
+            if sessions:
+                await agent_io.run(self.upsert_many, sessions)
+            members = [str(item) for session_id, score in entries for item in (session_id, repr(score))]
+            await redis_client.eval(_REMOVE_FLUSHED_SCRIPT, 1, self._dirty_key, *members)
+            metrics.incr("agent_session_flushed_total", len(sessions), agent=self.agent_type.value)
+            return len(sessions)
+        finally:
+            await redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+
+class SessionWriteBehind:
+    """
+    会话批量写入任务
+
+    每 AGENT_SESSION_FLUSH_INTERVAL_SECONDS 把各 WriteBehindAgentStorage 中待写入的会话分批写入 Postgres，
+    关闭时再写入一次。
+    """
+
+    def __init__(self):
+        self._storages: Dict[str, WriteBehindAgentStorage] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, storage: WriteBehindAgentStorage) -> None:
+        self._storages[storage.table_name] = storage
+
+    async def flush(self) -> int:
+        """
+        写入所有待写入的会话
+
+        Returns:
+            写入的会话数
+        """
+        total = 0
+        for storage in list(self._storages.values()):
+            try:
+                while True:
+                    flushed = await storage.flush(settings.AGENT_SESSION_FLUSH_BATCH_SIZE)
+                    total += flushed
+                    if flushed < settings.AGENT_SESSION_FLUSH_BATCH_SIZE:
+                        break
+            except Exception as e:
+                metrics.incr("agent_session_flush_errors_total", agent=storage.agent_type.value)
+                logger.error(f"Failed to flush sessions in {storage.table_name}: {str(e)}")
+        return total
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.AGENT_SESSION_FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+
+    def start(self) -> None:
+        """启动后台写入任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台写入任务并写入剩余的会话"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+
+# 创建会话批量写入任务单例
+session_write_behind: SessionWriteBehind = SessionWriteBehind()
@@ -0,0 +1,121 @@
+"""
+推荐网格预生成任务
+
+为两个调酒师 agent 遍历问卷选项空间和心情分类，逐格生成推荐并写入 Redis，离线运行::
+
+    python -m backend.app.agent.worker.grid_worker [--agent classic_bartender] [--force]
+
+已生成且未过期的格子会被跳过，中断后重新运行即可继续；请求速率受 BARTENDER_GRID_REQUESTS_PER_MINUTE 限制。
+"""
+
+import argparse
+import asyncio
+import time
+
+from typing import List
+
+from backend.app.agent.schema.agent_request_schema import AgentType
+from backend.app.agent.service.utils.recommendation_grid import (
+    GridCell,
+    generate_grid_cell,
+    get_grid_entry,
+    iter_grid_cells,
+)
+from backend.common.log import logger, set_custom_logfile, setup_logging
+from backend.core.conf import settings
+from backend.database.redis import redis_client
+from backend.utils.http_client import http_clients
+
+GRID_AGENTS = (AgentType.CLASSIC_BARTENDER.value, AgentType.CREATIVE_BARTENDER.value)
+
+
+class RateLimiter:
+    """按固定间隔放行请求，多个协程共享"""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class GridWorker:
+    """
+    推荐网格预生成任务
+
+    concurrency 个协程从同一个格子队列中取任务，请求上游前先经过限速器。
+    """
+
+    def __init__(
+        self,
+        agents: List[str],
+        force: bool = False,
+        concurrency: int = settings.BARTENDER_GRID_CONCURRENCY,
+        requests_per_minute: float = settings.BARTENDER_GRID_REQUESTS_PER_MINUTE,
+    ):
+        self.agents = agents
+        self.force = force
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(requests_per_minute)
+        self.generated = self.skipped = self.failed = 0
+
+    async def _is_fresh(self, cell: GridCell) -> bool:
+        entry = await get_grid_entry(cell)
+        return entry is not None and time.time() - entry[1] < settings.BARTENDER_GRID_STALE_SECONDS
+
+    async def _consume(self, queue: asyncio.Queue) -> None:
+        while True:
+            try:
+                cell = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if not self.force and await self._is_fresh(cell):
+                self.skipped += 1
+                continue
+            await self.limiter.acquire()
+            try:
+                await generate_grid_cell(cell)
+                self.generated += 1
+                logger.info(f"Generated grid entry {cell.key}")
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Failed to generate grid entry {cell.key}: {str(e)}")
+
+    async def run(self) -> None:
+        """生成全部格子后退出"""
+        await redis_client.open()
+        http_clients.open()
+        queue: asyncio.Queue = asyncio.Queue()
+        for agent_name in self.agents:
+            for cell in iter_grid_cells(agent_name):
+                queue.put_nowait(cell)
+        logger.info(f"Grid worker started with {queue.qsize()} cells, concurrency {self.concurrency}")
+        try:
+            await asyncio.gather(*(self._consume(queue) for _ in range(self.concurrency)))
+        finally:
+            await http_clients.close()
+            await redis_client.close()
+            logger.info(
+                f"Grid worker finished, generated: {self.generated}, skipped: {self.skipped}, failed: {self.failed}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-generate bartender recommendations for the questionnaire grid")
+    parser.add_argument("--agent", choices=GRID_AGENTS, action="append", help="agent to generate, defaults to both")
+    parser.add_argument("--force", action="store_true", help="regenerate cells that are still fresh")
+    args = parser.parse_args()
+    setup_logging()
+    set_custom_logfile()
+    asyncio.run(GridWorker(args.agent or list(GRID_AGENTS), force=args.force).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+鸡尾酒图片生成 worker
+
+从 Redis 队列中消费图片生成任务，与 API 进程分开部署::
+
+    python -m backend.app.agent.worker.image_worker
+"""
+
+import asyncio
+import signal
+import traceback
+
+from backend.app.agent.schema.image_job_schema import ImageEvent, ImageEventStatus, ImageJob, ImageJobStatus
+from backend.app.agent.service.utils.image_events import publish_image_event
+from backend.app.agent.service.utils.image_generator import get_or_create_shared_image
+from backend.app.agent.service.utils.image_queue import (
+    claim_image_job,
+    complete_image_job,
+    fail_image_job,
+    is_image_job_cancelled,
+    mark_image_job_cancelled,
+    promote_delayed_jobs,
+    renew_image_job_lease,
+    requeue_expired_jobs,
+)
+from backend.app.agent.service.utils.image_store import link_session_image
+from backend.app.agent.service.utils.image_transcoder import shutdown_transcoder
+from backend.common.log import logger, set_custom_logfile, setup_logging
+from backend.common.metrics import metrics
+from backend.core.conf import settings
+from backend.database.redis import redis_binary_client, redis_client
+from backend.utils.http_client import http_clients
+
+
+class ImageJobError(Exception):
+    """图片生成任务执行失败"""
+
+
+class ImageJobCancelled(Exception):
+    """图片生成任务已被取消"""
+
+
+class ImageWorker:
+    """
+    图片生成 worker
+
+    同时运行 concurrency 个消费协程，另有一个维护协程负责把到期的重试任务和租约过期的任务放回队列。
+    """
+
+    def __init__(self, concurrency: int = settings.IMAGE_WORKER_CONCURRENCY, maintenance_interval: float = 1.0):
+        self.concurrency = concurrency
+        self.maintenance_interval = maintenance_interval
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        """请求停止，当前任务处理完后退出"""
+        self._stopping.set()
+
+    @staticmethod
+    async def _heartbeat(job: ImageJob) -> None:
+        # 处理期间定期续期租约，耗时超过租约时间的任务不会被其他 worker 重复处理
+        while True:
+            await asyncio.sleep(settings.IMAGE_JOB_HEARTBEAT_SECONDS)
+            try:
+                if not await renew_image_job_lease(job):
+                    logger.warning(f"Lease of image job {job.job_id} expired before renewal, it may run twice")
+            except Exception as e:
+                logger.error(f"Failed to renew lease of image job {job.job_id}: {str(e)}")
+
+    @classmethod
+    async def process(cls, job: ImageJob) -> None:
+        """
+        生成并存储一张图片，处理期间按 IMAGE_JOB_HEARTBEAT_SECONDS 续期租约
+
+        Args:
+            job: 图片生成任务
+
+        Raises:
+            ImageJobError: 生成或存储失败
+            ImageJobCancelled: 任务已被取消
+        """
+        heartbeat = asyncio.create_task(cls._heartbeat(job))
+        try:
+            await cls._generate_and_link(job)
+        finally:
+            heartbeat.cancel()
+
+    @staticmethod
+    async def _generate_and_link(job: ImageJob) -> None:
+        # 生成期间按间隔检查取消标记，已取消时中止上游请求
+        generation = asyncio.create_task(get_or_create_shared_image(job.cocktail))
+        try:
+            while not generation.done():
+                await asyncio.wait({generation}, timeout=settings.IMAGE_JOB_CANCEL_POLL_SECONDS)
+                if not generation.done() and await is_image_job_cancelled(job.job_id):
+                    raise ImageJobCancelled()
+        finally:
+            generation.cancel()
+        image_key = generation.result()
+        if not image_key:
+            raise ImageJobError("failed to generate or store image")
+        # 生成完成后才取消的任务也不再关联到会话
+        if await is_image_job_cancelled(job.job_id):
+            raise ImageJobCancelled()
+        await link_session_image(job.user_id, job.session_id, image_key)
+        await publish_image_event(
+            job.user_id, job.session_id, ImageEvent(status=ImageEventStatus.READY, image_key=image_key)
+        )
+
+    async def _consume(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = await claim_image_job()
+            except Exception as e:
+                logger.error(f"Failed to claim image job: {str(e)}")
+                await asyncio.sleep(self.maintenance_interval)
+                continue
+            if job is None:
+                continue
+
+            try:
+                await self.process(job)
+            except ImageJobCancelled:
+                metrics.incr("image_jobs_total", result="cancelled")
+                await mark_image_job_cancelled(job)
+                logger.info(f"Image job {job.job_id} cancelled for user {job.user_id}: {job.session_id}")
+            except Exception as e:
+                metrics.incr("image_jobs_total", result="failed")
+                await fail_image_job(job, str(e) or traceback.format_exc())
+                if job.status == ImageJobStatus.FAILED:
+                    await publish_image_event(
+                        job.user_id, job.session_id, ImageEvent(status=ImageEventStatus.FAILED, error=job.error)
+                    )
+            else:
+                metrics.incr("image_jobs_total", result="succeeded")
+                await complete_image_job(job)
+                logger.info(f"Image job {job.job_id} done for user {job.user_id}: {job.session_id}")
+
+    async def _maintain(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                promoted = await promote_delayed_jobs()
+                requeued = await requeue_expired_jobs()
+                if promoted or requeued:
+                    logger.info(f"Image jobs promoted: {promoted}, requeued: {requeued}")
+            except Exception as e:
+                logger.error(f"Image job maintenance failed: {str(e)}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.maintenance_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self) -> None:
+        """运行直到收到停止信号"""
+        await redis_client.open()
+        await redis_binary_client.open()
+        http_clients.open()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except NotImplementedError:
+                pass
+
+        logger.info(f"Image worker started with concurrency {self.concurrency}")
+        try:
+            await asyncio.gather(self._maintain(), *(self._consume() for _ in range(self.concurrency)))
+        finally:
+            await http_clients.close()
+            shutdown_transcoder()
+            await redis_binary_client.close()
+            await redis_client.close()
+            logger.info("Image worker stopped")
+
+
+def main() -> None:
+    setup_logging()
+    set_custom_logfile()
+    asyncio.run(ImageWorker().run())
+
+
+if __name__ == "__main__":
+    main()
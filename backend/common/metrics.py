@@ -0,0 +1,124 @@
+import threading
+
+from collections import defaultdict
+from typing import Any, Callable, Dict
+
+
+def _metric_key(name: str, labels: Dict[str, Any]) -> str:
+    """
+    生成带标签的指标名，格式与 Prometheus 一致，例如 ``http_requests{upstream="llm"}``
+
+    :param name:
+    :param labels:
+    :return:
+    """
+    if not labels:
+        return name
+    label_str = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+class Metrics:
+    """
+    进程内指标收集器
+
+    counter 只增不减，gauge 记录当前值，summary 记录次数、总和与最大值；
+    collector 在导出时调用，用于连接池等需要即时采样的指标。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, Dict[str, float]] = {}
+        self._collectors: Dict[str, Callable[[], Any]] = {}
+
+    def incr(self, name: str, value: float = 1, **labels) -> None:
+        """
+        增加 counter
+
+        :param name:
+        :param value:
+        :param labels:
+        :return:
+        """
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """
+        设置 gauge
+
+        :param name:
+        :param value:
+        :param labels:
+        :return:
+        """
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def add(self, name: str, value: float, **labels) -> None:
+        """
+        调整 gauge，可为负数
+
+        :param name:
+        :param value:
+        :param labels:
+        :return:
+        """
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """
+        记录一次观测值
+
+        :param name:
+        :param value:
+        :param labels:
+        :return:
+        """
+        key = _metric_key(name, labels)
+        with self._lock:
+            summary = self._summaries.setdefault(key, {"count": 0, "sum": 0.0, "max": 0.0})
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def register_collector(self, name: str, collector: Callable[[], Any]) -> None:
+        """
+        注册导出时调用的采样函数
+
+        :param name:
+        :param collector:
+        :return:
+        """
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        导出当前所有指标
+
+        :return:
+        """
+        with self._lock:
+            data: Dict[str, Any] = {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": {k: dict(v) for k, v in self._summaries.items()},
+            }
+            collectors = dict(self._collectors)
+        for name, collector in collectors.items():
+            try:
+                data[name] = collector()
+            except Exception as e:
+                data[name] = {"error": str(e)}
+        return data
+
+
+# 创建指标收集器单例
+metrics: Metrics = Metrics()
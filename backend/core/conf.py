@@ -1,11 +1,11 @@
 from datetime import datetime
 from functools import lru_cache
-from typing import Literal
+from typing import Dict, Literal
 
 from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from backend.core.path_conf import BasePath
+from backend.core.path_conf import IMAGE_DIR, BasePath
 
 current_date = datetime.now().strftime("%Y%m%d")
 
@@ -81,11 +81,114 @@ class Settings(BaseSettings):
     # Postgres配置
     DATABASE_ECHO: bool = False  # SQL语句打印
     DATABASE_POOL_ECHO: bool = False  # 连接池日志
+    DATABASE_POOL_SIZE: int = 10  # ORM 异步连接池大小
+    DATABASE_MAX_OVERFLOW: int = 20  # ORM 异步连接池允许超出 pool_size 的连接数
+    DATABASE_SYNC_POOL_SIZE: int = 8  # agent 存储、memory 和知识库共享的同步连接池大小
+    DATABASE_SYNC_MAX_OVERFLOW: int = 8  # 同步连接池允许超出的连接数，两者之和不必超过 AGENT_IO_MAX_WORKERS
+    DATABASE_POOL_TIMEOUT: int = 30  # 获取连接的超时时间（秒）
+    DATABASE_POOL_RECYCLE: int = 3600  # 连接回收时间（秒）
     DATABASE_CHARSET: str = "utf8mb4"  # 字符集
 
     # Redis配置
     REDIS_TIMEOUT: int = 10  # 操作超时时间
 
+    # 外部HTTP客户端配置
+    HTTP_CLIENT_HTTP2: bool = True  # 上游连接启用 HTTP/2
+    HTTP_CLIENT_TIMEOUT: float = 30.0  # 默认请求超时时间（秒）
+    HTTP_CLIENT_LLM_TIMEOUT: float = 600.0  # 大模型请求超时时间（秒）
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = 60.0  # 空闲长连接保持时间（秒）
+    HTTP_CLIENT_LLM_MAX_CONNECTIONS: int = 100  # 大模型接口最大连接数
+    HTTP_CLIENT_EMBEDDING_MAX_CONNECTIONS: int = 20  # 嵌入接口最大连接数
+    HTTP_CLIENT_IMAGE_MAX_CONNECTIONS: int = 10  # 图片接口最大连接数
+
+    # Agent 流式输出配置
+    AGENT_IO_MAX_WORKERS: int = 16  # agent 会话存储、memory 和知识库同步 I/O 使用的线程数
+    AGENT_SESSION_DURABILITY: Dict[str, Literal["sync", "write_behind"]] = {
+        "casual_chat": "write_behind",
+        "classic_bartender": "write_behind",
+        "creative_bartender": "write_behind",
+    }  # 各 agent 会话写入方式：sync 写入 Postgres 后返回；write_behind 写入 Redis 后返回，定期批量写入 Postgres
+    AGENT_SESSION_CACHE_EXPIRE_SECONDS: int = 60 * 60 * 24  # Redis 中会话的过期时间，须远大于写入间隔
+    AGENT_HISTORY_WINDOW_RUNS: int = 10  # Redis 历史窗口保留的运行次数，不应小于 agent 的 num_history_responses
+    AGENT_HISTORY_TOKEN_BUDGET: Dict[str, int] = {
+        "casual_chat": 1500,
+    }  # 各 agent 原样发送的历史 token 预算，更早的运行以摘要形式发送；未配置或 0 表示不限制
+    AGENT_HISTORY_SUMMARY_MAX_TOKENS: int = 300  # 历史摘要的最大 token 数
+    AGENT_HISTORY_SUMMARY_MIN_RUNS: int = 1  # 未并入摘要的运行达到该数量时，在响应后更新摘要
+    AGENT_SESSION_FLUSH_INTERVAL_SECONDS: float = 2.0  # write_behind 会话批量写入 Postgres 的间隔
+    AGENT_SESSION_FLUSH_BATCH_SIZE: int = 200  # 每个事务最多写入的会话数
+    AGENT_SESSION_FLUSH_LOCK_SECONDS: int = 60  # 多个 worker 批量写入同一张表时的互斥锁超时时间
+    EVENT_LOOP_LAG_INTERVAL_SECONDS: float = 0.5  # 事件循环延迟采样间隔，0 表示关闭
+    AGENT_STREAM_DISCONNECT_POLL_SECONDS: float = 0.5  # 检测客户端断开的间隔
+    AGENT_STREAM_COALESCE_CHARS: int = 64  # 合并增量片段，缓冲达到该字符数时立即输出
+    AGENT_STREAM_COALESCE_LATENCY_SECONDS: float = 0.05  # 合并增量片段带来的最大额外延迟
+    AGENT_STREAM_HEARTBEAT_SECONDS: float = 15.0  # 无输出时的心跳间隔
+    AGENT_STREAM_RESUME_GRACE_SECONDS: int = 15  # 客户端断开后等待重连的时间，超时没有读者则取消运行
+    AGENT_STREAM_BUFFER_MAXLEN: int = 1000  # 每次运行缓冲的最多事件数（近似裁剪）
+    AGENT_STREAM_BUFFER_EXPIRE_SECONDS: int = 600  # 运行输出缓冲的过期时间
+    BARTENDER_IMAGE_PIPELINE: bool = True  # 非流式调酒师接口内部也流式运行，英文名称确定后即提交图片任务
+    BARTENDER_CACHE_ENABLED: bool = True  # 相同问卷直接返回缓存的推荐
+    BARTENDER_CACHE_EXPIRE_SECONDS: int = 60 * 60 * 24  # 推荐缓存过期时间
+    BARTENDER_CACHE_LOCK_SECONDS: float = 120.0  # 相同问卷并发请求时等待首个请求运行 agent 的最长时间
+    BARTENDER_SEMANTIC_CACHE_ENABLED: bool = True  # 选项相同且用户提示语义相近时返回缓存的推荐
+    BARTENDER_SEMANTIC_CACHE_EMBEDDER: Literal["openai", "local"] = "openai"  # 嵌入接口或本地确定性 embedder
+    BARTENDER_SEMANTIC_CACHE_DIMENSIONS: int = 1024  # 向量维度，修改后需重建语义缓存表
+    BARTENDER_SEMANTIC_CACHE_THRESHOLD: float = 0.92  # 命中所需的最低余弦相似度
+    BARTENDER_SEMANTIC_CACHE_MAX_ENTRIES: int = 10000  # 每个 agent 最多缓存的条目数，超出时淘汰最久未命中的
+    BARTENDER_SEMANTIC_CACHE_EXPIRE_SECONDS: int = 60 * 60 * 24 * 7  # 条目过期时间
+    BARTENDER_SEMANTIC_CACHE_EF_SEARCH: int = 100  # HNSW 检索的候选数，越大召回越高、越慢
+    BARTENDER_SEMANTIC_CACHE_MAX_SCAN_TUPLES: int = 20000  # 过滤后不足时迭代扫描最多访问的条目数
+    BARTENDER_GRID_ENABLED: bool = True  # 用户需求能归入心情分类时使用预生成的推荐网格
+    BARTENDER_GRID_MODEL: str = "deepseek-v3-250324"  # 预生成推荐使用的模型，只服务使用该模型的请求
+    BARTENDER_GRID_MAX_MESSAGE_CHARS: int = 20  # 超过该长度的用户需求视为有具体要求，不使用网格
+    BARTENDER_GRID_STALE_SECONDS: int = 60 * 60 * 24 * 7  # 超过该时间的推荐视为过期，返回的同时在后台重新生成
+    BARTENDER_GRID_REFRESH: bool = True  # 是否在后台重新生成过期的推荐
+    BARTENDER_GRID_REFRESH_LOCK_SECONDS: int = 300  # 同一格子重新生成的锁超时时间
+    BARTENDER_GRID_CONCURRENCY: int = 2  # 批量预生成时同时运行的 agent 数
+    BARTENDER_GRID_REQUESTS_PER_MINUTE: float = 30.0  # 批量预生成每分钟最多请求上游的次数
+    BARTENDER_BATCH_MAX_ITEMS: int = 100  # 批量推荐接口单次最多提交的问卷数
+    BARTENDER_BATCH_CONCURRENCY: int = 4  # 批量推荐时同时运行的 agent 数
+
+    # 图片生成配置
+    SILICONFLOW_IMAGE_URL: str = "https://api.siliconflow.cn/v1/images/generations"  # 图片生成接口地址
+    IMAGE_SEED_KEY: str = "moodshaker:cocktail_image:seed:v1"  # 派生图片种子的摘要密钥，修改后所有种子随之改变
+
+    # 图片生成任务配置
+    IMAGE_WORKER_CONCURRENCY: int = 4  # 每个 worker 进程同时处理的任务数
+    IMAGE_JOB_MAX_ATTEMPTS: int = 3  # 单个任务最大尝试次数
+    IMAGE_JOB_BACKOFF_SECONDS: float = 2.0  # 重试退避基准时间（秒），按指数增长
+    IMAGE_JOB_BACKOFF_MAX_SECONDS: float = 60.0  # 重试退避上限（秒）
+    IMAGE_JOB_LEASE_SECONDS: int = 120  # 任务租约时间，超时未续期的任务会被重新入队
+    IMAGE_JOB_HEARTBEAT_SECONDS: float = 30.0  # worker 续期处理中任务租约的间隔，需明显小于租约时间
+    IMAGE_JOB_EXPIRE_SECONDS: int = 60 * 60 * 24  # 任务状态保留时间
+    IMAGE_JOB_CANCEL_POLL_SECONDS: float = 0.5  # worker 检查处理中任务是否已被取消的间隔
+    IMAGE_SINGLE_FLIGHT_LOCK_SECONDS: int = 90  # 同一图片并发生成时的锁超时时间
+
+    # 图片存储配置
+    IMAGE_STORE_HOT_TTL_SECONDS: int = 60 * 60 * 24 * 7  # 热层（Redis）图片闲置过期时间，每次读取时续期
+    IMAGE_STORE_HOT_MAX_BYTES: int = 256 * 1024 * 1024  # 热层最多占用的字节数，超出时淘汰最久未读取的图片
+    IMAGE_STORE_COLD_BACKEND: Literal["disk", "s3"] = "disk"  # 冷层存储：本地磁盘（API 与 worker 需共享）或 S3
+    IMAGE_STORE_DISK_DIR: str = IMAGE_DIR  # 冷层本地磁盘目录
+    IMAGE_STORE_S3_ENDPOINT_URL: str | None = None  # S3 兼容存储地址，本地可使用 MinIO，例如 http://localhost:9000
+    IMAGE_STORE_S3_BUCKET: str = "moodshaker-images"  # S3 存储桶
+    IMAGE_STORE_S3_PREFIX: str = "cocktail_images/"  # S3 对象键前缀
+    IMAGE_STORE_S3_ACCESS_KEY: str | None = None  # S3 访问密钥
+    IMAGE_STORE_S3_SECRET_KEY: str | None = None  # S3 私有密钥
+    IMAGE_STORE_S3_REGION: str | None = None  # S3 区域
+    IMAGE_SESSION_REF_EXPIRE_SECONDS: int = 60 * 60 * 24 * 180  # 会话到共享图片的引用保留时间
+
+    # 图片转码配置
+    IMAGE_VARIANT_SIZES: list[int] = [128, 256, 512]  # 变体的最长边像素
+    IMAGE_VARIANT_FORMATS: list[str] = ["webp", "avif"]  # 变体格式，AVIF 由 pillow-avif-plugin 提供
+    IMAGE_WEBP_QUALITY: int = 80  # WebP 编码质量
+    IMAGE_AVIF_QUALITY: int = 60  # AVIF 编码质量
+    IMAGE_TRANSCODE_WORKERS: int = 2  # 转码进程数
+
+    # 图片就绪通知配置
+    IMAGE_EVENT_WAIT_SECONDS: float = 30.0  # 等待图片就绪的默认超时时间
+    IMAGE_EVENT_MAX_WAIT_SECONDS: float = 120.0  # 客户端可指定的最长等待时间
+    IMAGE_EVENT_HEARTBEAT_SECONDS: float = 15.0  # SSE 心跳间隔，防止代理断开空闲连接
+
     # 验证码配置
     CAPTCHA_LOGIN_REDIS_PREFIX: str = "moodshaker:login:captcha"  # 验证码键前缀
     CAPTCHA_LOGIN_EXPIRE_SECONDS: int = 60 * 5  # 验证码过期时间
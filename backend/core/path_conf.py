@@ -12,5 +12,11 @@ ALEMBIC_VERSIONS_DIR = os.path.join(BasePath, "alembic", "versions")
 # 日志文件路径
 LOG_DIR = os.path.join(BasePath, "logs")
 
+# 图片冷存储目录
+IMAGE_DIR = os.path.join(BasePath, "data", "images")
+
 # 挂载静态目录
 STATIC_DIR = os.path.join(BasePath, "static")
+
+# 内置经典鸡尾酒酒单
+COCKTAIL_CATALOG_PATH = os.path.join(BasePath, "app", "agent", "data", "classic_cocktails.json")
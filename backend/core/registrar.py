@@ -7,15 +7,23 @@ from fastapi.responses import RedirectResponse
 from fastapi_limiter import FastAPILimiter
 from fastapi_pagination import add_pagination
 
+from backend.app.agent.service.agents.agent_pool import agent_pool
+from backend.app.agent.service.utils.agent_io import agent_io
+from backend.app.agent.service.utils.agent_stream import shutdown_agent_runs
+from backend.app.agent.service.utils.image_events import image_event_hub
+from backend.app.agent.service.utils.image_transcoder import shutdown_transcoder
+from backend.app.agent.service.utils.session_store import session_write_behind
 from backend.app.router import router
 from backend.common.exception.exception_handler import register_exception
 from backend.common.log import set_custom_logfile, setup_logging
 from backend.core.conf import settings
 from backend.core.path_conf import STATIC_DIR
-from backend.database.db import create_table
-from backend.database.redis import redis_client
+from backend.database.db import close_engines, create_table
+from backend.database.redis import redis_binary_client, redis_client
 from backend.utils.demo_site import demo_site
 from backend.utils.health_check import ensure_unique_route_names, http_limit_callback
+from backend.utils.http_client import http_clients
+from backend.utils.loop_lag import EventLoopLagMonitor
 from backend.utils.openapi import simplify_operation_ids
 
 
@@ -30,17 +38,44 @@ async def register_init(app: FastAPI):
     await create_table()
     # 连接 redis
     await redis_client.open()
+    await redis_binary_client.open()
     # 初始化 limiter
     await FastAPILimiter.init(
         redis_client, prefix=settings.REQUEST_LIMITER_REDIS_PREFIX, http_callback=http_limit_callback
     )
+    # 创建外部 HTTP 客户端
+    http_clients.open()
+    # 监控事件循环延迟
+    loop_lag_monitor = EventLoopLagMonitor(settings.EVENT_LOOP_LAG_INTERVAL_SECONDS)
+    loop_lag_monitor.start()
+    # 启动会话批量写入
+    session_write_behind.start()
 
     yield
 
+    await loop_lag_monitor.stop()
+
+    # 取消仍在运行的 agent
+    await shutdown_agent_runs()
+    # 写入 Redis 中剩余的会话
+    await session_write_behind.stop()
+    # 停止图片事件订阅
+    await image_event_hub.close()
     # 关闭 redis 连接
     await redis_client.close()
+    await redis_binary_client.close()
     # 关闭 limiter
     await FastAPILimiter.close()
+    # 释放 agent 组件池
+    await agent_pool.close()
+    # 等待 agent 会话写入完成后关闭线程池
+    agent_io.shutdown()
+    # 释放数据库连接池
+    await close_engines()
+    # 关闭外部 HTTP 客户端
+    await http_clients.close()
+    # 关闭图片转码进程池
+    shutdown_transcoder()
 
 
 def register_app():
@@ -123,6 +158,7 @@ def register_middleware(app) -> None:
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            expose_headers=["X-Stream-Id"],
         )
 
 
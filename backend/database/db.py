@@ -1,18 +1,57 @@
 import sys
+import time
 
-from typing import Annotated
+from typing import Annotated, Any, Dict
 from urllib.parse import quote_plus
 from uuid import uuid4
 
 from fastapi import Depends
-from sqlalchemy import URL
+from sqlalchemy import URL, Engine, create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from backend.common.log import logger
+from backend.common.metrics import metrics
 from backend.common.model import MappedBase
 from backend.core.conf import settings
 
 
+class _MeteredPoolMixin:
+    """
+    记录获取连接等待时间的连接池
+
+    等待时间包括排队和溢出时新建连接的时间，记录为 db_pool_checkout_wait_seconds；
+    超时计入 db_pool_checkout_timeouts_total
+    """
+
+    metrics_name: str = "default"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.incr("db_pool_checkout_timeouts_total", pool=self.metrics_name)
+            raise
+        finally:
+            metrics.observe("db_pool_checkout_wait_seconds", time.perf_counter() - start, pool=self.metrics_name)
+
+    def recreate(self):
+        # dispose 时会重建连接池，保留指标名称
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    """记录等待时间的同步连接池"""
+
+
+class MeteredAsyncAdaptedQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    """记录等待时间的异步连接池"""
+
+
 def create_async_engine_and_session(url: str | URL) -> tuple[AsyncEngine, async_sessionmaker[AsyncSession]]:
     """
     创建异步数据库引擎和会话工厂
@@ -34,13 +73,15 @@ def create_async_engine_and_session(url: str | URL) -> tuple[AsyncEngine, async_
             echo_pool=settings.DATABASE_POOL_ECHO,  # 是否显示连接池操作
             future=True,  # 使用SQLAlchemy 2.0风格
             # 连接池配置
-            pool_size=10,  # 连接池大小，控制并发连接数
-            max_overflow=20,  # 允许超出pool_size的连接数
-            pool_timeout=30,  # 获取连接的超时时间（秒）
-            pool_recycle=3600,  # 连接回收时间（秒）
+            poolclass=MeteredAsyncAdaptedQueuePool,
+            pool_size=settings.DATABASE_POOL_SIZE,  # 连接池大小，控制并发连接数
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,  # 允许超出pool_size的连接数
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT,  # 获取连接的超时时间（秒）
+            pool_recycle=settings.DATABASE_POOL_RECYCLE,  # 连接回收时间（秒）
             pool_pre_ping=True,  # 在获取连接前进行健康检查
             pool_use_lifo=False,  # 是否使用LIFO（后进先出）策略
         )
+        engine.pool.metrics_name = "async"
     except Exception as e:
         logger.error("❌ 数据库链接失败 {}", e)
         sys.exit()
@@ -50,6 +91,37 @@ def create_async_engine_and_session(url: str | URL) -> tuple[AsyncEngine, async_
         return engine, db_session
 
 
+def create_sync_engine(url: str | URL) -> Engine:
+    """
+    创建同步数据库引擎
+
+    agno 的会话存储、memory 和知识库只支持同步引擎，每个 worker 只创建这一个，所有 agent 共享同一个连接池
+
+    Args:
+        url: 数据库连接URL
+
+    Returns:
+        Engine: 同步数据库引擎
+    """
+    try:
+        engine = create_engine(
+            url,
+            echo=settings.DATABASE_ECHO,
+            echo_pool=settings.DATABASE_POOL_ECHO,
+            poolclass=MeteredQueuePool,
+            pool_size=settings.DATABASE_SYNC_POOL_SIZE,
+            max_overflow=settings.DATABASE_SYNC_MAX_OVERFLOW,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+            pool_recycle=settings.DATABASE_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+        engine.pool.metrics_name = "sync"
+    except Exception as e:
+        logger.error("❌ 数据库链接失败 {}", e)
+        sys.exit()
+    return engine
+
+
 async def get_db():
     """
     数据库会话生成器
@@ -68,9 +140,39 @@ async def create_table() -> None:
     使用SQLAlchemy的元数据创建所有定义的表
     """
     async with async_engine.begin() as coon:
+        # 向量列依赖 pgvector 扩展
+        await coon.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         await coon.run_sync(MappedBase.metadata.create_all)
 
 
+async def close_engines() -> None:
+    """释放所有数据库连接"""
+    await async_engine.dispose()
+    sync_engine.dispose()
+
+
+def db_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    连接池统计信息
+
+    Returns:
+        每个连接池的大小、已借出、空闲、溢出连接数和使用率
+    """
+    stats = {}
+    for name, pool in (("async", async_engine.pool), ("sync", sync_engine.pool)):
+        capacity = pool.size() + pool._max_overflow
+        checked_out = pool.checkedout()
+        stats[name] = {
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": checked_out,
+            "idle": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "utilization": checked_out / capacity if capacity > 0 else 0.0,
+        }
+    return stats
+
+
 def uuid4_str() -> str:
     """
     生成UUID字符串
@@ -114,6 +216,9 @@ def get_syn_db_url() -> str:
 
 # 初始化数据库引擎和会话工厂
 async_engine, async_db_session = create_async_engine_and_session(get_asyn_db_url())
+# agent 存储、memory 和知识库共享的同步引擎
+sync_engine = create_sync_engine(get_syn_db_url())
+metrics.register_collector("db_pools", db_pool_stats)
 
 # 定义FastAPI依赖注入使用的会话类型
 CurrentSession = Annotated[AsyncSession, Depends(get_db)]
@@ -8,14 +8,14 @@ from backend.core.conf import settings
 
 
 class RedisCli(Redis):
-    def __init__(self):
+    def __init__(self, decode_responses: bool = True):
         super(RedisCli, self).__init__(
             host=settings.REDIS_HOST,
             port=settings.REDIS_PORT,
             password=settings.REDIS_PASSWORD,
             db=settings.REDIS_DATABASE,
             socket_timeout=settings.REDIS_TIMEOUT,
-            decode_responses=True,  # 转码 utf-8
+            decode_responses=decode_responses,  # 转码 utf-8
         )
 
     async def open(self):
@@ -60,3 +60,6 @@ class RedisCli(Redis):
 
 # 创建 redis 客户端单例
 redis_client: RedisCli = RedisCli()
+
+# 创建不转码的 redis 客户端单例，用于存取图片等二进制数据
+redis_binary_client: RedisCli = RedisCli(decode_responses=False)
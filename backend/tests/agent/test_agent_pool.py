@@ -0,0 +1,31 @@
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from backend.app.agent.schema.agent_request_schema import AgentType
+from backend.app.agent.service.agents.agent_pool import AgentPool
+
+THREADS = 16
+CALLS = 500
+
+
+def test_concurrent_get_builds_once_and_counts_every_hit():
+    pool = AgentPool()
+    builds = []
+
+    def builder(model_id):
+        builds.append(model_id)
+        # 构建较慢时其他线程会在锁上等待，而不是各自再构建一次
+        time.sleep(0.05)
+        return SimpleNamespace(hits=0)
+
+    def worker(_):
+        for _ in range(CALLS):
+            pool.get(AgentType.CLASSIC_BARTENDER, "stub-chat", builder)
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        list(executor.map(worker, range(THREADS)))
+
+    assert builds == ["stub-chat"]
+    assert pool.stats() == {f"{AgentType.CLASSIC_BARTENDER.value}:stub-chat": THREADS * CALLS}
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from backend.app.agent.service.utils import agent_stream
+from backend.app.agent.service.utils.agent_stream import (
+    DeltaCoalescer,
+    StreamEvent,
+    agent_stream_key,
+    read_agent_stream,
+    start_agent_run,
+)
+from backend.common.metrics import metrics
+from backend.core.conf import settings
+from backend.tests.stub_servers import StubChatServer
+
+pytestmark = pytest.mark.anyio
+
+AGENT_NAME = "stream_test"
+
+
+class FakeRequest:
+    """由测试控制何时断开的请求"""
+
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+@pytest.fixture
+def chat_server():
+    with StubChatServer(chunks=200, chunk_interval=0.05) as server:
+        yield server
+
+
+@pytest.fixture
+def stream_settings(monkeypatch, fake_redis):
+    monkeypatch.setattr(settings, "AGENT_STREAM_DISCONNECT_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "AGENT_STREAM_HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "AGENT_STREAM_RESUME_GRACE_SECONDS", 1)
+    monkeypatch.setattr(settings, "AGENT_STREAM_COALESCE_LATENCY_SECONDS", 0.01)
+    return fake_redis[0]
+
+
+def parse_events(payload: str):
+    for block in payload.split("\n\n"):
+        event = next((line[len("event: ") :] for line in block.splitlines() if line.startswith("event: ")), None)
+        data = next((line[len("data: ") :] for line in block.splitlines() if line.startswith("data: ")), None)
+        if event is not None:
+            yield event, json.loads(data)
+
+
+def counter(result: str) -> float:
+    key = f'agent_stream_runs_total{{agent="{AGENT_NAME}",result="{result}"}}'
+    return metrics.snapshot()["counters"].get(key, 0)
+
+
+async def wait_for(predicate, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.02)
+
+
+def test_coalescer_flushes_on_size(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(agent_stream.time, "monotonic", lambda: now[0])
+    coalescer = DeltaCoalescer(max_chars=10, max_latency=0.05)
+    assert coalescer.deadline is None
+    assert not coalescer.due(now[0])
+
+    coalescer.add("hello")
+    assert coalescer.deadline == pytest.approx(100.05)
+    assert not coalescer.due(now[0])
+    coalescer.add(" world")
+    assert coalescer.due(now[0])
+    assert coalescer.drain() == "hello world"
+    assert coalescer.deadline is None
+    assert not coalescer.due(now[0])
+
+
+def test_coalescer_flushes_on_latency(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(agent_stream.time, "monotonic", lambda: now[0])
+    coalescer = DeltaCoalescer(max_chars=64, max_latency=0.05)
+    coalescer.add("a")
+    now[0] = 100.03
+    # 截止时间从最早一段缓冲算起，后续片段不会推迟输出
+    coalescer.add("b")
+    assert not coalescer.due(now[0])
+    assert coalescer.due(100.05)
+    assert coalescer.drain() == "ab"
+
+    now[0] = 101.0
+    coalescer.add("c")
+    assert coalescer.deadline == pytest.approx(101.05)
+
+
+async def test_reader_sends_heartbeats_while_idle(stream_settings, monkeypatch):
+    redis = stream_settings
+    monkeypatch.setattr(settings, "AGENT_STREAM_HEARTBEAT_SECONDS", 0.2)
+    key = agent_stream_key(1, "s0", "idle")
+    await redis.set(f"{key}:writer", 1, ex=30)
+
+    async def finish_later():
+        await asyncio.sleep(0.7)
+        await redis.xadd(key, {"event": StreamEvent.DONE.value, "data": "{}"})
+
+    finisher = asyncio.create_task(finish_later())
+    start = time.monotonic()
+    heartbeats = []
+    async for payload in read_agent_stream(1, "s0", "idle", FakeRequest()):
+        if payload.startswith(":"):
+            heartbeats.append(time.monotonic() - start)
+    await finisher
+
+    # 空闲 0.7 秒，每 0.2 秒一次心跳
+    assert len(heartbeats) == 3
+    for previous, current in zip([0.0, *heartbeats], heartbeats):
+        assert current - previous >= 0.2
+        assert current - previous < 0.2 + 0.15
+
+
+async def test_client_disconnect_cancels_run_and_closes_upstream(stream_settings, chat_server, chat_agent_factory):
+    redis = stream_settings
+    cancelled_before = counter("cancelled")
+    stream_id = await start_agent_run(chat_agent_factory(chat_server), "hi", 1, "s1", AGENT_NAME)
+    key = agent_stream_key(1, "s1", stream_id)
+    (task,) = [t for t in agent_stream._running_runs if not t.done()]
+
+    request = FakeRequest()
+    received = []
+    async for payload in read_agent_stream(1, "s1", stream_id, request):
+        received.extend(parse_events(payload))
+        if sum(1 for event, _ in received if event == StreamEvent.DELTA.value) >= 3:
+            # 客户端在流中途断开
+            request.disconnected = True
+
+    assert [data for event, data in received if event == StreamEvent.DELTA.value]
+    assert not any(event in (StreamEvent.DONE.value, StreamEvent.ERROR.value) for event, _ in received)
+
+    # 宽限期内没有重连，运行被取消，上游连接随之关闭
+    await asyncio.wait_for(task, timeout=10)
+    await wait_for(chat_server.upstream_closed.is_set)
+    assert chat_server.chunks_sent < chat_server.chunks
+    sent = chat_server.chunks_sent
+    await asyncio.sleep(0.3)
+    assert chat_server.chunks_sent <= sent + 1
+    assert counter("cancelled") == cancelled_before + 1
+
+    entries = await redis.xrange(key)
+    last = entries[-1][1]
+    assert last["event"] == StreamEvent.ERROR.value
+    assert json.loads(last["data"]) == {"message": "Agent run cancelled"}
+
+
+async def test_reconnect_within_grace_keeps_run(stream_settings, chat_server, chat_agent_factory):
+    chat_server.chunks = 20
+    chat_server.chunk_interval = 0.01
+    completed_before = counter("completed")
+    stream_id = await start_agent_run(chat_agent_factory(chat_server), "hi", 1, "s2", AGENT_NAME)
+
+    request = FakeRequest()
+    last_event_id = None
+    async for payload in read_agent_stream(1, "s2", stream_id, request):
+        for line in payload.splitlines():
+            if line.startswith("id: "):
+                last_event_id = line[len("id: ") :]
+        request.disconnected = last_event_id is not None
+
+    # 断开后立即带 Last-Event-ID 重连，补发并跟随到结束
+    events = []
+    async for payload in read_agent_stream(1, "s2", stream_id, FakeRequest(), last_event_id):
+        events.extend(parse_events(payload))
+
+    assert events[-1][0] == StreamEvent.DONE.value
+    assert counter("completed") == completed_before + 1
+    assert not chat_server.upstream_closed.is_set()
+    assert chat_server.chunks_sent == chat_server.chunks
@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import pytest
+
+from fastapi import HTTPException
+
+from backend.app.agent.api.v1 import agents
+from backend.app.agent.schema.agent_request_schema import AgentType, BartenderRequest
+from backend.app.agent.service.utils.recommendation_cache import set_recommendation_cache_opt_out
+from backend.tests.agent.test_recommend_cocktail import COCKTAIL
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeAgent:
+    def __init__(self, user_id=None, session_id=None, **kwargs):
+        self.user_id = user_id
+        self.session_id = session_id
+
+
+@pytest.fixture
+def batch(monkeypatch, fake_redis):
+    """记录运行 agent 和补写缓存结果的调用"""
+    runs = []
+    write_backs = []
+
+    async def recommend(agent, message, body, request, agent_name):
+        runs.append((body.user_id, body.session_id))
+        await asyncio.sleep(0.01)
+        if body.message == "boom":
+            raise HTTPException(status_code=500, detail="upstream failed")
+        return COCKTAIL
+
+    async def use_cached(agent, message, cocktail, user_id, session_id):
+        assert (agent.user_id, agent.session_id) == (user_id, session_id)
+        write_backs.append((user_id, session_id))
+
+    monkeypatch.setattr(agents, "recommend_cocktail", recommend)
+    monkeypatch.setattr(agents, "_use_cached_recommendation", use_cached)
+    monkeypatch.setattr(agents, "_BATCH_AGENTS", {agent_type: FakeAgent for agent_type in agents._BATCH_AGENTS})
+    return runs, write_backs
+
+
+async def run_batch(items):
+    lines = [
+        json.loads(line) async for line in agents.bartender_batch_streamer(AgentType.CLASSIC_BARTENDER, items, None)
+    ]
+    return sorted(lines, key=lambda line: line["index"])
+
+
+def item(message: str, user_id: str, session_id=None) -> BartenderRequest:
+    return BartenderRequest(message=message, user_id=user_id, session_id=session_id)
+
+
+async def test_duplicates_run_once_and_each_session_is_written_back(batch):
+    runs, write_backs = batch
+    lines = await run_batch([
+        item("清爽", "1", "s1"),
+        # 与首个问卷同一会话号但属于其他用户
+        item("清爽", "2", "s1"),
+        item("清爽", "1", "s2"),
+        # 同一用户和会话重复提交只补写一次
+        item("清爽", "1", "s2"),
+        item("清爽", "1", "s1"),
+        item("浓烈", "3", "s3"),
+    ])
+
+    assert sorted(runs) == [("1", "s1"), ("3", "s3")]
+    assert sorted(write_backs) == [("1", "s2"), ("2", "s1")]
+    assert [line["ok"] for line in lines] == [True] * 6
+    assert [line["deduplicated"] for line in lines] == [False, True, True, True, True, False]
+    assert all(line["cocktail"]["name"] == COCKTAIL.name for line in lines)
+
+
+async def test_opted_out_users_run_their_own_agent(batch):
+    runs, write_backs = batch
+    await set_recommendation_cache_opt_out(2, True)
+    lines = await run_batch([item("清爽", "1", "s1"), item("清爽", "2", "s2"), item("清爽", "3", "s3")])
+
+    assert sorted(runs) == [("1", "s1"), ("2", "s2")]
+    assert write_backs == [("3", "s3")]
+    assert [line["deduplicated"] for line in lines] == [False, False, True]
+
+
+async def test_failed_item_does_not_affect_others(batch):
+    runs, write_backs = batch
+    lines = await run_batch([item("boom", "1", "s1"), item("boom", "2", "s2"), item("清爽", "3", "s3")])
+
+    assert len(runs) == 2
+    assert write_backs == []
+    assert [line["ok"] for line in lines] == [False, False, True]
+    assert lines[0]["error"] == lines[1]["error"] == "upstream failed"
+
+
+async def test_write_back_failure_is_isolated(batch, monkeypatch):
+    runs, write_backs = batch
+
+    async def use_cached(agent, message, cocktail, user_id, session_id):
+        if user_id == "2":
+            raise RuntimeError("storage unavailable")
+        write_backs.append((user_id, session_id))
+
+    monkeypatch.setattr(agents, "_use_cached_recommendation", use_cached)
+    lines = await run_batch([item("清爽", "1", "s1"), item("清爽", "2", "s2"), item("清爽", "3", "s3")])
+
+    assert write_backs == [("3", "s3")]
+    assert [line["ok"] for line in lines] == [True, True, True]
@@ -0,0 +1,151 @@
+import numpy as np
+import pytest
+
+from backend.app.agent.schema.agent_request_schema import AlcoholLevel, DifficultyLevel
+from backend.app.agent.schema.catalog_schema import CatalogData
+from backend.app.agent.service.utils import cocktail_catalog
+from backend.app.agent.service.utils.cocktail_catalog import CocktailCatalog, get_cocktail_catalog
+
+# 占位原料把用到的原料推到第二个 64 位分段之后，覆盖跨段的位运算
+FILLER = 70
+
+
+def recipe(id, ingredients, tools=(), optional=(), alcohol="medium", difficulty="easy", flavor=None):
+    return {
+        "id": id,
+        "name": f"{id}酒",
+        "english_name": id.title(),
+        "description": "d",
+        "base_spirit": "rum" if any("rum" in i for i in ingredients) else "gin",
+        "alcohol_level": alcohol,
+        "difficulty_level": difficulty,
+        "flavor": flavor or {},
+        "flavor_profiles": [],
+        "ingredients": [{"id": i, "amount": "1"} for i in ingredients]
+        + [{"id": i, "amount": "1", "optional": True} for i in optional],
+        "steps": [],
+        "tools": list(tools),
+        "serving_glass": "g",
+    }
+
+
+@pytest.fixture(scope="module")
+def catalog() -> CocktailCatalog:
+    ingredients = {f"filler_{i}": {"name": f"占位{i}"} for i in range(FILLER)}
+    ingredients.update({
+        "white_rum": {"name": "白朗姆酒", "aliases": ["rum", "朗姆酒"]},
+        "dark_rum": {"name": "黑朗姆酒", "aliases": ["rum", "朗姆酒"]},
+        "gin": {"name": "金酒", "aliases": ["杜松子酒"]},
+        "lime": {"name": "青柠", "aliases": ["lime juice"]},
+        "sugar": {"name": "糖"},
+        "mint": {"name": "薄荷"},
+        "cola": {"name": "可乐"},
+        "tonic": {"name": "汤力水"},
+    })
+    data = CatalogData.model_validate({
+        "version": 1,
+        "spirits": {"rum": "朗姆酒", "gin": "金酒"},
+        "ingredients": ingredients,
+        "tools": {"shaker": {"name": "摇酒壶"}, "muddler": {"name": "捣棒"}, "jigger": {"name": "量酒器"}},
+        "cocktails": [
+            recipe("mojito", ["white_rum", "lime", "sugar", "mint"], tools=["muddler"], flavor={"refreshing": 1}),
+            recipe("cuba_libre", ["white_rum", "cola"], optional=["lime"], alcohol="low"),
+            recipe("daiquiri", ["white_rum", "lime", "sugar"], tools=["shaker"], flavor={"sour": 1}),
+            recipe("dark_daiquiri", ["dark_rum", "lime", "sugar"], tools=["shaker"], difficulty="medium"),
+            recipe("gin_tonic", ["gin", "tonic"], optional=["lime"], alcohol="low", flavor={"refreshing": 1}),
+            recipe("gimlet", ["gin", "lime", "sugar"], tools=["shaker", "jigger"], difficulty="hard"),
+        ],
+    })
+    return CocktailCatalog(data)
+
+
+def names(matches):
+    return [match.cocktail.id for match in matches]
+
+
+def test_ingredient_bitmap_spans_several_words(catalog):
+    assert catalog.ingredients.words == 2
+    assert catalog.ingredients.bits["white_rum"] >= 64
+
+
+def test_exact_match_ignores_optional_ingredients(catalog):
+    matches = catalog.find_makeable({"white_rum", "cola"}, limit=10)
+    assert names(matches) == ["cuba_libre"]
+    assert matches[0].missing == []
+    assert catalog.find_makeable({"white_rum"}, limit=10) == []
+
+
+def test_max_missing_counts_missing_ingredients(catalog):
+    have = {"white_rum", "lime"}
+    matches = catalog.find_makeable(have, max_missing=1, limit=10)
+    # 按缺少原料数排序，缺少的原料逐个列出
+    assert names(matches) == ["cuba_libre", "daiquiri"]
+    assert [match.missing for match in matches] == [["cola"], ["sugar"]]
+
+    matches = catalog.find_makeable(have, max_missing=2, limit=10)
+    assert set(names(matches)) == {"cuba_libre", "daiquiri", "mojito", "dark_daiquiri", "gimlet", "gin_tonic"}
+    assert {match.cocktail.id: len(match.missing) for match in matches} == {
+        "cuba_libre": 1,
+        "daiquiri": 1,
+        "mojito": 2,
+        "dark_daiquiri": 2,
+        "gimlet": 2,
+        "gin_tonic": 2,
+    }
+
+
+def test_popcount_fallback_matches_numpy(catalog, monkeypatch):
+    have = {"white_rum", "lime"}
+    expected = [(m.cocktail.id, m.missing) for m in catalog.find_makeable(have, max_missing=2, limit=10)]
+    words = np.array([0, 1, (1 << 64) - 1, 0x8000000000000001, 0x00FF00FF00FF00FF], dtype=np.uint64)
+    assert cocktail_catalog._popcount(words).tolist() == [0, 1, 64, 2, 32]
+
+    monkeypatch.delattr(np, "bitwise_count")
+    assert cocktail_catalog._popcount(words).tolist() == [0, 1, 64, 2, 32]
+    assert [(m.cocktail.id, m.missing) for m in catalog.find_makeable(have, max_missing=2, limit=10)] == expected
+
+
+def test_tools_filter_requires_every_tool(catalog):
+    have = {"white_rum", "dark_rum", "gin", "lime", "sugar", "mint", "cola", "tonic"}
+    assert len(catalog.find_makeable(have, limit=10)) == 6
+    # 不限制工具与没有工具不同：后者只保留不需要工具的配方
+    assert set(names(catalog.find_makeable(have, tools=[], limit=10))) == {"cuba_libre", "gin_tonic"}
+    assert set(names(catalog.find_makeable(have, tools=["shaker"], limit=10))) == {
+        "cuba_libre",
+        "gin_tonic",
+        "daiquiri",
+        "dark_daiquiri",
+    }
+    assert "gimlet" in names(catalog.find_makeable(have, tools=["shaker", "jigger"], limit=10))
+
+
+def test_shared_alias_resolves_to_every_item(catalog):
+    ids, unknown = catalog.ingredients.resolve(["Rum", " lime juice ", "糖", "苦精"])
+    assert ids == {"white_rum", "dark_rum", "lime", "sugar"}
+    assert unknown == ["苦精"]
+    # “朗姆酒”同时满足用白朗姆和黑朗姆的配方
+    assert set(names(catalog.find_makeable(ids, tools=["shaker"], limit=10))) == {"daiquiri", "dark_daiquiri"}
+
+    ids, _ = catalog.ingredients.resolve(["白朗姆酒", "lime", "sugar"])
+    assert names(catalog.find_makeable(ids, tools=["shaker"], limit=10)) == ["daiquiri"]
+
+
+def test_filters_and_flavor_ranking(catalog):
+    have = {"white_rum", "dark_rum", "gin", "lime", "sugar", "mint", "cola", "tonic"}
+    assert set(names(catalog.find_makeable(have, alcohol_level=AlcoholLevel.LOW, limit=10))) == {
+        "cuba_libre",
+        "gin_tonic",
+    }
+    assert "gimlet" not in names(catalog.find_makeable(have, difficulty_level=DifficultyLevel.MEDIUM, limit=10))
+    assert set(names(catalog.find_makeable(have, base_spirit="gin", limit=10))) == {"gin_tonic", "gimlet"}
+    assert names(catalog.find_makeable(have, flavors=["refreshing"], limit=2)) == ["mojito", "gin_tonic"]
+    assert names(catalog.find_makeable(have, flavors=["sour"], limit=1)) == ["daiquiri"]
+
+
+def test_builtin_catalog_loads():
+    catalog = get_cocktail_catalog()
+    assert len(catalog) > 0
+    mojito = catalog.get("Mojito")
+    assert mojito is not None
+    recommendation = catalog.to_recommendation(mojito, match_reason="test")
+    assert recommendation.english_name == mojito.english_name
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from backend.app.agent.service.utils.cocktail_catalog import get_cocktail_catalog
+from backend.app.agent.service.utils.flavor_embedding import (
+    FLAVOR_EMBEDDING_DIMENSIONS,
+    FlavorIndex,
+    embed_catalog_cocktail,
+    embed_recommendation,
+    find_similar_cocktails,
+)
+
+
+def unit_vectors(n: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(n, FLAVOR_EMBEDDING_DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_exact_search_returns_sorted_top_k():
+    vectors = unit_vectors(100)
+    index = FlavorIndex(vectors)
+    ids, scores = index.search(vectors[:3], 5)
+    for row, (found, found_scores) in enumerate(zip(ids, scores)):
+        expected = np.argsort(-(vectors @ vectors[row]))[:5]
+        assert found.tolist() == expected.tolist()
+        assert found[0] == row
+        assert found_scores[0] == pytest.approx(1.0)
+        assert np.all(np.diff(found_scores) <= 0)
+
+
+def test_ivf_search_finds_itself():
+    vectors = unit_vectors(2000)
+    index = FlavorIndex(vectors, exact_max=100)
+    assert index._centroids is not None
+    ids, scores = index.search(vectors[:20], 3)
+    assert [found[0] for found in ids] == list(range(20))
+    assert all(found_scores[0] == pytest.approx(1.0) for found_scores in scores)
+
+
+def test_ivf_widens_probe_until_k_candidates():
+    vectors = unit_vectors(2000)
+    index = FlavorIndex(vectors, exact_max=100, nprobe=1)
+    sizes = np.diff(index._offsets)
+    # 只探测一个簇时候选不够，需要继续探测后续的簇
+    k = int(sizes.max()) + 10
+    ids, scores = index.search(vectors[:5], k)
+    for found, found_scores in zip(ids, scores):
+        assert len(found) == k
+        assert len(set(found.tolist())) == k
+        assert np.all(np.diff(found_scores) <= 0)
+
+    # k 超过总数时返回全部向量
+    ids, _ = index.search(vectors[0], len(vectors) + 5)
+    assert sorted(ids[0].tolist()) == list(range(len(vectors)))
+
+
+def test_empty_index_and_non_positive_k():
+    index = FlavorIndex(np.empty((0, FLAVOR_EMBEDDING_DIMENSIONS), dtype=np.float32))
+    ids, scores = index.search(unit_vectors(2), 3)
+    assert [len(found) for found in ids] == [0, 0]
+    ids, _ = FlavorIndex(unit_vectors(10)).search(unit_vectors(1), 0)
+    assert len(ids[0]) == 0
+
+
+def test_recommendation_embedding_matches_catalog_recipe():
+    catalog = get_cocktail_catalog()
+    mojito = catalog.get("Mojito")
+    vector = embed_catalog_cocktail(mojito)
+    assert vector.shape == (FLAVOR_EMBEDDING_DIMENSIONS,)
+    assert np.linalg.norm(vector) == pytest.approx(1.0)
+    recommendation = catalog.to_recommendation(mojito, match_reason="")
+    assert float(vector @ embed_recommendation(recommendation, catalog)) > 0.5
+
+
+def test_find_similar_cocktails_excludes_input():
+    catalog = get_cocktail_catalog()
+    recommendation = catalog.to_recommendation(catalog.get("Mojito"), match_reason="")
+    similar = find_similar_cocktails(recommendation, limit=3)
+    assert 0 < len(similar) <= 3
+    assert all(item.english_name != recommendation.english_name for item in similar)
+    assert all(item.match_reason.startswith(f"与{recommendation.name}口味相近") for item in similar)
@@ -0,0 +1,117 @@
+import asyncio
+import itertools
+import json
+import time
+
+import pytest
+
+from backend.app.agent.service.utils.recommendation_grid import iter_grid_cells
+from backend.app.agent.worker import grid_worker
+from backend.app.agent.worker.grid_worker import GridWorker, RateLimiter
+from backend.core.conf import settings
+from backend.tests.agent.test_recommend_cocktail import COCKTAIL
+
+pytestmark = pytest.mark.anyio
+
+# 每 0.05 秒放行一次
+REQUESTS_PER_MINUTE = 1200
+INTERVAL = 60 / REQUESTS_PER_MINUTE
+
+
+async def test_rate_limiter_spaces_concurrent_acquires():
+    limiter = RateLimiter(REQUESTS_PER_MINUTE)
+    started = time.monotonic()
+    granted = []
+
+    async def acquire():
+        await limiter.acquire()
+        granted.append(time.monotonic() - started)
+
+    await asyncio.gather(*(acquire() for _ in range(5)))
+
+    # 第一次立即放行，之后每次间隔一个周期
+    assert granted[0] < INTERVAL / 2
+    gaps = [b - a for a, b in itertools.pairwise(sorted(granted))]
+    assert min(gaps) > INTERVAL * 0.8
+    assert granted[-1] >= INTERVAL * 4 * 0.9
+
+
+async def test_rate_limiter_does_not_bank_idle_time():
+    limiter = RateLimiter(REQUESTS_PER_MINUTE)
+    await limiter.acquire()
+    # 空闲一段时间后不会攒下额度连续放行
+    await asyncio.sleep(INTERVAL * 4)
+    started = time.monotonic()
+    await limiter.acquire()
+    await limiter.acquire()
+    assert time.monotonic() - started > INTERVAL * 0.8
+
+
+@pytest.fixture
+def generated(monkeypatch, fake_redis):
+    """替换 agent 生成：记录每个格子的生成时间，标记为失败的格子抛出异常"""
+    calls = []
+    failing = set()
+
+    async def generate(cell):
+        calls.append((cell.key, time.monotonic()))
+        if cell.key in failing:
+            raise ValueError("upstream failed")
+        entry = {"recommendation": COCKTAIL.model_dump(mode="json"), "generated_at": time.time()}
+        await fake_redis[0].set(cell.key, json.dumps(entry, ensure_ascii=False))
+        return COCKTAIL
+
+    monkeypatch.setattr(grid_worker, "generate_grid_cell", generate)
+    return calls, failing
+
+
+async def run_worker(worker: GridWorker, cells) -> None:
+    queue: asyncio.Queue = asyncio.Queue()
+    for cell in cells:
+        queue.put_nowait(cell)
+    await asyncio.gather(*(worker._consume(queue) for _ in range(worker.concurrency)))
+
+
+async def seed(client, cell, generated_at: float):
+    entry = {"recommendation": COCKTAIL.model_dump(mode="json"), "generated_at": generated_at}
+    await client.set(cell.key, json.dumps(entry, ensure_ascii=False))
+
+
+async def test_worker_skips_fresh_cells_and_counts_failures(generated, fake_redis):
+    calls, failing = generated
+    cells = list(itertools.islice(iter_grid_cells("classic_bartender"), 6))
+    await seed(fake_redis[0], cells[0], time.time())
+    await seed(fake_redis[0], cells[1], time.time() - settings.BARTENDER_GRID_STALE_SECONDS - 1)
+    failing.add(cells[2].key)
+
+    worker = GridWorker(["classic_bartender"], concurrency=3, requests_per_minute=REQUESTS_PER_MINUTE)
+    await run_worker(worker, cells)
+
+    assert sorted(key for key, _ in calls) == sorted(cell.key for cell in cells[1:])
+    assert (worker.generated, worker.skipped, worker.failed) == (4, 1, 1)
+
+
+async def test_worker_is_rate_limited_across_consumers(generated):
+    calls, _ = generated
+    cells = list(itertools.islice(iter_grid_cells("creative_bartender"), 6))
+
+    worker = GridWorker(["creative_bartender"], concurrency=3, requests_per_minute=REQUESTS_PER_MINUTE)
+    await run_worker(worker, cells)
+
+    # 多个协程共享同一个限速器，上游请求之间仍然保持间隔
+    times = sorted(at for _, at in calls)
+    assert len(times) == len(cells)
+    assert min(b - a for a, b in itertools.pairwise(times)) > INTERVAL * 0.8
+
+
+async def test_force_regenerates_fresh_cells(generated, fake_redis):
+    calls, _ = generated
+    cells = list(itertools.islice(iter_grid_cells("classic_bartender"), 2))
+    for cell in cells:
+        await seed(fake_redis[0], cell, time.time())
+
+    worker = GridWorker(["classic_bartender"], force=True, concurrency=2, requests_per_minute=REQUESTS_PER_MINUTE)
+    await run_worker(worker, cells)
+
+    assert len(calls) == 2
+    assert (worker.generated, worker.skipped) == (2, 0)
@@ -0,0 +1,129 @@
+import pytest
+
+from agno.memory.v2.memory import Memory
+from agno.models.message import Message
+from agno.run.messages import RunMessages
+from agno.run.response import RunResponse
+
+from backend.app.agent.service.agents.offloaded_agent import OffloadedAgent
+from backend.app.agent.service.utils.history_budget import (
+    HistorySummary,
+    history_messages,
+    message_tokens,
+    split_history,
+    unsummarized_runs,
+)
+from backend.utils import token_counter
+from backend.utils.token_counter import estimate_tokens
+
+SESSION_ID = "s1"
+
+
+def make_run(n: int, words: int = 40) -> RunResponse:
+    return RunResponse(
+        run_id=f"run-{n}",
+        session_id=SESSION_ID,
+        messages=[
+            Message(role="system", content="system prompt"),
+            Message(role="user", content=f"question {n} " + "word " * words),
+            Message(role="assistant", content=f"answer {n} " + "word " * words),
+        ],
+    )
+
+
+def run_tokens(run: RunResponse) -> int:
+    return sum(message_tokens(m) for m in history_messages(run))
+
+
+def test_split_history_respects_budget_and_max_runs():
+    runs = [make_run(n) for n in range(6)]
+    per_run = run_tokens(runs[0])
+
+    older, recent = split_history(runs, budget=per_run * 2, max_runs=10)
+    assert [r.run_id for r in recent] == ["run-4", "run-5"]
+    assert [r.run_id for r in older] == ["run-0", "run-1", "run-2", "run-3"]
+
+    older, recent = split_history(runs, budget=per_run * 10, max_runs=3)
+    assert [r.run_id for r in recent] == ["run-3", "run-4", "run-5"]
+
+    # 单次运行就超出预算时不原样保留任何运行
+    older, recent = split_history(runs, budget=per_run - 1, max_runs=10)
+    assert recent == []
+    assert len(older) == 6
+
+
+def test_unsummarized_runs():
+    older = [make_run(n) for n in range(4)]
+    assert unsummarized_runs(older, None) == older
+    assert [r.run_id for r in unsummarized_runs(older, HistorySummary(text="s", run_id="run-1"))] == ["run-2", "run-3"]
+    assert unsummarized_runs(older, HistorySummary(text="s", run_id="run-3")) == []
+    # 摘要覆盖的运行已不在内存中
+    assert unsummarized_runs(older, HistorySummary(text="s", run_id="run-gone")) == older
+
+
+@pytest.fixture
+def agent():
+    runs = [make_run(n) for n in range(6)]
+    agent = OffloadedAgent(
+        history_token_budget=run_tokens(runs[0]) * 2,
+        agent_id="budget-test",
+        memory=Memory(),
+        add_history_to_messages=True,
+        num_history_runs=10,
+        telemetry=False,
+        monitoring=False,
+    )
+    agent.memory.runs = {SESSION_ID: runs}
+    return agent
+
+
+def build_run_messages(agent: OffloadedAgent) -> RunMessages:
+    # 与 agno 一致：系统消息、按时间顺序的历史消息、本次用户消息
+    system = Message(role="system", content="You are a bartender.")
+    history = [
+        Message(role=m.role, content=m.content, from_history=True)
+        for run in agent.memory.runs[SESSION_ID]
+        for m in history_messages(run)
+    ]
+    user = Message(role="user", content="new question")
+    return RunMessages(messages=[system, *history, user], system_message=system, user_message=user)
+
+
+def history_contents(run_messages: RunMessages):
+    return [m.content.split(" ")[1] for m in run_messages.messages if m.from_history]
+
+
+def test_budget_without_summary_keeps_every_run(agent):
+    run_messages = build_run_messages(agent)
+    agent._apply_history_budget(run_messages, SESSION_ID)
+    # 还没有摘要：超出预算的运行也不能丢
+    assert history_contents(run_messages) == [str(n) for n in range(6) for _ in range(2)]
+    assert "<summary_of_previous_interactions>" not in run_messages.system_message.content
+
+
+def test_budget_keeps_runs_not_yet_in_summary(agent):
+    agent._history_summary = HistorySummary(text="user likes gin", run_id="run-1")
+    run_messages = build_run_messages(agent)
+    agent._apply_history_budget(run_messages, SESSION_ID)
+    # run-0、run-1 已并入摘要；run-2、run-3 超出预算但尚未并入，原样保留
+    assert history_contents(run_messages) == [str(n) for n in range(2, 6) for _ in range(2)]
+    assert "user likes gin" in run_messages.system_message.content
+    assert run_messages.messages[-1].content == "new question"
+
+
+def test_budget_drops_runs_covered_by_summary(agent):
+    agent._history_summary = HistorySummary(text="user likes gin", run_id="run-3")
+    run_messages = build_run_messages(agent)
+    agent._apply_history_budget(run_messages, SESSION_ID)
+    assert history_contents(run_messages) == ["4", "4", "5", "5"]
+    assert "user likes gin" in run_messages.system_message.content
+
+
+def test_estimate_tokens_fallback(monkeypatch):
+    monkeypatch.setattr(token_counter, "_get_encoding", lambda: None)
+    assert estimate_tokens("") == 0
+    assert estimate_tokens(None) == 0
+    # 中日韩字符每字计 1，其余每 4 个字符计 1
+    assert estimate_tokens("你好世界") == 4
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("你好 abcd") == 2 + 2
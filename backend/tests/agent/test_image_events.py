@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from fastapi import FastAPI
+
+from backend.app.agent.api.v1.agents import agents_router
+from backend.app.agent.schema.cocktail_schema import CocktailImageSubject
+from backend.app.agent.schema.image_job_schema import ImageEvent, ImageEventStatus, ImageJobStatus
+from backend.app.agent.service.utils import image_events
+from backend.app.agent.service.utils.image_events import (
+    ImageEventHub,
+    image_event_channel,
+    publish_image_event,
+    wait_for_session_image,
+)
+from backend.app.agent.service.utils.image_queue import enqueue_image_job, get_image_job, save_image_job
+
+pytestmark = pytest.mark.anyio
+
+READY = ImageEvent(status=ImageEventStatus.READY, image_key="abc")
+
+
+@pytest.fixture
+async def hub(monkeypatch, fake_redis):
+    hub = ImageEventHub(reconnect_interval=0.05)
+    monkeypatch.setattr(image_events, "image_event_hub", hub)
+    yield hub
+    await hub.close()
+
+
+@pytest.fixture
+async def client(hub):
+    app = FastAPI()
+    app.include_router(agents_router)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_one_pattern_subscription_fans_out_to_session_waiters(hub):
+    first = await hub.subscribe(1, "s1", timeout=1)
+    second = await hub.subscribe(1, "s1", timeout=1)
+    other = await hub.subscribe(2, "s1", timeout=1)
+    task = hub._task
+
+    await publish_image_event(1, "s1", READY)
+    assert await asyncio.wait_for(first, 1) == READY
+    assert await asyncio.wait_for(second, 1) == READY
+    assert not other.done()
+    # 所有等待方共用同一个订阅
+    assert hub._task is task
+    assert image_event_channel(1, "s1") not in hub._waiters
+
+    await publish_image_event(2, "s1", READY)
+    assert await asyncio.wait_for(other, 1) == READY
+    for future in (first, second):
+        hub.unsubscribe(1, "s1", future)
+    hub.unsubscribe(2, "s1", other)
+    assert not hub._waiters
+
+
+async def test_malformed_event_is_ignored(hub, fake_redis):
+    future = await hub.subscribe(1, "s1", timeout=1)
+    await fake_redis[0].publish(image_event_channel(1, "s1"), "not json")
+    await asyncio.sleep(0.1)
+    assert not future.done()
+    hub.unsubscribe(1, "s1", future)
+
+
+async def test_wait_returns_published_event(hub):
+    async def publish_later():
+        await asyncio.sleep(0.1)
+        await publish_image_event(1, "s1", READY)
+
+    publisher = asyncio.create_task(publish_later())
+    start = time.monotonic()
+    event = await wait_for_session_image(1, "s1", timeout=5)
+    await publisher
+    assert event == READY
+    assert time.monotonic() - start < 1
+    assert not hub._waiters
+
+
+async def test_wait_returns_failed_job_without_waiting(hub):
+    job_id = await enqueue_image_job(CocktailImageSubject(name="莫吉托"), user_id=1, session_id="s1")
+    job = await get_image_job(job_id)
+    job.status = ImageJobStatus.FAILED
+    job.error = "upstream error"
+    await save_image_job(job)
+
+    start = time.monotonic()
+    event = await wait_for_session_image(1, "s1", timeout=5)
+    assert event == ImageEvent(status=ImageEventStatus.FAILED, error="upstream error")
+    assert time.monotonic() - start < 1
+
+
+async def test_wait_endpoint_times_out_with_pending(client, hub):
+    start = time.monotonic()
+    response = await client.get(
+        "/agents/cocktail_image/wait", params={"user_id": 1, "session_id": "s1", "timeout": 0.3}
+    )
+    elapsed = time.monotonic() - start
+    assert response.status_code == 200
+    assert response.json()["status"] == ImageEventStatus.PENDING
+    assert 0.3 <= elapsed < 2
+    assert not hub._waiters
+
+
+async def test_wait_endpoint_returns_ready_event_with_url(client, hub):
+    async def publish_later():
+        await asyncio.sleep(0.1)
+        await publish_image_event(1, "s1", READY)
+
+    publisher = asyncio.create_task(publish_later())
+    response = await client.get("/agents/cocktail_image/wait", params={"user_id": 1, "session_id": "s1", "timeout": 5})
+    await publisher
+    body = response.json()
+    assert body["status"] == ImageEventStatus.READY
+    assert body["image_key"] == "abc"
+    assert body["url"]
+
+
+async def test_wait_endpoint_rejects_timeout_above_limit(client):
+    response = await client.get(
+        "/agents/cocktail_image/wait", params={"user_id": 1, "session_id": "s1", "timeout": 10_000}
+    )
+    assert response.status_code == 422
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from backend.app.agent.schema.image_job_schema import ImageJobStatus
+from backend.app.agent.service.utils import image_pipeline
+from backend.app.agent.service.utils.image_pipeline import SpeculativeImageJob
+from backend.app.agent.service.utils.image_queue import (
+    IMAGE_JOB_QUEUE_KEY,
+    get_image_job,
+    get_session_image_job,
+    is_image_job_cancelled,
+)
+from backend.tests.agent.test_recommend_cocktail import COCKTAIL
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def calls(monkeypatch, fake_redis):
+    """记录提交和取消的先后顺序"""
+    calls = []
+
+    def record(name, func):
+        async def wrapper(*args, **kwargs):
+            result = await func(*args, **kwargs)
+            calls.append((name, result if name == "enqueue" else args[0]))
+            return result
+
+        monkeypatch.setattr(image_pipeline, f"{name}_image_job", wrapper)
+
+    record("enqueue", image_pipeline.enqueue_image_job)
+    record("cancel", image_pipeline.cancel_image_job)
+    return calls
+
+
+async def _stream(job: SpeculativeImageJob, **fields):
+    for name, value in fields.items():
+        await job.on_field(name, value)
+
+
+async def test_job_is_submitted_once_both_names_arrive(calls):
+    job = SpeculativeImageJob(user_id=1, session_id="s1")
+    await _stream(job, name="莫吉托")
+    assert calls == []
+    await _stream(job, english_name="Mojito", description="清爽")
+    assert [name for name, _ in calls] == ["enqueue"]
+    assert (await get_session_image_job(1, "s1")).cocktail.english_name == "Mojito"
+
+
+async def test_matching_cache_key_keeps_speculative_job(calls, fake_redis):
+    job = SpeculativeImageJob(user_id=1, session_id="s1")
+    # 中文名称不同但英文名称相同，生成规格一致
+    await _stream(job, name="薄荷莫吉托", english_name="Mojito")
+    await job.on_result(COCKTAIL)
+
+    assert [name for name, _ in calls] == ["enqueue"]
+    job_id = calls[0][1]
+    assert not await is_image_job_cancelled(job_id)
+    assert await fake_redis[0].lrange(IMAGE_JOB_QUEUE_KEY, 0, -1) == [job_id]
+
+
+async def test_mismatch_enqueues_new_job_before_cancelling_old(calls, fake_redis):
+    job = SpeculativeImageJob(user_id=1, session_id="s1")
+    await _stream(job, name="大吉利", english_name="Daiquiri")
+    await job.on_result(COCKTAIL)
+
+    (_, old_id), (_, new_id), (_, cancelled_id) = calls
+    assert [name for name, _ in calls] == ["enqueue", "enqueue", "cancel"]
+    assert cancelled_id == old_id != new_id
+    assert (await get_image_job(old_id)).status == ImageJobStatus.CANCELLED
+    assert (await get_session_image_job(1, "s1")).job_id == new_id
+    assert await fake_redis[0].lrange(IMAGE_JOB_QUEUE_KEY, 0, -1) == [new_id]
+
+
+async def test_result_without_speculation_submits_job(calls):
+    job = SpeculativeImageJob(user_id=1, session_id="s1")
+    await _stream(job, name="莫吉托")
+    await job.on_result(COCKTAIL)
+    assert [name for name, _ in calls] == ["enqueue"]
+
+
+async def test_discard_cancels_speculative_job(calls):
+    job = SpeculativeImageJob(user_id=1, session_id="s1")
+    await _stream(job, name="莫吉托", english_name="Mojito")
+    job.discard()
+    # 取消在后台任务中执行
+    await asyncio.gather(*image_pipeline._pending_cancels)
+
+    (_, job_id), cancel = calls
+    assert cancel == ("cancel", job_id)
+    assert await is_image_job_cancelled(job_id)
+    # 丢弃后不再提交新任务
+    await _stream(job, english_name="Daiquiri")
+    job.discard()
+    assert len(calls) == 2
+
+
+async def test_enqueue_failure_is_not_raised(calls, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(image_pipeline, "enqueue_image_job", broken)
+    job = SpeculativeImageJob(user_id=1, session_id="s1")
+    await _stream(job, name="莫吉托", english_name="Mojito")
+    await job.on_result(COCKTAIL)
+    job.discard()
+    assert calls == []
@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+
+from pathlib import Path
+
+from backend.app.agent.schema.cocktail_schema import CocktailImageSubject
+from backend.app.agent.service.utils.image_generator import (
+    IMAGE_SEED_MODULUS,
+    ImageGenerationSpec,
+    derive_image_seed,
+)
+from backend.core.conf import settings
+
+# backend 包所在目录
+REPO_ROOT = Path(__file__).resolve().parents[3]
+
+COCKTAILS = [
+    {"name": "莫吉托", "english_name": "Mojito"},
+    {"name": "玛格丽特", "english_name": "Margarita"},
+    {"name": "自创特调", "english_name": None},
+]
+
+_SCRIPT = """
+import json, sys
+from backend.app.agent.schema.cocktail_schema import CocktailImageSubject
+from backend.app.agent.service.utils.image_generator import ImageGenerationSpec
+specs = [ImageGenerationSpec.from_cocktail(CocktailImageSubject(**c)) for c in json.loads(sys.argv[1])]
+print(json.dumps([[s.seed, s.cache_key(), hash("Mojito")] for s in specs]))
+"""
+
+
+def _specs_in_subprocess(hash_seed: str):
+    env = {**os.environ, "PYTHONHASHSEED": hash_seed, "PYTHONPATH": str(REPO_ROOT)}
+    result = subprocess.run(
+        [sys.executable, "-c", _SCRIPT, json.dumps(COCKTAILS)],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_spec_is_identical_across_interpreters():
+    first = _specs_in_subprocess("1")
+    second = _specs_in_subprocess("2")
+    # 两个进程的内置 hash() 不同，说明字符串哈希确实被随机化
+    assert first[0][2] != second[0][2]
+    assert [row[:2] for row in first] == [row[:2] for row in second]
+
+    local = [ImageGenerationSpec.from_cocktail(CocktailImageSubject(**c)) for c in COCKTAILS]
+    assert [row[:2] for row in first] == [[s.seed, s.cache_key()] for s in local]
+
+
+def test_seed_ignores_case_width_and_whitespace():
+    seed = derive_image_seed("Mojito")
+    assert derive_image_seed("  MOJITO ") == seed
+    assert derive_image_seed("Ｍｏｊｉｔｏ") == seed
+    assert derive_image_seed("Margarita") != seed
+    assert 0 <= seed < IMAGE_SEED_MODULUS
+
+
+def test_seed_depends_on_key(monkeypatch):
+    seed = derive_image_seed("Mojito")
+    monkeypatch.setattr(settings, "IMAGE_SEED_KEY", "another-key")
+    assert derive_image_seed("Mojito") != seed
+
+
+def test_cache_key_covers_generation_parameters():
+    spec = ImageGenerationSpec.from_cocktail(CocktailImageSubject(name="莫吉托", english_name="Mojito"))
+    assert spec.cache_key() == spec.model_copy().cache_key()
+    assert spec.model_copy(update={"num_inference_steps": 30}).cache_key() != spec.cache_key()
+    assert spec.model_copy(update={"seed": spec.seed + 1}).cache_key() != spec.cache_key()
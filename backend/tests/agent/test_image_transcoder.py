@@ -0,0 +1,31 @@
+import io
+
+from PIL import Image
+
+from backend.app.agent.service.utils.image_transcoder import _transcode, supported_formats, variant_name
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 50, 80)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_webp_and_avif_are_supported():
+    assert set(supported_formats()) == {"webp", "avif"}
+
+
+def test_transcode_produces_every_size_and_format():
+    variants = _transcode(_png(512, 512), [128, 256], ["webp", "avif"], {"webp": 80, "avif": 60})
+    assert set(variants) == {variant_name(size, fmt) for size in (128, 256) for fmt in ("webp", "avif")}
+    for name, data in variants.items():
+        size, fmt = name.split(".")
+        with Image.open(io.BytesIO(data)) as image:
+            assert image.format == fmt.upper()
+            assert max(image.size) == int(size)
+
+
+def test_transcode_never_upscales():
+    variants = _transcode(_png(100, 50), [256], ["webp"], {"webp": 80})
+    with Image.open(io.BytesIO(variants[variant_name(256, "webp")])) as image:
+        assert image.size == (100, 50)
@@ -0,0 +1,218 @@
+import asyncio
+import contextlib
+import time
+
+import pytest
+
+from backend.app.agent.schema.cocktail_schema import CocktailImageSubject
+from backend.app.agent.schema.image_job_schema import ImageJobStatus
+from backend.app.agent.service.utils import image_generator, image_queue, image_store
+from backend.app.agent.service.utils.image_cold_store import DiskImageStore
+from backend.app.agent.service.utils.image_queue import (
+    IMAGE_JOB_DELAYED_KEY,
+    IMAGE_JOB_LEASES_KEY,
+    IMAGE_JOB_PROCESSING_KEY,
+    IMAGE_JOB_QUEUE_KEY,
+    backoff_seconds,
+    claim_image_job,
+    enqueue_image_job,
+    get_image_job,
+    requeue_expired_jobs,
+)
+from backend.app.agent.service.utils.image_store import get_session_image, get_session_image_key
+from backend.app.agent.worker.image_worker import ImageWorker
+from backend.core.conf import settings
+from backend.tests.stub_servers import PNG_BYTES, StubImageServer
+from backend.utils.http_client import http_clients
+
+pytestmark = pytest.mark.anyio
+
+COCKTAIL = CocktailImageSubject(name="莫吉托", english_name="Mojito")
+
+
+@pytest.fixture
+def image_server():
+    with StubImageServer() as server:
+        yield server
+
+
+@pytest.fixture
+async def worker_env(monkeypatch, fake_redis, tmp_path, image_server):
+    monkeypatch.setattr(settings, "SILICONFLOW_IMAGE_URL", image_server.generation_url)
+    monkeypatch.setattr(settings, "IMAGE_JOB_BACKOFF_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "IMAGE_JOB_CANCEL_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(image_store, "_cold_store", DiskImageStore(str(tmp_path)))
+
+    # 这里只验证队列和生成流程，跳过变体转码
+    async def no_variants(image_key, data):
+        return []
+
+    monkeypatch.setattr(image_generator, "store_image_variants", no_variants)
+    yield fake_redis[0]
+    await http_clients.close()
+
+
+@contextlib.asynccontextmanager
+async def running_worker(concurrency: int = 1):
+    worker = ImageWorker(concurrency=concurrency, maintenance_interval=0.05)
+
+    async def run():
+        await asyncio.gather(worker._maintain(), *(worker._consume() for _ in range(concurrency)))
+
+    task = asyncio.create_task(run())
+    try:
+        yield worker
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+async def wait_for_status(job_id: str, *statuses: ImageJobStatus, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await get_image_job(job_id)
+        if job is not None and job.status in statuses:
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not reach {statuses}: {await get_image_job(job_id)}")
+
+
+async def test_worker_claims_generates_and_acks(worker_env, image_server):
+    redis = worker_env
+    job_id = await enqueue_image_job(COCKTAIL, user_id=1, session_id="s1")
+
+    async with running_worker():
+        job = await wait_for_status(job_id, ImageJobStatus.SUCCEEDED)
+
+    assert job.attempts == 1
+    assert job.lease_until is None
+    assert await redis.llen(IMAGE_JOB_QUEUE_KEY) == 0
+    assert await redis.llen(IMAGE_JOB_PROCESSING_KEY) == 0
+    assert await redis.zcard(IMAGE_JOB_LEASES_KEY) == 0
+    assert image_server.count("POST") == 1
+    assert image_server.count("GET") == 1
+    # 种子由名称派生，生成请求可复现
+    assert image_server.requests[0]["body"]["seed"] == image_generator.derive_image_seed("Mojito")
+
+    image = await get_session_image(1, "s1")
+    assert image is not None
+    assert image.data == PNG_BYTES
+
+
+async def test_worker_retries_with_backoff(worker_env, image_server, monkeypatch):
+    redis = worker_env
+    monkeypatch.setattr(settings, "IMAGE_JOB_BACKOFF_SECONDS", 0.3)
+    image_server.fail_first = 1
+    job_id = await enqueue_image_job(COCKTAIL, user_id=1, session_id="s2")
+
+    async with running_worker():
+        retrying = await wait_for_status(job_id, ImageJobStatus.RETRYING)
+        assert retrying.attempts == 1
+        assert retrying.error
+        # 退避期间任务在延迟队列中，不在待处理或处理中队列里
+        assert await redis.zscore(IMAGE_JOB_DELAYED_KEY, job_id) > time.time()
+        assert await redis.llen(IMAGE_JOB_QUEUE_KEY) == 0
+        assert await redis.llen(IMAGE_JOB_PROCESSING_KEY) == 0
+        job = await wait_for_status(job_id, ImageJobStatus.SUCCEEDED)
+
+    assert job.attempts == 2
+    posts = [r for r in image_server.requests if r["method"] == "POST"]
+    assert len(posts) == 2
+    # 抖动下限为退避时间的 0.8 倍
+    assert posts[1]["at"] - posts[0]["at"] >= 0.3 * 0.8
+    assert await get_session_image_key(1, "s2") is not None
+
+
+async def test_worker_gives_up_after_max_attempts(worker_env, image_server, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_JOB_MAX_ATTEMPTS", 2)
+    image_server.fail_first = 10
+    job_id = await enqueue_image_job(COCKTAIL, user_id=1, session_id="s3")
+
+    async with running_worker():
+        job = await wait_for_status(job_id, ImageJobStatus.FAILED)
+
+    assert job.attempts == 2
+    assert image_server.count("POST") == 2
+    assert await worker_env.zcard(IMAGE_JOB_DELAYED_KEY) == 0
+    assert await get_session_image_key(1, "s3") is None
+
+
+def test_backoff_grows_exponentially_and_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_JOB_BACKOFF_SECONDS", 2.0)
+    monkeypatch.setattr(settings, "IMAGE_JOB_BACKOFF_MAX_SECONDS", 10.0)
+    for attempts, base in [(1, 2.0), (2, 4.0), (3, 8.0), (4, 10.0), (10, 10.0)]:
+        delay = backoff_seconds(attempts)
+        assert base * 0.8 <= delay <= base * 1.2
+
+
+async def test_expired_lease_is_requeued_and_completed(worker_env, image_server):
+    redis = worker_env
+    job_id = await enqueue_image_job(COCKTAIL, user_id=1, session_id="s4")
+
+    # 模拟 worker 领取任务后崩溃：任务留在处理中列表，租约到期
+    job = await claim_image_job(timeout=1)
+    assert job is not None
+    assert job.job_id == job_id
+    assert await redis.lrange(IMAGE_JOB_PROCESSING_KEY, 0, -1) == [job_id]
+    # 租约与领取同时写入
+    assert await redis.zscore(IMAGE_JOB_LEASES_KEY, job_id) == job.lease_until
+    assert await requeue_expired_jobs() == 0
+
+    await redis.zadd(IMAGE_JOB_LEASES_KEY, {job_id: time.time() - 1})
+    assert await requeue_expired_jobs() == 1
+    requeued = await get_image_job(job_id)
+    assert requeued.status == ImageJobStatus.QUEUED
+    assert requeued.lease_until is None
+    assert await redis.lrange(IMAGE_JOB_QUEUE_KEY, 0, -1) == [job_id]
+    assert await redis.llen(IMAGE_JOB_PROCESSING_KEY) == 0
+    assert await redis.zcard(IMAGE_JOB_LEASES_KEY) == 0
+
+    async with running_worker():
+        job = await wait_for_status(job_id, ImageJobStatus.SUCCEEDED)
+
+    assert job.attempts == 2
+    assert image_server.count("POST") == 1
+    assert await get_session_image_key(1, "s4") is not None
+
+
+async def test_processing_job_without_lease_is_requeued(worker_env):
+    redis = worker_env
+    job_id = await enqueue_image_job(COCKTAIL, user_id=1, session_id="s6")
+    # 旧版本的 worker 在取出任务和写入租约之间崩溃，任务留在处理中列表且没有租约
+    await redis.lmove(IMAGE_JOB_QUEUE_KEY, IMAGE_JOB_PROCESSING_KEY, "RIGHT", "LEFT")
+
+    assert await requeue_expired_jobs() == 1
+    assert await redis.lrange(IMAGE_JOB_QUEUE_KEY, 0, -1) == [job_id]
+    assert await redis.llen(IMAGE_JOB_PROCESSING_KEY) == 0
+    assert (await get_image_job(job_id)).status == ImageJobStatus.QUEUED
+
+
+async def test_heartbeat_keeps_long_job_from_being_requeued(worker_env, image_server, monkeypatch):
+    redis = worker_env
+    monkeypatch.setattr(settings, "IMAGE_JOB_LEASE_SECONDS", 0.3)
+    monkeypatch.setattr(settings, "IMAGE_JOB_HEARTBEAT_SECONDS", 0.05)
+    # 生成耗时远超租约时间
+    image_server.delay = 1.0
+    job_id = await enqueue_image_job(COCKTAIL, user_id=1, session_id="s7")
+
+    async with running_worker(concurrency=2):
+        running = await wait_for_status(job_id, ImageJobStatus.RUNNING)
+        await asyncio.sleep(0.5)
+        assert await redis.zscore(IMAGE_JOB_LEASES_KEY, job_id) > running.lease_until
+        job = await wait_for_status(job_id, ImageJobStatus.SUCCEEDED)
+
+    assert job.attempts == 1
+    assert image_server.count("POST") == 1
+
+
+async def test_cancelled_job_is_skipped(worker_env, image_server):
+    job_id = await enqueue_image_job(COCKTAIL, user_id=1, session_id="s5")
+    await image_queue.cancel_image_job(job_id)
+
+    async with running_worker():
+        await asyncio.sleep(0.2)
+
+    job = await get_image_job(job_id)
+    assert job.status == ImageJobStatus.CANCELLED
+    assert image_server.count("POST") == 0
@@ -0,0 +1,122 @@
+import asyncio
+
+import httpx
+import pytest
+
+from fastapi import FastAPI, HTTPException
+
+from backend.app.agent.api.v1 import agents
+from backend.app.agent.schema.agent_request_schema import BartenderRequest
+from backend.app.agent.schema.cocktail_schema import CocktailRecommendation, Ingredient, Step, Tool
+from backend.app.agent.service.utils.recommendation_cache import is_recommendation_cache_enabled
+from backend.core.conf import settings
+
+pytestmark = pytest.mark.anyio
+
+AGENT_NAME = "classic_bartender"
+
+COCKTAIL = CocktailRecommendation(
+    name="莫吉托",
+    english_name="Mojito",
+    description="清爽的薄荷朗姆酒",
+    match_reason="适合夏天",
+    base_spirit="朗姆酒",
+    alcohol_level="低",
+    flavor_profiles=["清爽"],
+    ingredients=[Ingredient(name="白朗姆酒", amount="45", unit="ml")],
+    steps=[Step(step_number=1, description="捣碎薄荷")],
+    tools=[Tool(name="量酒器")],
+    serving_glass="高球杯",
+)
+
+
+class FakeRequest:
+    def __init__(self, disconnected: bool = False):
+        self.disconnected = disconnected
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+class FakeAgent:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+
+
+@pytest.fixture
+def pipeline(monkeypatch, fake_redis):
+    """调酒师流水线替身：断开的请求运行一段时间后被取消，其余请求得到推荐"""
+    monkeypatch.setattr(settings, "BARTENDER_IMAGE_PIPELINE", True)
+    monkeypatch.setattr(settings, "BARTENDER_CACHE_ENABLED", True)
+
+    async def no_grid(agent_name, body):
+        return None
+
+    async def no_similar(agent_name, body, message):
+        return None, None
+
+    cached_sessions = []
+
+    async def use_cached(agent, message, cocktail, user_id, session_id):
+        cached_sessions.append(session_id)
+
+    runs = []
+
+    async def run_pipeline(agent, message, request, user_id, session_id, agent_name):
+        runs.append(session_id)
+        await asyncio.sleep(0.1)
+        if await request.is_disconnected():
+            raise HTTPException(status_code=500, detail=f"{agent_name} failed to produce a recommendation")
+        return COCKTAIL
+
+    monkeypatch.setattr(agents, "find_grid_recommendation", no_grid)
+    monkeypatch.setattr(agents, "find_similar_recommendation", no_similar)
+    monkeypatch.setattr(agents, "_use_cached_recommendation", use_cached)
+    monkeypatch.setattr(agents, "run_bartender_pipeline", run_pipeline)
+    return runs, cached_sessions
+
+
+async def recommend(session_id: str, request: FakeRequest):
+    body = BartenderRequest(message="清爽一点", user_id=session_id, session_id=session_id)
+    return await agents.recommend_cocktail(FakeAgent(session_id), "prompt", body, request, AGENT_NAME)
+
+
+async def test_waiters_share_the_leader_run(pipeline):
+    runs, cached_sessions = pipeline
+    results = await asyncio.gather(*(recommend(f"s{i}", FakeRequest()) for i in range(3)))
+
+    assert all(result == COCKTAIL for result in results)
+    assert runs == ["s0"]
+    assert sorted(cached_sessions) == ["s1", "s2"]
+
+
+async def test_waiters_run_locally_when_leader_disconnects(pipeline):
+    runs, cached_sessions = pipeline
+    leader = asyncio.create_task(recommend("s0", FakeRequest(disconnected=True)))
+    await asyncio.sleep(0.01)
+    waiters = [asyncio.create_task(recommend(f"s{i}", FakeRequest())) for i in (1, 2)]
+
+    with pytest.raises(HTTPException) as exc_info:
+        await leader
+    assert "client disconnected" in exc_info.value.detail
+    results = await asyncio.gather(*waiters)
+
+    assert all(result == COCKTAIL for result in results)
+    # 第一个等待者以自己的会话重新运行，另一个等待者合并到这次运行
+    assert runs == ["s0", "s1"]
+    assert cached_sessions == ["s2"]
+
+
+async def test_opt_out_matches_body_user_id_regardless_of_padding(monkeypatch, fake_redis):
+    monkeypatch.setattr(settings, "BARTENDER_CACHE_ENABLED", True)
+    app = FastAPI()
+    app.include_router(agents.agents_router)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.put("/agents/recommendation_cache/opt_out", params={"user_id": "007"})
+        assert response.json() == {"user_id": 7, "opted_out": True}
+        rejected = await client.put("/agents/recommendation_cache/opt_out", params={"user_id": "abc"})
+        assert rejected.status_code == 422
+
+    assert not await is_recommendation_cache_enabled("7")
+    assert not await is_recommendation_cache_enabled("007")
+    assert await is_recommendation_cache_enabled("8")
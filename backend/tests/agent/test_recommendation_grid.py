@@ -0,0 +1,260 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from backend.app.agent.schema.agent_request_schema import (
+    AlcoholLevel,
+    BartenderRequest,
+    DifficultyLevel,
+    ModelName,
+)
+from backend.app.agent.service.utils import recommendation_grid
+from backend.app.agent.service.utils.recommendation_grid import (
+    GRID_BASE_SPIRITS,
+    MOOD_BUCKETS,
+    RECOMMENDATION_GRID_PREFIX,
+    find_grid_recommendation,
+    get_grid_entry,
+    grid_cell_for_request,
+    iter_grid_cells,
+    match_mood_bucket,
+)
+from backend.core.conf import settings
+from backend.tests.agent.test_recommend_cocktail import COCKTAIL
+
+pytestmark = pytest.mark.anyio
+
+AGENT_NAME = "classic_bartender"
+
+
+def grid_request(message: str = "开心", **options) -> BartenderRequest:
+    options.setdefault("has_tools", True)
+    return BartenderRequest(message=message, **options)
+
+
+def write_entry(client, cell, generated_at: float):
+    entry = {"recommendation": COCKTAIL.model_dump(mode="json"), "generated_at": generated_at}
+    return client.set(cell.key, json.dumps(entry, ensure_ascii=False))
+
+
+@pytest.mark.parametrize(
+    "message, expected",
+    [
+        ("开心", "happy"),
+        ("今天很高兴！", "happy"),
+        ("ＨＡＰＰＹ", "happy"),
+        # 长关键词优先，“不开心”不会同时命中“开心”
+        ("不开心", "sad"),
+        ("心情不好", "sad"),
+        ("压力好大", "stressed"),
+        ("好累啊", "tired"),
+        ("今晚约会", "romantic"),
+        ("生日派对", "celebrate"),
+        ("想安静一下", "calm"),
+    ],
+)
+def test_match_mood_bucket(message, expected):
+    assert match_mood_bucket(message).name == expected
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "",
+        "   ",
+        "来一杯",
+        # 同时命中两个分类时交给 agent
+        "开心但是很累",
+        # 较长的需求通常带有具体要求
+        "开心" + "，想要一杯带有柑橘和薄荷味道的酒" * 2,
+    ],
+)
+def test_match_mood_bucket_rejects(message):
+    assert match_mood_bucket(message) is None
+
+
+def test_bucket_prompts_match_their_own_bucket():
+    # 预生成时用 prompt 作为用户需求，它必须落回同一个分类
+    for bucket in MOOD_BUCKETS:
+        assert match_mood_bucket(bucket.prompt) is bucket
+
+
+def test_grid_cell_keys_cover_the_option_space():
+    cells = list(iter_grid_cells(AGENT_NAME))
+    expected = len(MOOD_BUCKETS) * len(AlcoholLevel) * len(DifficultyLevel) * 2 * (len(GRID_BASE_SPIRITS) + 1)
+    assert len(cells) == expected
+    assert len({cell.key for cell in cells}) == expected
+    assert all(
+        cell.key.startswith(f"{RECOMMENDATION_GRID_PREFIX}:{AGENT_NAME}:{settings.BARTENDER_GRID_MODEL}:")
+        for cell in cells
+    )
+
+
+def test_grid_cell_key_layout():
+    cell = grid_cell_for_request(
+        AGENT_NAME,
+        grid_request(
+            "开心",
+            alcohol_level=AlcoholLevel.LOW,
+            difficulty_level=DifficultyLevel.HARD,
+            has_tools=False,
+            base_spirits=["Gin"],
+        ),
+    )
+    assert (
+        cell.key
+        == f"{RECOMMENDATION_GRID_PREFIX}:{AGENT_NAME}:{settings.BARTENDER_GRID_MODEL}:happy:low:hard:no_tools:gin"
+    )
+
+
+def test_every_cell_round_trips_through_its_request():
+    # 预生成写入的格子必须与用户以相同选项请求时查找的格子一致
+    for agent_name in ("classic_bartender", "creative_bartender"):
+        for cell in iter_grid_cells(agent_name):
+            assert grid_cell_for_request(agent_name, cell.to_request()) == cell
+
+
+@pytest.mark.parametrize(
+    "base_spirits, expected",
+    [
+        (None, "any"),
+        ([], "any"),
+        (["all"], "any"),
+        ([" "], "any"),
+        (list(GRID_BASE_SPIRITS), "any"),
+        (["RUM"], "rum"),
+        (["rum", "all"], "rum"),
+    ],
+)
+def test_base_spirits_map_to_a_cell(base_spirits, expected):
+    cell = grid_cell_for_request(AGENT_NAME, grid_request(base_spirits=base_spirits))
+    assert cell.base_spirit == expected
+
+
+@pytest.mark.parametrize(
+    "agent_name, body",
+    [
+        ("casual_chat", grid_request()),
+        (AGENT_NAME, grid_request(model=ModelName.DEEPSEEK_R1)),
+        (AGENT_NAME, grid_request(has_tools=None)),
+        (AGENT_NAME, grid_request(base_spirits=["gin", "rum"])),
+        (AGENT_NAME, grid_request(base_spirits=["sake"])),
+        (AGENT_NAME, grid_request("来一杯金汤力")),
+    ],
+)
+def test_requests_outside_the_grid(agent_name, body):
+    assert grid_cell_for_request(agent_name, body) is None
+
+
+def test_missing_options_fall_back_to_any():
+    cell = grid_cell_for_request(AGENT_NAME, grid_request(alcohol_level=None, difficulty_level=None))
+    assert (cell.alcohol_level, cell.difficulty_level) == (AlcoholLevel.ANY, DifficultyLevel.ANY)
+
+
+@pytest.fixture
+def refreshes(monkeypatch, fake_redis):
+    """替换 agent 生成：记录刷新次数，刷新耗时一段时间，可以设置为失败"""
+    monkeypatch.setattr(settings, "BARTENDER_GRID_ENABLED", True)
+    monkeypatch.setattr(settings, "BARTENDER_GRID_REFRESH", True)
+    calls = []
+    state = {"fail": False}
+
+    async def generate(cell):
+        calls.append(cell.key)
+        await asyncio.sleep(0.05)
+        if state["fail"]:
+            raise ValueError("upstream failed")
+        await write_entry(fake_redis[0], cell, time.time())
+        return COCKTAIL
+
+    monkeypatch.setattr(recommendation_grid, "generate_grid_cell", generate)
+    return calls, state
+
+
+async def wait_for_refreshes():
+    await asyncio.gather(*list(recommendation_grid._refresh_tasks))
+
+
+async def test_missing_cell_is_a_miss(refreshes):
+    calls, _ = refreshes
+    assert await find_grid_recommendation(AGENT_NAME, grid_request()) is None
+    await wait_for_refreshes()
+    assert calls == []
+
+
+async def test_fresh_cell_is_served_without_refresh(refreshes, fake_redis):
+    calls, _ = refreshes
+    body = grid_request()
+    await write_entry(fake_redis[0], grid_cell_for_request(AGENT_NAME, body), time.time())
+
+    assert await find_grid_recommendation(AGENT_NAME, body) == COCKTAIL
+    await wait_for_refreshes()
+    assert calls == []
+
+
+async def test_stale_cell_is_served_and_refreshed_once(refreshes, fake_redis):
+    calls, _ = refreshes
+    body = grid_request()
+    cell = grid_cell_for_request(AGENT_NAME, body)
+    stale = time.time() - settings.BARTENDER_GRID_STALE_SECONDS - 1
+    await write_entry(fake_redis[0], cell, stale)
+
+    # 并发的请求都立即拿到过期的推荐，只有拿到锁的请求在后台刷新
+    results = await asyncio.gather(*(find_grid_recommendation(AGENT_NAME, body) for _ in range(10)))
+    assert results == [COCKTAIL] * 10
+    await wait_for_refreshes()
+
+    assert calls == [cell.key]
+    _, generated_at = await get_grid_entry(cell)
+    assert generated_at > stale
+    # 锁保留到超时，刷新后短时间内不会再次刷新
+    ttl = await fake_redis[0].ttl(f"{RECOMMENDATION_GRID_PREFIX}_refresh:{cell.key}")
+    assert 0 < ttl <= settings.BARTENDER_GRID_REFRESH_LOCK_SECONDS
+
+
+async def test_failed_refresh_releases_the_lock(refreshes, fake_redis):
+    calls, state = refreshes
+    body = grid_request()
+    cell = grid_cell_for_request(AGENT_NAME, body)
+    await write_entry(fake_redis[0], cell, time.time() - settings.BARTENDER_GRID_STALE_SECONDS - 1)
+    state["fail"] = True
+
+    assert await find_grid_recommendation(AGENT_NAME, body) == COCKTAIL
+    await wait_for_refreshes()
+    assert not await fake_redis[0].exists(f"{RECOMMENDATION_GRID_PREFIX}_refresh:{cell.key}")
+
+    # 下一次请求重新尝试刷新
+    state["fail"] = False
+    assert await find_grid_recommendation(AGENT_NAME, body) == COCKTAIL
+    await wait_for_refreshes()
+    assert calls == [cell.key, cell.key]
+
+
+async def test_stale_cell_without_refresh(refreshes, fake_redis, monkeypatch):
+    calls, _ = refreshes
+    monkeypatch.setattr(settings, "BARTENDER_GRID_REFRESH", False)
+    body = grid_request()
+    await write_entry(fake_redis[0], grid_cell_for_request(AGENT_NAME, body), 0)
+
+    assert await find_grid_recommendation(AGENT_NAME, body) == COCKTAIL
+    await wait_for_refreshes()
+    assert calls == []
+
+
+async def test_incompatible_entry_is_dropped(refreshes, fake_redis):
+    body = grid_request()
+    cell = grid_cell_for_request(AGENT_NAME, body)
+    await fake_redis[0].set(cell.key, json.dumps({"recommendation": {"name": "旧格式"}, "generated_at": time.time()}))
+
+    assert await find_grid_recommendation(AGENT_NAME, body) is None
+    assert not await fake_redis[0].exists(cell.key)
+
+
+async def test_disabled_grid(refreshes, fake_redis, monkeypatch):
+    body = grid_request()
+    await write_entry(fake_redis[0], grid_cell_for_request(AGENT_NAME, body), time.time())
+    monkeypatch.setattr(settings, "BARTENDER_GRID_ENABLED", False)
+
+    assert await find_grid_recommendation(AGENT_NAME, body) is None
@@ -0,0 +1,183 @@
+import contextlib
+
+import numpy as np
+import pytest
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import TextClause
+
+from backend.app.agent.model import BartenderSemanticCache
+from backend.app.agent.schema.agent_request_schema import AlcoholLevel, BartenderRequest
+from backend.app.agent.service.utils import semantic_cache
+from backend.app.agent.service.utils.local_embedder import HashingEmbedder
+from backend.app.agent.service.utils.semantic_cache import (
+    find_similar_recommendation,
+    get_semantic_cache_embedder,
+    nearest_entry_query,
+    store_similar_recommendation,
+)
+from backend.core.conf import settings
+from backend.tests.agent.test_recommend_cocktail import COCKTAIL
+
+pytestmark = pytest.mark.anyio
+
+AGENT_NAME = "classic_bartender"
+
+
+class FakeSession:
+    """
+    按 nearest_entry_query 的语义在内存中检索的会话替身
+
+    只实现语义缓存用到的 add / flush / execute，删除和更新语句只做记录。
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.statements = []
+        self._next_id = 1
+
+    def add(self, entry):
+        entry.id = self._next_id
+        self._next_id += 1
+        self.entries.append(entry)
+
+    async def flush(self):
+        pass
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        if isinstance(statement, tuple):
+            agent_name, options_hash, embedding = statement
+            candidates = [e for e in self.entries if e.agent == agent_name and e.options_hash == options_hash]
+            rows = [FakeRow(e.id, e.recommendation, 1 - float(np.dot(e.embedding, embedding))) for e in candidates]
+            return FakeResult(sorted(rows, key=lambda r: r.distance))
+        return FakeResult([])
+
+    @contextlib.asynccontextmanager
+    async def begin(self):
+        yield self
+
+
+class FakeRow:
+    def __init__(self, id, recommendation, distance):
+        self.id = id
+        self.recommendation = recommendation
+        self.distance = distance
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+
+@pytest.fixture
+def local_cache(monkeypatch):
+    monkeypatch.setattr(settings, "BARTENDER_SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "BARTENDER_SEMANTIC_CACHE_EMBEDDER", "local")
+    get_semantic_cache_embedder.cache_clear()
+    session = FakeSession()
+    monkeypatch.setattr(semantic_cache, "async_db_session", session)
+    # 检索语句本身由 test_lookup_orders_by_cosine_distance_over_hnsw 验证，这里交给会话替身在内存中执行
+    monkeypatch.setattr(semantic_cache, "nearest_entry_query", lambda *args: args)
+    yield session
+    get_semantic_cache_embedder.cache_clear()
+
+
+def request(message: str, **options) -> BartenderRequest:
+    return BartenderRequest(message=message, user_id="u1", session_id="s1", **options)
+
+
+def cosine(a, b) -> float:
+    return float(np.dot(a, b))
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embedder = HashingEmbedder(dimensions=256)
+    vector = embedder.get_embedding("想喝点清爽的")
+    assert len(vector) == 256
+    assert np.linalg.norm(vector) == pytest.approx(1.0)
+    assert HashingEmbedder(dimensions=256).get_embedding("想喝点清爽的") == vector
+    # 大小写和空白规范化后相同
+    assert embedder.get_embedding("Light  and Fresh") == embedder.get_embedding("light and fresh")
+    assert embedder.get_embedding("") == [0.0] * 256
+
+
+def test_hashing_embedder_separates_near_duplicates_from_other_requests():
+    embedder = HashingEmbedder(dimensions=settings.BARTENDER_SEMANTIC_CACHE_DIMENSIONS)
+    base = embedder.get_embedding(request("想喝点清爽的").get_user_prompt())
+    near = embedder.get_embedding(request("想喝点清爽的。").get_user_prompt())
+    other = embedder.get_embedding(request("来一杯浓烈的威士忌鸡尾酒").get_user_prompt())
+    assert cosine(base, near) >= settings.BARTENDER_SEMANTIC_CACHE_THRESHOLD
+    assert cosine(base, other) < settings.BARTENDER_SEMANTIC_CACHE_THRESHOLD
+
+
+def test_local_embedder_is_selected_by_settings(monkeypatch):
+    monkeypatch.setattr(settings, "BARTENDER_SEMANTIC_CACHE_EMBEDDER", "local")
+    get_semantic_cache_embedder.cache_clear()
+    try:
+        embedder = get_semantic_cache_embedder()
+    finally:
+        get_semantic_cache_embedder.cache_clear()
+    assert isinstance(embedder, HashingEmbedder)
+    assert embedder.dimensions == settings.BARTENDER_SEMANTIC_CACHE_DIMENSIONS
+
+
+def test_lookup_orders_by_cosine_distance_over_hnsw():
+    query = nearest_entry_query(AGENT_NAME, "hash", [0.0] * settings.BARTENDER_SEMANTIC_CACHE_DIMENSIONS)
+    assert isinstance(query, Select)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+    assert "bartender_semantic_cache.agent = " in sql
+    assert "bartender_semantic_cache.options_hash = " in sql
+    assert "bartender_semantic_cache.created_time >= " in sql
+    assert "ORDER BY bartender_semantic_cache.embedding <=> " in sql
+
+    indexes = {index.name: index for index in BartenderSemanticCache.__table__.indexes}
+    hnsw = indexes["ix_bartender_semantic_cache_embedding"]
+    assert hnsw.dialect_options["postgresql"]["using"] == "hnsw"
+    assert hnsw.dialect_options["postgresql"]["ops"] == {"embedding": "vector_cosine_ops"}
+
+
+async def test_lookup_enables_iterative_scan(local_cache):
+    body = request("想喝点清爽的")
+    await find_similar_recommendation(AGENT_NAME, body, body.get_user_prompt())
+    options = [str(statement) for statement in local_cache.statements if isinstance(statement, TextClause)]
+    assert options == [
+        f"SET LOCAL hnsw.ef_search = {settings.BARTENDER_SEMANTIC_CACHE_EF_SEARCH}",
+        "SET LOCAL hnsw.iterative_scan = strict_order",
+        f"SET LOCAL hnsw.max_scan_tuples = {settings.BARTENDER_SEMANTIC_CACHE_MAX_SCAN_TUPLES}",
+    ]
+
+
+async def test_similar_prompt_hits_and_other_prompt_misses(local_cache):
+    body = request("想喝点清爽的")
+    cocktail, embedding = await find_similar_recommendation(AGENT_NAME, body, body.get_user_prompt())
+    assert cocktail is None
+    assert embedding is not None
+    await store_similar_recommendation(AGENT_NAME, body, body.get_user_prompt(), embedding, COCKTAIL)
+    assert len(local_cache.entries) == 1
+
+    near = request("想喝点清爽的。")
+    cocktail, _ = await find_similar_recommendation(AGENT_NAME, near, near.get_user_prompt())
+    assert cocktail == COCKTAIL
+
+    other = request("来一杯浓烈的威士忌鸡尾酒")
+    cocktail, embedding = await find_similar_recommendation(AGENT_NAME, other, other.get_user_prompt())
+    assert cocktail is None
+    assert embedding is not None
+
+
+async def test_different_options_never_hit(local_cache):
+    body = request("想喝点清爽的")
+    _, embedding = await find_similar_recommendation(AGENT_NAME, body, body.get_user_prompt())
+    await store_similar_recommendation(AGENT_NAME, body, body.get_user_prompt(), embedding, COCKTAIL)
+
+    # 提示完全相同，但选项不同
+    strong = request("想喝点清爽的", alcohol_level=AlcoholLevel.HIGH)
+    cocktail, _ = await find_similar_recommendation(AGENT_NAME, strong, body.get_user_prompt())
+    assert cocktail is None
+    cocktail, _ = await find_similar_recommendation("creative_bartender", body, body.get_user_prompt())
+    assert cocktail is None
@@ -0,0 +1,227 @@
+import asyncio
+import threading
+
+import pytest
+
+from agno.memory.v2.memory import Memory
+from agno.models.message import Message
+from agno.run.response import RunResponse
+from agno.storage.session.agent import AgentSession
+
+from backend.app.agent.schema.agent_request_schema import AgentType
+from backend.app.agent.service.agents.offloaded_agent import OffloadedAgent
+from backend.app.agent.service.utils import session_store
+from backend.app.agent.service.utils.session_store import WriteBehindAgentStorage
+
+pytestmark = pytest.mark.anyio
+
+SESSION_ID = "session-1"
+
+
+def make_run(n: int) -> RunResponse:
+    return RunResponse(
+        run_id=f"run-{n}",
+        session_id=SESSION_ID,
+        messages=[Message(role="user", content=f"question {n}"), Message(role="assistant", content=f"answer {n}")],
+    )
+
+
+def make_session(*runs: RunResponse, session_id: str = SESSION_ID) -> AgentSession:
+    return AgentSession(
+        session_id=session_id,
+        agent_id="agent",
+        user_id="user",
+        memory={"runs": [run.to_dict() for run in runs]},
+        session_data={"session_name": "test"},
+    )
+
+
+async def cached_run_ids(storage: WriteBehindAgentStorage, session_id: str = SESSION_ID):
+    _, runs_key, _ = storage._keys(session_id)
+    return [
+        session_store.msgspec.json.decode(run)["run_id"]
+        for run in await session_store.redis_client.lrange(runs_key, 0, -1)
+    ]
+
+
+async def dirty_sessions(storage: WriteBehindAgentStorage):
+    return await session_store.redis_client.zrange(storage._dirty_key, 0, -1)
+
+
+async def test_write_behind_append_to_cached_session(session_storage_factory):
+    storage, postgres = session_storage_factory()
+    await storage.aupsert(make_session(make_run(0)))
+    await storage.aappend(make_session(), [make_run(1)])
+
+    assert await cached_run_ids(storage) == ["run-0", "run-1"]
+    assert postgres.rows == {}
+    session, window = await storage.aread_window(SESSION_ID)
+    assert [run.run_id for run in window] == ["run-0", "run-1"]
+
+
+async def test_write_behind_append_after_expiry_rehydrates_from_postgres(session_storage_factory, fake_redis):
+    storage, postgres = session_storage_factory()
+    postgres.upsert(make_session(make_run(0), make_run(1)))
+    postgres.writes.clear()
+
+    # Redis 中的会话已过期，只追加会得到只含新运行的列表，写回时覆盖 Postgres 中更早的运行
+    await storage.aappend(make_session(), [make_run(2)])
+    assert await cached_run_ids(storage) == ["run-0", "run-1", "run-2"]
+    assert await dirty_sessions(storage) == [SESSION_ID]
+
+    assert await storage.flush(10) == 1
+    assert postgres.run_ids() == ["run-0", "run-1", "run-2"]
+
+
+async def test_write_behind_append_to_new_session(session_storage_factory):
+    storage, postgres = session_storage_factory()
+    await storage.aappend(make_session(), [make_run(0)])
+    await storage.flush(10)
+    assert postgres.run_ids() == ["run-0"]
+
+
+async def test_sync_append_after_expiry_caches_the_full_session(session_storage_factory):
+    storage, postgres = session_storage_factory(durability="sync")
+    postgres.upsert(make_session(make_run(0), make_run(1)))
+
+    await storage.aappend(make_session(), [make_run(2)])
+
+    assert postgres.run_ids() == ["run-0", "run-1", "run-2"]
+    assert await cached_run_ids(storage) == ["run-0", "run-1", "run-2"]
+    assert await dirty_sessions(storage) == []
+
+
+async def test_durability_is_configured_per_agent(session_storage_factory):
+    sync_storage, sync_postgres = session_storage_factory(AgentType.CLASSIC_BARTENDER, durability="sync")
+    behind_storage, behind_postgres = session_storage_factory(AgentType.CREATIVE_BARTENDER, durability="write_behind")
+
+    for storage in (sync_storage, behind_storage):
+        await storage.aupsert(make_session(make_run(0)))
+        await storage.aappend(make_session(), [make_run(1)])
+
+    # sync 写入后 Postgres 立即可见，不进入待写入队列
+    assert sync_postgres.run_ids() == ["run-0", "run-1"]
+    assert await dirty_sessions(sync_storage) == []
+    # write_behind 只写入 Redis，批量写入后才进入 Postgres
+    assert behind_postgres.rows == {}
+    assert await dirty_sessions(behind_storage) == [SESSION_ID]
+    assert await behind_storage.flush(10) == 1
+    assert behind_postgres.run_ids() == ["run-0", "run-1"]
+
+
+async def test_flush_coalesces_updates_to_a_session(session_storage_factory):
+    storage, postgres = session_storage_factory()
+    await storage.aupsert(make_session())
+    for n in range(5):
+        await storage.aappend(make_session(), [make_run(n)])
+    await storage.aappend(make_session(session_id="session-2"), [make_run(0)])
+
+    assert sorted(await dirty_sessions(storage)) == [SESSION_ID, "session-2"]
+    assert await storage.flush(10) == 2
+    # 两个会话的所有更新在一个事务中写入，每个会话只写一次
+    assert [sorted(batch) for batch in postgres.writes] == [[SESSION_ID, "session-2"]]
+    assert postgres.run_ids() == [f"run-{n}" for n in range(5)]
+    assert await dirty_sessions(storage) == []
+    assert await storage.flush(10) == 0
+
+
+async def test_flush_respects_the_batch_limit(session_storage_factory):
+    storage, postgres = session_storage_factory()
+    for n in range(5):
+        await storage.aappend(make_session(session_id=f"session-{n}"), [make_run(0)])
+
+    assert await storage.flush(2) == 2
+    assert await storage.flush(2) == 2
+    assert await storage.flush(2) == 1
+    assert [len(batch) for batch in postgres.writes] == [2, 2, 1]
+
+
+async def test_update_during_flush_stays_dirty(session_storage_factory):
+    storage, postgres = session_storage_factory()
+    await storage.aappend(make_session(), [make_run(0)])
+    postgres.flush_gate = threading.Event()
+
+    flushing = asyncio.create_task(storage.flush(10))
+    while not postgres.flush_started.is_set():
+        await asyncio.sleep(0.01)
+    # 写入 Postgres 期间会话再次更新，分数变化后不能从待写入队列中移除
+    await storage.aappend(make_session(), [make_run(1)])
+    postgres.flush_gate.set()
+    assert await flushing == 1
+
+    assert postgres.run_ids() == ["run-0"]
+    assert await dirty_sessions(storage) == [SESSION_ID]
+    postgres.flush_gate = None
+    assert await storage.flush(10) == 1
+    assert postgres.run_ids() == ["run-0", "run-1"]
+    assert await dirty_sessions(storage) == []
+
+
+async def test_concurrent_flush_is_locked_out(session_storage_factory):
+    storage, postgres = session_storage_factory()
+    await storage.aappend(make_session(), [make_run(0)])
+    postgres.flush_gate = threading.Event()
+
+    flushing = asyncio.create_task(storage.flush(10))
+    while not postgres.flush_started.is_set():
+        await asyncio.sleep(0.01)
+    assert await storage.flush(10) == 0
+    postgres.flush_gate.set()
+    assert await flushing == 1
+    assert len(postgres.writes) == 1
+
+
+async def test_read_miss_does_not_overwrite_a_newer_cache(session_storage_factory, monkeypatch):
+    storage, postgres = session_storage_factory()
+    postgres.upsert(make_session(make_run(0)))
+    read = postgres.read
+
+    def read_then_append(session_id, user_id=None):
+        session = read(session_id, user_id)
+        # 读取 Postgres 期间另一个请求写入了较新的会话
+        asyncio.run_coroutine_threadsafe(storage.aupsert(make_session(make_run(0), make_run(1))), loop).result(5)
+        return session
+
+    loop = asyncio.get_running_loop()
+    monkeypatch.setattr(storage, "read", read_then_append)
+
+    session = await storage.aread(SESSION_ID)
+    assert [run["run_id"] for run in session.memory["runs"]] == ["run-0"]
+    assert await cached_run_ids(storage) == ["run-0", "run-1"]
+
+
+async def test_window_is_not_served_to_another_user(session_storage_factory):
+    storage, _ = session_storage_factory()
+    await storage.aupsert(make_session(make_run(0)))
+
+    session, window = await storage.aread_window(SESSION_ID, user_id="user")
+    assert session.user_id == "user"
+    assert [run.run_id for run in window] == ["run-0"]
+    assert await storage.aread_window(SESSION_ID, user_id="other") is None
+    # 未指定用户时与 PostgresAgentStorage.read 一致，不做过滤
+    assert await storage.aread_window(SESSION_ID) is not None
+
+
+async def test_full_read_falls_back_to_postgres_for_another_user(session_storage_factory):
+    storage, postgres = session_storage_factory()
+    await storage.aupsert(make_session(make_run(0)))
+    await storage.flush(10)
+
+    assert await storage.aread(SESSION_ID, user_id="other") is None
+    session = await storage.aread(SESSION_ID, user_id="user")
+    assert [run["run_id"] for run in session.memory["runs"]] == ["run-0"]
+    # 其他用户的读取不会改动缓存中的会话
+    assert await cached_run_ids(storage) == ["run-0"]
+
+
+async def test_agent_does_not_load_another_users_history(session_storage_factory):
+    storage, _ = session_storage_factory()
+    await storage.aupsert(make_session(make_run(0), make_run(1)))
+
+    agent = OffloadedAgent(storage=storage, memory=Memory(), telemetry=False, monitoring=False)
+    assert await agent.aread_from_storage(SESSION_ID, user_id="other") is None
+    assert not (agent.memory.runs or {}).get(SESSION_ID)
+
+    session = await agent.aread_from_storage(SESSION_ID, user_id="user")
+    assert session.user_id == "user"
+    assert [run.run_id for run in agent.memory.runs[SESSION_ID]] == ["run-0", "run-1"]
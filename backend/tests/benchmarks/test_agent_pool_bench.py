@@ -0,0 +1,35 @@
+import statistics
+import time
+
+import pytest
+
+from backend.app.agent.service.agents.agent_pool import agent_pool
+from backend.app.agent.service.agents.classic_bartender_agent import get_classic_bartender
+from backend.app.agent.service.agents.creative_bartender_agent import get_creative_bartender
+
+pytestmark = pytest.mark.benchmark
+
+ROUNDS = 30
+
+
+def _setup_seconds(factory, pooled: bool) -> float:
+    samples = []
+    for i in range(ROUNDS):
+        if not pooled:
+            agent_pool._components.clear()
+        start = time.perf_counter()
+        factory(user_id=f"user-{i}", session_id=f"session-{i}", debug_mode=False)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+@pytest.mark.parametrize("factory", [get_classic_bartender, get_creative_bartender])
+def test_pooled_agent_setup_is_cheaper(offline_db, factory):
+    # 离线时表结构检查被跳过，未池化的实际开销还要加上每次两次数据库往返
+    agent_pool._components.clear()
+    unpooled = _setup_seconds(factory, pooled=False)
+    factory(debug_mode=False)
+    pooled = _setup_seconds(factory, pooled=True)
+    agent_pool._components.clear()
+    print(f"\n{factory.__name__}: unpooled {unpooled * 1e3:.2f} ms, pooled {pooled * 1e3:.2f} ms")
+    assert pooled * 3 < unpooled
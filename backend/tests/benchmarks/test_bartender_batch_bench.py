@@ -0,0 +1,76 @@
+import asyncio
+import gc
+import json
+import time
+
+import pytest
+
+from backend.app.agent.api.v1 import agents
+from backend.app.agent.schema.agent_request_schema import AgentType, BartenderRequest
+from backend.core.conf import settings
+from backend.tests.agent.test_bartender_batch import FakeAgent
+from backend.tests.agent.test_recommend_cocktail import COCKTAIL
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.anyio]
+
+# 模拟的单次 agent 运行耗时
+AGENT_SECONDS = 0.05
+ITEMS = 48
+UNIQUE = 32
+
+
+@pytest.fixture
+def batch(monkeypatch, fake_redis):
+    runs = []
+
+    async def recommend(agent, message, body, request, agent_name):
+        runs.append(body.message)
+        await asyncio.sleep(AGENT_SECONDS)
+        return COCKTAIL
+
+    async def use_cached(agent, message, cocktail, user_id, session_id):
+        pass
+
+    monkeypatch.setattr(agents, "recommend_cocktail", recommend)
+    monkeypatch.setattr(agents, "_use_cached_recommendation", use_cached)
+    monkeypatch.setattr(agents, "_BATCH_AGENTS", {agent_type: FakeAgent for agent_type in agents._BATCH_AGENTS})
+    return runs
+
+
+async def _items_per_second(items, concurrency, monkeypatch) -> float:
+    monkeypatch.setattr(settings, "BARTENDER_BATCH_CONCURRENCY", concurrency)
+    # 与 timeit 相同，测量期间关闭垃圾回收，前面测试留下的对象触发的回收停顿不计入
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        lines = [
+            json.loads(line) async for line in agents.bartender_batch_streamer(AgentType.CLASSIC_BARTENDER, items, None)
+        ]
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+    assert len(lines) == len(items)
+    return len(items) / elapsed
+
+
+async def test_batch_throughput(batch, monkeypatch):
+    items = [BartenderRequest(message=f"问卷{i % UNIQUE}", user_id=f"u{i}", session_id=f"s{i}") for i in range(ITEMS)]
+    # 逐份调用 agent 的基线：每份问卷都运行一次，依次完成
+    sequential = ITEMS / (ITEMS * AGENT_SECONDS)
+
+    throughput = {}
+    for concurrency in (1, 4, 16):
+        batch.clear()
+        throughput[concurrency] = await _items_per_second(items, concurrency, monkeypatch)
+        assert len(batch) == UNIQUE
+
+    print(
+        f"\n{ITEMS} items ({UNIQUE} unique), {AGENT_SECONDS * 1e3:.0f} ms per run: "
+        f"sequential {sequential:.0f} items/s, "
+        + ", ".join(f"concurrency {c} {rate:.0f} items/s" for c, rate in throughput.items())
+    )
+    # 去重后即使不并发也快于逐份调用
+    assert throughput[1] > sequential * 1.2
+    assert throughput[4] > throughput[1] * 3
+    assert throughput[16] > throughput[4] * 2.5
@@ -0,0 +1,100 @@
+import random
+import time
+
+import pytest
+
+from backend.app.agent.schema.agent_request_schema import DifficultyLevel
+from backend.app.agent.schema.catalog_schema import CatalogData
+from backend.app.agent.service.utils.cocktail_catalog import FLAVOR_DIMENSIONS, CocktailCatalog
+
+pytestmark = pytest.mark.benchmark
+
+RECIPES = 10_000
+INGREDIENTS = 300
+TOOLS = 12
+QUERIES = 200
+
+_DIFFICULTY_ORDER = {"easy": 0, "medium": 1, "hard": 2}
+
+
+def synthetic_catalog(rng: random.Random) -> CatalogData:
+    cocktails = [
+        {
+            "id": f"c{n}",
+            "name": f"酒{n}",
+            "english_name": f"C{n}",
+            "description": "d",
+            "base_spirit": rng.choice(["gin", "rum", "vodka"]),
+            "alcohol_level": rng.choice(["low", "medium", "high"]),
+            "difficulty_level": rng.choice(["easy", "medium", "hard"]),
+            "flavor": {dimension: rng.random() for dimension in FLAVOR_DIMENSIONS},
+            "flavor_profiles": [],
+            "ingredients": [{"id": f"i{i}", "amount": "1"} for i in rng.sample(range(INGREDIENTS), rng.randint(2, 6))],
+            "steps": [],
+            "tools": [f"t{t}" for t in rng.sample(range(TOOLS), rng.randint(0, 3))],
+            "serving_glass": "g",
+        }
+        for n in range(RECIPES)
+    ]
+    return CatalogData.model_validate({
+        "version": 1,
+        "spirits": {},
+        "ingredients": {f"i{i}": {"name": f"原料{i}"} for i in range(INGREDIENTS)},
+        "tools": {f"t{t}": {"name": f"工具{t}"} for t in range(TOOLS)},
+        "cocktails": cocktails,
+    })
+
+
+def scan_makeable(data: CatalogData, have, tools, max_missing, difficulty_level, flavors, limit):
+    # 逐个配方做集合运算的朴素实现，作为基线和正确性参照
+    matches = []
+    for cocktail in data.cocktails:
+        missing = {item.id for item in cocktail.ingredients if not item.optional} - have
+        if len(missing) > max_missing:
+            continue
+        if tools is not None and not set(cocktail.tools) <= tools:
+            continue
+        if _DIFFICULTY_ORDER[cocktail.difficulty_level.value] > _DIFFICULTY_ORDER[difficulty_level.value]:
+            continue
+        score = sum(cocktail.flavor.get(flavor, 0.0) for flavor in flavors)
+        matches.append((len(missing), -score, cocktail.id))
+    return [cocktail_id for _, _, cocktail_id in sorted(matches)[:limit]]
+
+
+def test_vectorized_find_makeable_beats_scan():
+    rng = random.Random(0)
+    data = synthetic_catalog(rng)
+    start = time.perf_counter()
+    catalog = CocktailCatalog(data)
+    build = time.perf_counter() - start
+
+    queries = [
+        dict(
+            have={f"i{i}" for i in rng.sample(range(INGREDIENTS), 60)},
+            tools={f"t{t}" for t in rng.sample(range(TOOLS), 6)},
+            max_missing=rng.choice([0, 1, 2]),
+            difficulty_level=DifficultyLevel.MEDIUM,
+            flavors=["sour", "sweet"],
+            limit=5,
+        )
+        for _ in range(QUERIES)
+    ]
+
+    start = time.perf_counter()
+    vectorized = [
+        [match.cocktail.id for match in catalog.find_makeable(q["have"], **{k: v for k, v in q.items() if k != "have"})]
+        for q in queries
+    ]
+    vectorized_seconds = (time.perf_counter() - start) / QUERIES
+
+    start = time.perf_counter()
+    scanned = [scan_makeable(data, **q) for q in queries]
+    scan_seconds = (time.perf_counter() - start) / QUERIES
+
+    print(
+        f"\n{RECIPES} recipes: build {build * 1e3:.0f} ms, "
+        f"find_makeable {vectorized_seconds * 1e6:.0f} us/query, scan {scan_seconds * 1e6:.0f} us/query"
+    )
+    assert vectorized == scanned
+    assert any(vectorized)
+    assert vectorized_seconds * 10 < scan_seconds
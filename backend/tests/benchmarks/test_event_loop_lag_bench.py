@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+from typing import List
+
+import httpx
+import pytest
+
+from agno.agent import Agent
+from agno.memory.v2.memory import Memory
+from openai import AsyncOpenAI, OpenAI
+
+from backend.app.agent.service.agents.agent_pool import PooledOpenAILike
+from backend.app.agent.service.agents.offloaded_agent import OffloadedAgent, OffloadedMemory
+from backend.app.agent.service.utils.agent_io import agent_io
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.anyio]
+
+# 每次同步数据库调用的耗时、模型响应耗时、并发运行数
+DB_SECONDS = 0.05
+LLM_SECONDS = 0.2
+RUNS = 20
+PROBE_INTERVAL = 0.005
+
+COMPLETION = {
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub-chat",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "hi"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+class BlockingStorage:
+    """每次调用都同步阻塞 DB_SECONDS 的会话存储"""
+
+    mode = "agent"
+
+    def __init__(self):
+        self.sessions = {}
+
+    def read(self, session_id, user_id=None):
+        time.sleep(DB_SECONDS)
+        return self.sessions.get(session_id)
+
+    def upsert(self, session):
+        time.sleep(DB_SECONDS)
+        self.sessions[session.session_id] = session
+        return session
+
+
+class BlockingMemoryDb:
+    """每次调用都同步阻塞 DB_SECONDS 的 memory 表"""
+
+    def read_memories(self, *args, **kwargs):
+        time.sleep(DB_SECONDS)
+        return []
+
+    def upsert_memory(self, memory):
+        time.sleep(DB_SECONDS)
+
+
+async def _llm(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(LLM_SECONDS)
+    return httpx.Response(200, json=COMPLETION)
+
+
+async def _lag_probe(stop: asyncio.Event, samples: List[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def _measure(offloaded: bool, runs: int = RUNS):
+    client = OpenAI(api_key="test", base_url="http://llm/v1")
+    async_client = AsyncOpenAI(
+        api_key="test", base_url="http://llm/v1", http_client=httpx.AsyncClient(transport=httpx.MockTransport(_llm))
+    )
+    storage, memory_db = BlockingStorage(), BlockingMemoryDb()
+
+    async def run(i: int) -> None:
+        model = PooledOpenAILike(id="stub-chat", client=client, async_client=async_client)
+        memory = (OffloadedMemory if offloaded else Memory)(model=model, db=memory_db)
+        agent = (OffloadedAgent if offloaded else Agent)(
+            model=model,
+            memory=memory,
+            storage=storage,
+            session_id=f"session-{i}",
+            user_id="user",
+            telemetry=False,
+            monitoring=False,
+        )
+        await agent.arun("hello")
+
+    samples: List[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_lag_probe(stop, samples))
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(run(i) for i in range(runs)))
+    finally:
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe
+        client.close()
+        await async_client.close()
+    assert len(storage.sessions) == runs
+    samples.sort()
+    return elapsed, samples[len(samples) // 2], samples[int(len(samples) * 0.99)], samples[-1]
+
+
+async def test_offloaded_agent_io_keeps_the_loop_responsive():
+    try:
+        # 预热：首次运行时的模块导入和线程池创建不计入
+        await _measure(offloaded=True, runs=1)
+        blocking = await _measure(offloaded=False)
+        offloaded = await _measure(offloaded=True)
+    finally:
+        agent_io.shutdown()
+
+    for name, (elapsed, p50, p99, worst) in (("blocking", blocking), ("offloaded", offloaded)):
+        print(
+            f"\n{name}: {RUNS} runs in {elapsed:.2f} s, "
+            f"loop lag p50 {p50 * 1e3:.1f} ms, p99 {p99 * 1e3:.1f} ms, max {worst * 1e3:.1f} ms"
+        )
+    # 同步调用直接在事件循环上执行时，每次阻塞整整一个 DB_SECONDS
+    assert blocking[3] >= DB_SECONDS * 0.9
+    # 放入线程池后，数据库调用不再串行阻塞事件循环；剩余延迟来自 agent 自身的计算和线程切换，
+    # 单核机器上偶尔会有几十毫秒，但远小于同步调用时累积的阻塞
+    assert offloaded[3] < blocking[3] / 10
+    assert offloaded[0] < blocking[0]
@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+import pytest
+
+from backend.app.agent.service.utils.cocktail_catalog import FLAVOR_DIMENSIONS
+from backend.app.agent.service.utils.flavor_embedding import FlavorIndex, _compose
+
+pytestmark = pytest.mark.benchmark
+
+VECTORS = 100_000
+QUERIES = 200
+K = 10
+
+
+def synthetic_vectors(rng: np.random.Generator) -> np.ndarray:
+    # 与酒单配方同分布：2-4 个口味维度加 2-5 种原料
+    ingredients = [f"ingredient_{i}" for i in range(300)]
+    vectors = []
+    for _ in range(VECTORS):
+        dimensions = rng.choice(FLAVOR_DIMENSIONS, size=rng.integers(2, 5), replace=False)
+        flavor = {dimension: float(rng.random()) for dimension in dimensions}
+        vectors.append(_compose(flavor, rng.choice(ingredients, size=rng.integers(2, 6), replace=False)))
+    return np.stack(vectors)
+
+
+def _per_query_seconds(index: FlavorIndex, queries: np.ndarray):
+    start = time.perf_counter()
+    results = [index.search(query, K)[0][0] for query in queries]
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def test_ivf_recall_and_speed():
+    rng = np.random.default_rng(1)
+    vectors = synthetic_vectors(rng)
+    start = time.perf_counter()
+    ivf = FlavorIndex(vectors)
+    build = time.perf_counter() - start
+    exact = FlavorIndex(vectors, exact_max=VECTORS)
+
+    # 查询为已有向量加噪声，接近真实的“找相似”场景
+    queries = vectors[rng.choice(VECTORS, QUERIES)] + rng.normal(0, 0.05, (QUERIES, vectors.shape[1]))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+    ivf_seconds, ivf_results = _per_query_seconds(ivf, queries)
+    exact_seconds, exact_results = _per_query_seconds(exact, queries)
+    recall = np.mean([len(set(a.tolist()) & set(b.tolist())) / K for a, b in zip(ivf_results, exact_results)])
+
+    print(
+        f"\n{VECTORS} vectors: build {build:.2f} s, ivf {ivf_seconds * 1e6:.0f} us/query, "
+        f"exact {exact_seconds * 1e6:.0f} us/query, recall@{K} {recall:.3f}"
+    )
+    assert all(len(result) == K for result in ivf_results)
+    assert recall >= 0.9
+    assert ivf_seconds * 3 < exact_seconds
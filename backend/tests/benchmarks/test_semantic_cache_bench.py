@@ -0,0 +1,146 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from sqlalchemy import insert, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.app.agent.model import BartenderSemanticCache
+from backend.app.agent.service.utils.semantic_cache import nearest_entry_query, set_vector_search_options
+from backend.core.conf import settings
+
+# 需要安装了 pgvector 0.8+ 的 PostgreSQL，例如 postgresql+asyncpg://postgres@127.0.0.1:5432/postgres
+DATABASE_URL = os.environ.get("BENCHMARK_DATABASE_URL")
+
+pytestmark = [
+    pytest.mark.benchmark,
+    pytest.mark.anyio,
+    pytest.mark.skipif(not DATABASE_URL, reason="BENCHMARK_DATABASE_URL is not set"),
+]
+
+SCHEMA = "semantic_cache_bench"
+AGENT_NAME = "classic_bartender"
+# 一个 agent 缓存满时的条目数，分散在不同的选项组合中
+ENTRIES = settings.BARTENDER_SEMANTIC_CACHE_MAX_ENTRIES
+PARTITIONS = 200
+QUERIES = 200
+BATCH = 1000
+
+
+def synthetic_entries(rng: np.random.Generator):
+    # 用户提示围绕少量主题聚集，同一主题在不同选项组合下都会出现
+    dimensions = settings.BARTENDER_SEMANTIC_CACHE_DIMENSIONS
+    topics = rng.normal(size=(50, dimensions))
+    vectors = topics[rng.integers(0, len(topics), ENTRIES)] + rng.normal(scale=0.8, size=(ENTRIES, dimensions))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # 选项组合的分布很不均匀，大多数请求使用默认选项
+    weights = 1 / np.arange(1, PARTITIONS + 1)
+    partitions = rng.choice(PARTITIONS, size=ENTRIES, p=weights / weights.sum())
+    return vectors.astype(np.float32), partitions
+
+
+@pytest.fixture(scope="module")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="module")
+async def cache_table():
+    engine = create_async_engine(DATABASE_URL, connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}})
+    table = BartenderSemanticCache.__table__
+    rng = np.random.default_rng(7)
+    vectors, partitions = synthetic_entries(rng)
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(table.create)
+    # 先写入数据再建 HNSW 索引，比逐条插入时维护索引快得多
+    hnsw = next(index for index in table.indexes if index.name == "ix_bartender_semantic_cache_embedding")
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP INDEX {hnsw.name}"))
+        for start in range(0, ENTRIES, BATCH):
+            rows = [
+                {
+                    "agent": AGENT_NAME,
+                    "options_hash": f"options-{partitions[i]}",
+                    "prompt": f"prompt {i}",
+                    "embedding": vectors[i].tolist(),
+                    "recommendation": {},
+                    "hits": 0,
+                    "created_time": text("now()"),
+                    "last_hit_time": text("now()"),
+                }
+                for i in range(start, min(start + BATCH, ENTRIES))
+            ]
+            await conn.execute(insert(table).values(rows))
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.execute(text("SET maintenance_work_mem = '256MB'"))
+        await conn.run_sync(hnsw.create)
+        await conn.execute(text(f"ANALYZE {table.name}"))
+    print(f"\nHNSW build over {ENTRIES} x {vectors.shape[1]}: {time.perf_counter() - started:.1f} s")
+    yield engine, vectors, partitions
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    await engine.dispose()
+
+
+async def _lookup(session_factory, options_hash: str, embedding, exact: bool):
+    async with session_factory.begin() as db:
+        await set_vector_search_options(db)
+        if exact:
+            # 对照组：关闭索引扫描，在分区内逐条计算距离
+            await db.execute(text("SET LOCAL enable_indexscan = off"))
+        query = nearest_entry_query(AGENT_NAME, options_hash, embedding)
+        start = time.perf_counter()
+        row = (await db.execute(query)).first()
+        return time.perf_counter() - start, row
+
+
+async def test_hnsw_lookup_latency_at_max_entries(cache_table):
+    engine, vectors, partitions = cache_table
+    session_factory = async_sessionmaker(engine)
+    rng = np.random.default_rng(11)
+
+    # 与已缓存条目相近的请求
+    picks = rng.integers(0, ENTRIES, QUERIES)
+    near = vectors[picks] + rng.normal(scale=0.01, size=vectors[picks].shape)
+    near /= np.linalg.norm(near, axis=1, keepdims=True)
+
+    async with session_factory.begin() as db:
+        await set_vector_search_options(db)
+        query = nearest_entry_query(AGENT_NAME, "options-0", near[0].tolist())
+        sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+        plan = "\n".join(row[0] for row in await db.execute(text(f"EXPLAIN {sql}")))
+    assert "ix_bartender_semantic_cache_embedding" in plan, plan
+
+    results = {}
+    for exact in (False, True):
+        latencies, ids = [], []
+        for pick, embedding in zip(picks, near):
+            seconds, row = await _lookup(session_factory, f"options-{partitions[pick]}", embedding.tolist(), exact)
+            latencies.append(seconds)
+            ids.append(None if row is None else row.id)
+        results[exact] = latencies, ids
+
+    hnsw_latencies, hnsw_ids = np.array(results[False][0]), results[False][1]
+    exact_latencies, exact_ids = np.array(results[True][0]), results[True][1]
+    recall = np.mean([a == b for a, b in zip(hnsw_ids, exact_ids)])
+    # 默认选项的分区最大，精确扫描的代价随分区大小线性增长；小分区两者都很快
+    largest = partitions[picks] == 0
+    for label, mask in (("all", np.ones_like(largest)), ("options-0", largest), ("other options", ~largest)):
+        print(
+            f"{label} ({mask.sum()} queries): "
+            f"hnsw p50 {np.median(hnsw_latencies[mask]) * 1e3:.2f} ms "
+            f"p95 {np.quantile(hnsw_latencies[mask], 0.95) * 1e3:.2f} ms, "
+            f"exact p50 {np.median(exact_latencies[mask]) * 1e3:.2f} ms"
+        )
+    print(f"{ENTRIES} entries / {PARTITIONS} option partitions, recall@1 {recall:.3f}")
+
+    assert recall >= 0.95
+    assert np.median(hnsw_latencies) < np.median(exact_latencies)
+    assert np.median(hnsw_latencies[largest]) * 2 < np.median(exact_latencies[largest])
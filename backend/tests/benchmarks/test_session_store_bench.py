@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from backend.app.agent.schema.agent_request_schema import AgentType
+from backend.tests.agent.test_session_store import SESSION_ID, make_run, make_session
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.anyio]
+
+# 每次 Postgres 往返的耗时、每个会话的轮数、会话数
+DB_SECONDS = 0.005
+TURNS = 20
+SESSIONS = 5
+
+
+async def _turns_per_second(storage) -> float:
+    start = time.perf_counter()
+    for s in range(SESSIONS):
+        session_id = f"{SESSION_ID}-{s}"
+        # 每轮对话读取历史窗口，再追加本轮的运行
+        for turn in range(TURNS):
+            await storage.aread_window(session_id)
+            await storage.aappend(make_session(session_id=session_id), [make_run(turn)])
+    # write_behind 的批量写入计入总耗时
+    while await storage.flush(200):
+        pass
+    return SESSIONS * TURNS / (time.perf_counter() - start)
+
+
+async def test_write_behind_sequential_turn_throughput(session_storage_factory):
+    sync_storage, sync_postgres = session_storage_factory(
+        AgentType.CLASSIC_BARTENDER, durability="sync", latency=DB_SECONDS
+    )
+    behind_storage, behind_postgres = session_storage_factory(
+        AgentType.CREATIVE_BARTENDER, durability="write_behind", latency=DB_SECONDS
+    )
+
+    sync_rate = await _turns_per_second(sync_storage)
+    behind_rate = await _turns_per_second(behind_storage)
+    print(
+        f"\n{SESSIONS} sessions x {TURNS} turns, {DB_SECONDS * 1e3:.0f} ms per Postgres call: "
+        f"sync {sync_rate:.0f} turns/s ({len(sync_postgres.writes)} writes), "
+        f"write_behind {behind_rate:.0f} turns/s ({len(behind_postgres.writes)} writes)"
+    )
+
+    # 两种方式最终写入 Postgres 的内容一致
+    for s in range(SESSIONS):
+        session_id = f"{SESSION_ID}-{s}"
+        expected = [f"run-{turn}" for turn in range(TURNS)]
+        assert sync_postgres.run_ids(session_id) == expected
+        assert behind_postgres.run_ids(session_id) == expected
+    # sync 每轮读写各一次 Postgres，write_behind 所有会话只批量写入一次
+    assert len(behind_postgres.writes) == 1
+    assert behind_rate > sync_rate * 3
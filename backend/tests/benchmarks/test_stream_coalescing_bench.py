@@ -0,0 +1,81 @@
+import httpx
+import pytest
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from backend.app.agent.api.v1.agents import chat_response_streamer
+from backend.app.agent.service.utils.agent_stream import StreamEvent, start_agent_run
+from backend.core.conf import settings
+from backend.tests.stub_servers import StubChatServer
+from backend.utils.sse import SSE_HEADERS, format_sse
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.anyio]
+
+CHUNKS = 300
+
+
+class WireCounter:
+    """统计 ASGI 响应体的写次数和字节数，每次写对应一次 send 系统调用"""
+
+    def __init__(self, app):
+        self.app = app
+        self.writes = 0
+        self.bytes = 0
+
+    async def __call__(self, scope, receive, send):
+        async def counting_send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                self.writes += 1
+                self.bytes += len(message["body"])
+            await send(message)
+
+        await self.app(scope, receive, counting_send)
+
+
+async def per_token_streamer(agent):
+    # 合并前的做法：每个上游片段立即作为一个事件写出
+    run_response = await agent.arun("hi", stream=True)
+    async for chunk in run_response:
+        if chunk.content:
+            yield format_sse({"content": chunk.content}, event=StreamEvent.DELTA.value)
+
+
+async def _measure(path: str, server: StubChatServer, make_agent):
+    app = FastAPI()
+
+    @app.post("/per_token")
+    async def per_token():
+        return StreamingResponse(
+            per_token_streamer(make_agent(server)), media_type="text/event-stream", headers=SSE_HEADERS
+        )
+
+    @app.post("/coalesced")
+    async def coalesced(request: Request):
+        stream_id = await start_agent_run(make_agent(server), "hi", 1, "bench", "bench")
+        return StreamingResponse(
+            chat_response_streamer(1, "bench", stream_id, request), media_type="text/event-stream", headers=SSE_HEADERS
+        )
+
+    counter = WireCounter(app)
+    transport = httpx.ASGITransport(app=counter)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+        response = await client.post(path)
+    return counter, response.text
+
+
+async def test_coalescing_reduces_writes(fake_redis, monkeypatch, chat_agent_factory):
+    monkeypatch.setattr(settings, "AGENT_STREAM_DISCONNECT_POLL_SECONDS", 0.05)
+    with StubChatServer(chunks=CHUNKS, chunk_interval=0.002) as server:
+        per_token, _ = await _measure("/per_token", server, chat_agent_factory)
+        coalesced, text = await _measure("/coalesced", server, chat_agent_factory)
+
+    assert f"event: {StreamEvent.DONE.value}" in text
+    print(
+        f"\nper-token: {per_token.writes} writes, {per_token.bytes} bytes; "
+        f"coalesced: {coalesced.writes} writes, {coalesced.bytes} bytes"
+    )
+    assert per_token.writes >= CHUNKS
+    assert coalesced.writes * 4 < per_token.writes
+    # 事件头和 JSON 包装按事件计，合并后线上字节数也更少
+    assert coalesced.bytes < per_token.bytes
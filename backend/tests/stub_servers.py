@@ -0,0 +1,177 @@
+"""测试用的本地上游替身服务"""
+
+import base64
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# 1x1 的 PNG 图片
+PNG_BYTES = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+
+
+class StubServer:
+    """在后台线程中运行的 HTTP 服务"""
+
+    handler_class: type
+
+    def __init__(self):
+        handler = type("Handler", (self.handler_class,), {"server_state": self})
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock:
+            self.requests.append({"method": method, "path": path, "body": body, "at": time.monotonic()})
+            return len(self.requests)
+
+    def count(self, method: str) -> int:
+        with self._lock:
+            return sum(1 for r in self.requests if r["method"] == method)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class _BaseHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_state: Any
+
+    def log_message(self, *args):
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _ImageHandler(_BaseHandler):
+    def do_POST(self):
+        state: StubImageServer = self.server_state
+        body = self._read_json()
+        state.record("POST", self.path, body)
+        time.sleep(state.delay)
+        if state.count("POST") <= state.fail_first:
+            self._send(500, b'{"message": "upstream error"}', "application/json")
+            return
+        payload = {"images": [{"url": f"{state.url}/images/{body.get('seed')}.png"}], "timings": {}, "seed": 0}
+        self._send(200, json.dumps(payload).encode(), "application/json")
+
+    def do_GET(self):
+        self.server_state.record("GET", self.path)
+        self._send(200, PNG_BYTES, "image/png")
+
+
+class StubImageServer(StubServer):
+    """
+    SiliconFlow 图片接口替身
+
+    POST /v1/images/generations 等待 delay 秒后返回本服务上的图片地址，GET 返回 PNG；
+    前 fail_first 次生成请求返回 500。
+    """
+
+    handler_class = _ImageHandler
+
+    def __init__(self, fail_first: int = 0, delay: float = 0.0):
+        super().__init__()
+        self.fail_first = fail_first
+        self.delay = delay
+
+    @property
+    def generation_url(self) -> str:
+        return f"{self.url}/v1/images/generations"
+
+
+class _ChatHandler(_BaseHandler):
+    def do_POST(self):
+        state: StubChatServer = self.server_state
+        body = self._read_json()
+        state.record("POST", self.path, body)
+        if not body.get("stream"):
+            payload = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body.get("model"),
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": state.reply}, "finish_reason": "stop"}
+                ],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }
+            self._send(200, json.dumps(payload).encode(), "application/json")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        state.streams_started.set()
+        try:
+            for index in range(state.chunks):
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "delta": {"content": f"token{index} "}, "finish_reason": None}],
+                }
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                with state._lock:
+                    state.chunks_sent += 1
+                time.sleep(state.chunk_interval)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前关闭了上游流
+            state.upstream_closed.set()
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class StubChatServer(StubServer):
+    """
+    OpenAI 兼容的对话接口替身
+
+    流式请求按 chunk_interval 逐个输出 chunks 个片段；客户端中途断开时设置 upstream_closed。
+    """
+
+    handler_class = _ChatHandler
+
+    def __init__(self, chunks: int = 200, chunk_interval: float = 0.02, reply: str = "ok"):
+        super().__init__()
+        self.chunks = chunks
+        self.chunk_interval = chunk_interval
+        self.reply = reply
+        self.chunks_sent = 0
+        self.streams_started = threading.Event()
+        self.upstream_closed = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
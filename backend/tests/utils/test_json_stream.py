@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from backend.utils.json_stream import JsonObjectStreamParser
+
+OBJECT = {
+    "name": '莫吉托 "Mojito"',
+    "description": "薄荷\\朗姆 {not a brace} [nor a bracket], é\n",
+    "alcohol": 12.5,
+    "sweet": True,
+    "garnish": None,
+    "ingredients": [{"name": "白朗姆酒", "amount": "45", "unit": "ml"}, {"name": "青柠", "amount": "1/2"}],
+    "meta": {"glass": {"type": "高球杯", "tags": ["冰", "长饮"]}, "empty": {}},
+    "steps": [],
+    "rating": -3,
+}
+
+
+def _feed_chunks(parser, text, size):
+    fields = []
+    for start in range(0, len(text), size):
+        fields.extend(parser.feed(text[start : start + size]))
+    return fields
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+def test_fields_split_across_chunks_match_json_loads(ensure_ascii, size):
+    text = json.dumps(OBJECT, ensure_ascii=ensure_ascii, indent=2)
+    parser = JsonObjectStreamParser()
+    fields = _feed_chunks(parser, text, size)
+    assert fields == list(OBJECT.items())
+    assert parser.done
+
+
+def test_field_is_emitted_as_soon_as_it_is_complete():
+    parser = JsonObjectStreamParser()
+    assert parser.feed('{"name": "莫吉') == []
+    assert parser.feed('托", "tools": [{"name": "摇') == [("name", "莫吉托")]
+    assert parser.feed('酒壶"}') == []
+    assert parser.feed("]") == [("tools", [{"name": "摇酒壶"}])]
+    # 标量值要等到逗号或对象结束才算完整
+    assert parser.feed(', "abv": 12') == []
+    assert parser.feed("}") == [("abv", 12)]
+    assert parser.done
+
+
+@pytest.mark.parametrize(
+    ("chunks", "value"),
+    [
+        # 转义的反斜杠落在分段边界
+        (['{"a": "x\\', '"y"}'], 'x"y'),
+        (['{"a": "x\\\\', '"}'], "x\\"),
+        # unicode 转义被拆开
+        (['{"a": "\\u4e', '2d\\u6587"}'], "中文"),
+        (['{"a": "\\ud83c\\udf78"}'], "\U0001f378"),
+    ],
+)
+def test_escapes_survive_chunk_boundaries(chunks, value):
+    parser = JsonObjectStreamParser()
+    fields = [field for chunk in chunks for field in parser.feed(chunk)]
+    assert fields == [("a", value)]
+
+
+def test_code_fence_before_and_text_after_object_are_ignored():
+    parser = JsonObjectStreamParser()
+    fields = _feed_chunks(parser, '```json\n{"a": 1, "b": [1, 2]}\n```\n{"c": 3}', 5)
+    assert fields == [("a", 1), ("b", [1, 2])]
+    assert parser.done
+    assert parser.feed('{"d": 4}') == []
+
+
+def test_malformed_values_are_skipped_and_parsing_continues():
+    parser = JsonObjectStreamParser()
+    text = '{"a": tru, "b": "bad \\q escape", "c": [1, 2,], "d": {"x": 1}, "e": 01, "f": "ok"}'
+    assert _feed_chunks(parser, text, 4) == [("d", {"x": 1}), ("f", "ok")]
+    assert parser.done
+
+
+def test_truncated_output_yields_only_complete_fields():
+    parser = JsonObjectStreamParser()
+    assert parser.feed('{"a": "done", "b": [1, {"c": "unfinish') == [("a", "done")]
+    assert not parser.done
@@ -0,0 +1,101 @@
+import pytest
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from backend.utils.range_response import RangeNotSatisfiable, bytes_response, parse_range_header
+
+DATA = bytes(range(256)) * 4
+ETAG = '"abc123"'
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+
+    @app.get("/image")
+    async def image(request: Request):
+        return bytes_response(request, DATA, "image/png", ETAG, cache_control="public, max-age=60")
+
+    with TestClient(app) as client:
+        yield client
+
+
+def test_full_response_carries_validators(client):
+    response = client.get("/image")
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert response.headers["etag"] == ETAG
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+
+@pytest.mark.parametrize("if_none_match", [ETAG, f"W/{ETAG}", f'"other", {ETAG}', "*"])
+def test_if_none_match_returns_304(client, if_none_match):
+    response = client.get("/image", headers={"If-None-Match": if_none_match})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == ETAG
+
+
+def test_if_none_match_mismatch_returns_body(client):
+    response = client.get("/image", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+    assert response.content == DATA
+
+
+@pytest.mark.parametrize(
+    ("range_header", "start", "end"),
+    [
+        ("bytes=0-99", 0, 99),
+        ("bytes=1000-", 1000, 1023),
+        ("bytes=-24", 1000, 1023),
+        # 后缀超过总长度时返回整个资源
+        ("bytes=-5000", 0, 1023),
+        # 结束位置超过总长度时截断
+        ("bytes=1020-5000", 1020, 1023),
+    ],
+)
+def test_range_returns_206_with_content_range(client, range_header, start, end):
+    response = client.get("/image", headers={"Range": range_header})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(DATA)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+    assert response.content == DATA[start : end + 1]
+
+
+@pytest.mark.parametrize("range_header", ["bytes=1024-", "bytes=5000-6000", "bytes=-0"])
+def test_unsatisfiable_range_returns_416(client, range_header):
+    response = client.get("/image", headers={"Range": range_header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
+
+
+@pytest.mark.parametrize("range_header", ["items=0-1", "bytes=0-1,4-5", "bytes=5-2", "bytes=a-b", "bytes=-"])
+def test_unsupported_range_falls_back_to_full_response(client, range_header):
+    response = client.get("/image", headers={"Range": range_header})
+    assert response.status_code == 200
+    assert response.content == DATA
+
+
+def test_if_range_match_honours_range(client):
+    response = client.get("/image", headers={"Range": "bytes=0-9", "If-Range": ETAG})
+    assert response.status_code == 206
+    assert response.content == DATA[:10]
+
+
+@pytest.mark.parametrize("if_range", ['"stale"', f"W/{ETAG}", "Wed, 21 Oct 2015 07:28:00 GMT"])
+def test_if_range_mismatch_returns_full_response(client, if_range):
+    response = client.get("/image", headers={"Range": "bytes=0-9", "If-Range": if_range})
+    assert response.status_code == 200
+    assert "content-range" not in response.headers
+    assert response.content == DATA
+
+
+def test_parse_range_header():
+    assert parse_range_header("bytes=0-0", 10) == (0, 0)
+    assert parse_range_header("bytes=-3", 10) == (7, 9)
+    assert parse_range_header("bytes=4-", 10) == (4, 9)
+    assert parse_range_header("bytes=0-1,2-3", 10) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=10-", 10)
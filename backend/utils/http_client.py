@@ -0,0 +1,194 @@
+import time
+
+from dataclasses import dataclass
+from typing import Any, Dict
+
+import httpx
+
+from backend.common.enums import StrEnum
+from backend.common.log import logger
+from backend.common.metrics import metrics
+from backend.core.conf import settings
+
+
+class Upstream(StrEnum):
+    """外部上游服务"""
+
+    LLM = "llm"  # 大模型接口
+    EMBEDDING = "embedding"  # 向量嵌入接口
+    IMAGE = "image"  # 图片生成接口
+    IMAGE_DOWNLOAD = "image_download"  # 生成图片的下载地址
+
+
+@dataclass(frozen=True)
+class UpstreamConfig:
+    """上游连接池配置"""
+
+    max_connections: int
+    timeout: float
+
+
+def get_upstream_configs() -> Dict[Upstream, UpstreamConfig]:
+    """
+    各上游的连接池配置
+
+    :return:
+    """
+    return {
+        Upstream.LLM: UpstreamConfig(settings.HTTP_CLIENT_LLM_MAX_CONNECTIONS, settings.HTTP_CLIENT_LLM_TIMEOUT),
+        Upstream.EMBEDDING: UpstreamConfig(
+            settings.HTTP_CLIENT_EMBEDDING_MAX_CONNECTIONS, settings.HTTP_CLIENT_TIMEOUT
+        ),
+        Upstream.IMAGE: UpstreamConfig(settings.HTTP_CLIENT_IMAGE_MAX_CONNECTIONS, settings.HTTP_CLIENT_TIMEOUT),
+        Upstream.IMAGE_DOWNLOAD: UpstreamConfig(
+            settings.HTTP_CLIENT_IMAGE_MAX_CONNECTIONS, settings.HTTP_CLIENT_TIMEOUT
+        ),
+    }
+
+
+def _event_hooks(upstream: Upstream, is_async: bool) -> Dict[str, list]:
+    """
+    构建记录请求指标的事件钩子
+
+    :param upstream:
+    :param is_async:
+    :return:
+    """
+
+    def on_request(request: httpx.Request) -> None:
+        request.extensions["moodshaker_start"] = time.perf_counter()
+        metrics.incr("http_client_requests_total", upstream=upstream.value)
+
+    def on_response(response: httpx.Response) -> None:
+        start = response.request.extensions.get("moodshaker_start")
+        if start is not None:
+            metrics.observe(
+                "http_client_response_headers_seconds", time.perf_counter() - start, upstream=upstream.value
+            )
+        metrics.incr("http_client_responses_total", upstream=upstream.value, status=response.status_code)
+
+    if not is_async:
+        return {"request": [on_request], "response": [on_response]}
+
+    async def on_request_async(request: httpx.Request) -> None:
+        on_request(request)
+
+    async def on_response_async(response: httpx.Response) -> None:
+        on_response(response)
+
+    return {"request": [on_request_async], "response": [on_response_async]}
+
+
+def _pool_stats(client: httpx.Client | httpx.AsyncClient) -> Dict[str, int]:
+    """
+    读取底层 httpcore 连接池的连接数
+
+    :param client:
+    :return:
+    """
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for c in connections if c.is_idle())
+    http2 = sum(1 for c in connections if "HTTP2" in type(getattr(c, "_connection", None)).__name__)
+    return {"connections": len(connections), "idle": idle, "active": len(connections) - idle, "http2": http2}
+
+
+class HttpClientRegistry:
+    """
+    外部 HTTP 客户端注册表
+
+    每个上游一个长连接客户端（同步和异步各一个），在应用生命周期内复用连接，
+    按上游分别限制连接数。
+    """
+
+    def __init__(self):
+        self._async_clients: Dict[Upstream, httpx.AsyncClient] = {}
+        self._sync_clients: Dict[Upstream, httpx.Client] = {}
+
+    @staticmethod
+    def _limits(config: UpstreamConfig) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_connections,
+            keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY,
+        )
+
+    def open(self) -> None:
+        """
+        创建所有上游的客户端
+
+        :return:
+        """
+        for upstream in Upstream:
+            self.get_async(upstream)
+            self.get_sync(upstream)
+        logger.info(f"Opened outbound http clients, http2={settings.HTTP_CLIENT_HTTP2}")
+
+    def get_async(self, upstream: Upstream) -> httpx.AsyncClient:
+        """
+        获取上游的异步客户端，不存在时创建
+
+        :param upstream:
+        :return:
+        """
+        client = self._async_clients.get(upstream)
+        if client is None or client.is_closed:
+            config = get_upstream_configs()[upstream]
+            client = httpx.AsyncClient(
+                timeout=config.timeout,
+                limits=self._limits(config),
+                http2=settings.HTTP_CLIENT_HTTP2,
+                event_hooks=_event_hooks(upstream, is_async=True),
+            )
+            self._async_clients[upstream] = client
+        return client
+
+    def get_sync(self, upstream: Upstream) -> httpx.Client:
+        """
+        获取上游的同步客户端，不存在时创建
+
+        :param upstream:
+        :return:
+        """
+        client = self._sync_clients.get(upstream)
+        if client is None or client.is_closed:
+            config = get_upstream_configs()[upstream]
+            client = httpx.Client(
+                timeout=config.timeout,
+                limits=self._limits(config),
+                http2=settings.HTTP_CLIENT_HTTP2,
+                event_hooks=_event_hooks(upstream, is_async=False),
+            )
+            self._sync_clients[upstream] = client
+        return client
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        连接池指标
+
+        :return:
+        """
+        data: Dict[str, Any] = {}
+        for upstream, client in self._async_clients.items():
+            data[f"{upstream.value}:async"] = _pool_stats(client)
+        for upstream, client in self._sync_clients.items():
+            data[f"{upstream.value}:sync"] = _pool_stats(client)
+        return data
+
+    async def close(self) -> None:
+        """
+        关闭所有客户端
+
+        :return:
+        """
+        for client in self._async_clients.values():
+            await client.aclose()
+        for client in self._sync_clients.values():
+            client.close()
+        self._async_clients.clear()
+        self._sync_clients.clear()
+
+
+# 创建外部 HTTP 客户端注册表单例
+http_clients: HttpClientRegistry = HttpClientRegistry()
+metrics.register_collector("http_client_pools", http_clients.stats)
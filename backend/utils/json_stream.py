@@ -0,0 +1,106 @@
+import json
+
+from typing import Any, List, Optional, Tuple
+
+from backend.common.log import logger
+
+
+class JsonObjectStreamParser:
+    """
+    增量解析流式输出的 JSON 对象
+
+    逐段喂入模型输出，顶层字段的值一旦完整就返回，无需等待整个对象生成完毕。
+    只扫描新到达的字符，总开销与输出长度成线性；对象之前的内容（如 ```json 代码块标记）会被跳过。
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # 顶层对象内的状态：key 等待键，colon 等待冒号，value 等待或读取值，comma 等待逗号
+        self._state = "key"
+        self._token_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self.done = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        喂入一段输出
+
+        :param text: 新到达的文本
+        :return: 本次新完整的顶层字段 (键, 值) 列表
+        """
+        if self.done or not text:
+            return []
+        self._text += text
+        fields: List[Tuple[str, Any]] = []
+        text, pos = self._text, self._pos
+        while pos < len(text):
+            ch = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._state == "key":
+                            self._key = self._decode(self._token_start, pos + 1)
+                            self._state = "colon"
+                        else:
+                            self._emit(fields, pos + 1)
+            elif self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+            elif ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._state in ("key", "value") and self._token_start is None:
+                    self._token_start = pos
+            elif ch in "{[":
+                if self._depth == 1 and self._state == "value" and self._token_start is None:
+                    self._token_start = pos
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._emit(fields, pos + 1)
+                elif self._depth == 0:
+                    # 顶层对象结束，末尾未以逗号结束的标量值在此完整
+                    if self._state == "value" and self._token_start is not None:
+                        self._emit(fields, pos)
+                    self.done = True
+                    pos += 1
+                    break
+            elif self._depth == 1:
+                if ch == ":" and self._state == "colon":
+                    self._state = "value"
+                elif ch == ",":
+                    if self._state == "value" and self._token_start is not None:
+                        self._emit(fields, pos)
+                    self._state = "key"
+                elif not ch.isspace() and self._state == "value" and self._token_start is None:
+                    # 数字、true/false/null 等标量值
+                    self._token_start = pos
+            pos += 1
+        self._pos = pos
+        return fields
+
+    def _decode(self, start: int, end: int) -> Any:
+        self._token_start = None
+        return json.loads(self._text[start:end])
+
+    def _emit(self, fields: List[Tuple[str, Any]], end: int) -> None:
+        start, key = self._token_start, self._key
+        self._state = "comma"
+        self._key = None
+        if start is None or key is None:
+            self._token_start = None
+            return
+        try:
+            fields.append((key, self._decode(start, end)))
+        except ValueError:
+            # 格式不合法的值留给最终的整体解析处理
+            logger.debug(f"Skip malformed JSON value for field {key}")
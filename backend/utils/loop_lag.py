@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from typing import Optional
+
+from backend.common.log import logger
+from backend.common.metrics import metrics
+
+
+class EventLoopLagMonitor:
+    """
+    事件循环延迟监控
+
+    周期性 sleep 并记录实际唤醒时间与预期的差值；同步调用阻塞事件循环时，差值即为被阻塞的时长，
+    记录为 event_loop_lag_seconds，当前值同时写入同名 gauge。
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - start - self.interval, 0.0)
+            metrics.observe("event_loop_lag_seconds", lag)
+            metrics.set("event_loop_lag_seconds", lag)
+            if lag > 1:
+                logger.warning(f"Event loop was blocked for {lag:.2f}s")
+
+    def start(self) -> None:
+        """
+        启动监控
+
+        :return:
+        """
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        停止监控
+
+        :return:
+        """
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
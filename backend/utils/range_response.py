@@ -0,0 +1,97 @@
+from typing import Optional, Tuple
+
+from fastapi import Request, status
+from starlette.responses import Response
+
+
+class RangeNotSatisfiable(Exception):
+    """Range 请求无法满足"""
+
+
+def parse_range_header(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单区间 Range 请求头
+
+    :param range_header: Range 请求头，例如 bytes=0-1023、bytes=1024-、bytes=-512
+    :param size: 资源总字节数
+    :return: 闭区间 (start, end)；格式不支持或多区间时返回 None，按完整响应处理
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start_str, sep, end_str = ranges.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else size - 1
+        elif end_str:
+            # 后缀区间：最后 N 个字节
+            suffix = int(end_str)
+            if suffix == 0:
+                raise RangeNotSatisfiable
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            return None
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match 使用弱比较
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def bytes_response(
+    request: Request,
+    data: bytes,
+    media_type: str,
+    etag: str,
+    cache_control: str,
+) -> Response:
+    """
+    返回支持条件请求与 Range 请求的二进制响应
+
+    :param request: 当前请求
+    :param data: 响应体
+    :param media_type: 响应 MIME 类型
+    :param etag: 强 ETag（含双引号）
+    :param cache_control: Cache-Control 响应头
+    :return:
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range 只接受强 ETag 精确匹配，否则返回完整内容
+    if range_header and request.method == "GET" and (if_range is None or if_range.strip() == etag):
+        size = len(data)
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return Response(
+                content=data[start : end + 1],
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=media_type,
+                headers=headers,
+            )
+
+    return Response(content=data, media_type=media_type, headers=headers)
@@ -0,0 +1,121 @@
+import asyncio
+import time
+import uuid
+
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from backend.common.log import logger
+from backend.database.redis import redis_client
+
+T = TypeVar("T")
+
+# 仅当锁仍归属自己时才删除
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    合并相同 key 的并发调用
+
+    进程内同一 key 只执行一次 fn，其余调用者等待同一个结果；
+    配合 redis_lock 时，跨进程同一时刻也只有一个执行者，其余进程轮询 check 等待结果写入。
+    """
+
+    def __init__(self, lock_prefix: str):
+        self.lock_prefix = lock_prefix
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Optional[T]]],
+        check: Optional[Callable[[], Awaitable[Optional[T]]]] = None,
+        lock_seconds: float = 60,
+        wait_seconds: float = 60,
+        poll_interval: float = 0.2,
+    ) -> Optional[T]:
+        """
+        执行或等待 key 对应的调用
+
+        :param key: 去重键
+        :param fn: 真正的执行函数
+        :param check: 读取已有结果的函数，提供时启用跨进程锁
+        :param lock_seconds: 跨进程锁的过期时间
+        :param wait_seconds: 等待其他进程结果的最长时间
+        :param poll_interval: 轮询间隔
+        :return:
+        """
+        future = self._calls.get(key)
+        while future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 执行者被取消时由等待者接替执行；等待者自身被取消时照常抛出
+                if not future.cancelled():
+                    raise
+            future = self._calls.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            if check is None:
+                result = await fn()
+            else:
+                result = await self._do_locked(key, fn, check, lock_seconds, wait_seconds, poll_interval)
+        except asyncio.CancelledError:
+            # 取消只针对执行者本身，不传给等待者
+            future.cancel()
+            raise
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+                # 避免无人等待时出现 "exception was never retrieved"
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._calls.pop(key, None)
+
+    async def _do_locked(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Optional[T]]],
+        check: Callable[[], Awaitable[Optional[T]]],
+        lock_seconds: float,
+        wait_seconds: float,
+        poll_interval: float,
+    ) -> Optional[T]:
+        lock_key = f"{self.lock_prefix}:{key}"
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            result = await check()
+            if result is not None:
+                return result
+
+            token = uuid.uuid4().hex
+            if await redis_client.set(lock_key, token, nx=True, px=int(lock_seconds * 1000)):
+                try:
+                    # 拿到锁后再检查一次，防止在两次检查之间其他进程已经写入
+                    result = await check()
+                    if result is not None:
+                        return result
+                    return await fn()
+                finally:
+                    await redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+            # 其他进程正在执行，等待其结果或锁释放
+            while await redis_client.exists(lock_key):
+                if time.monotonic() >= deadline:
+                    logger.warning(f"Single flight wait timed out for {lock_key}, running locally")
+                    return await fn()
+                await asyncio.sleep(poll_interval)
+                result = await check()
+                if result is not None:
+                    return result
@@ -0,0 +1,48 @@
+import json
+import re
+
+from typing import Any, Optional
+
+# SSE 只把 CRLF、LF、CR 视为换行
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+# SSE 响应头：禁止缓存，并关闭 nginx 的响应缓冲，保证事件及时送达
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_sse(
+    data: str | Any,
+    event: Optional[str] = None,
+    event_id: Optional[str | int] = None,
+    retry: Optional[int] = None,
+) -> str:
+    """
+    按 SSE 规范编码一条事件
+
+    :param data: 事件数据，非字符串时编码为 JSON；多行数据会拆成多个 data 字段
+    :param event: 事件类型
+    :param event_id: 事件ID，客户端重连时通过 Last-Event-ID 带回
+    :param retry: 建议的重连间隔（毫秒）
+    :return:
+    """
+    if not isinstance(data, str):
+        data = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    if retry is not None:
+        lines.append(f"retry: {retry}")
+    lines.extend(f"data: {line}" for line in _LINE_BREAK.split(data))
+    return "\n".join(lines) + "\n\n"
+
+
+def format_sse_comment(comment: str = "") -> str:
+    """
+    编码 SSE 注释行，客户端会忽略，可用作心跳
+
+    :param comment: 注释内容
+    :return:
+    """
+    return f": {comment}\n\n"
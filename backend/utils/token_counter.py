@@ -0,0 +1,40 @@
+import re
+
+from functools import lru_cache
+from typing import Any, Optional
+
+import tiktoken
+
+from backend.common.log import logger
+
+# 中日韩字符大多单独成 token
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]")
+
+
+@lru_cache
+def _get_encoding() -> Optional[Any]:
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # 首次使用需要下载词表，离线且没有缓存（TIKTOKEN_CACHE_DIR）时退回估算
+        logger.warning(f"tiktoken encoding unavailable, fall back to estimation: {str(e)}")
+        return None
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    计算文本的 token 数
+
+    使用 tiktoken 的 cl100k_base 词表计数；词表无法加载时才退回启发式估算：中日韩字符每字计 1，
+    其余字符每 4 个计 1。估算只是兜底，与模型实际计数可能相差较多，不应作为常规路径。
+
+    :param text: 文本
+    :return:
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4